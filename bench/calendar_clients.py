@@ -0,0 +1,98 @@
+"""
+Стоимость клиента Google Calendar на пользователя: создание и память на
+одного пользователя в кэше CalendarService.
+
+Запуск из корня репозитория:
+    python -m bench.calendar_clients [--users 1000]
+
+Режимы:
+- discovery   - прежний путь: build("calendar", "v3") со своим транспортом
+                на каждого пользователя (нужен google-api-python-client)
+- credentials - в кэше объект Credentials на пользователя
+- token       - текущий путь: в кэше только access token, клиент (пул
+                aiohttp и адреса методов) один на процесс
+
+Создание - от JSON токена из Redis до записи в кэш. Память - прирост
+Python-аллокаций (tracemalloc) с N пользователями в кэше, делённый на N.
+Сеть не используется: discovery-документ берётся из пакета.
+"""
+import argparse
+import json
+import secrets
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from google.oauth2.credentials import Credentials
+
+from services.cache import LRUCache
+from services.calendar_service import SCOPES
+
+
+def _token_data() -> dict:
+    """Токен в формате Credentials.to_json(), как он лежит в Redis"""
+    expiry = datetime.utcnow() + timedelta(hours=1)
+    return {
+        "token": f"ya29.{secrets.token_urlsafe(150)}",
+        "refresh_token": f"1//{secrets.token_urlsafe(75)}",
+        "token_uri": "https://oauth2.googleapis.com/token",
+        "client_id": "1234567890-bench.apps.googleusercontent.com",
+        "client_secret": "bench-secret",
+        "scopes": SCOPES,
+        "expiry": expiry.strftime("%Y-%m-%dT%H:%M:%SZ"),
+    }
+
+
+def _discovery(token_data: dict):
+    from googleapiclient.discovery import build
+
+    creds = Credentials.from_authorized_user_info(token_data, SCOPES)
+    return build("calendar", "v3", credentials=creds, cache_discovery=False, static_discovery=True)
+
+
+def _credentials(token_data: dict):
+    return Credentials.from_authorized_user_info(token_data, SCOPES)
+
+
+def _token(token_data: dict):
+    # Credentials нужны только чтобы проверить срок и достать токен
+    return Credentials.from_authorized_user_info(token_data, SCOPES).token
+
+
+def measure(factory, users: int) -> tuple[float, float]:
+    """Создание (мкс на пользователя) и память (КБ на пользователя в кэше)"""
+    # Как в Redis: JSON строка, которую storage.get_token разбирает на каждом промахе
+    raw_tokens = [json.dumps(_token_data()) for _ in range(users)]
+    cache = LRUCache(maxsize=users)
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    for index, raw in enumerate(raw_tokens):
+        cache.set(index, factory(json.loads(raw)))
+    elapsed = time.perf_counter() - started
+    memory = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return elapsed / users * 1e6, memory / users / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    args = parser.parse_args()
+
+    modes = {"credentials": _credentials, "token": _token}
+    try:
+        import googleapiclient  # noqa: F401
+        modes = {"discovery": _discovery, **modes}
+    except ImportError:
+        print("⚠️ google-api-python-client не установлен - измеряю без прежнего пути")
+
+    print(f"{'режим':>12} {'создание, мкс':>14} {'память, КБ':>11}")
+    for name, factory in modes.items():
+        per_user_us, per_user_kb = measure(factory, args.users)
+        print(f"{name:>12} {per_user_us:>14.1f} {per_user_kb:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Локальные заменители внешних API для нагрузочного стенда (bench.load_test).
+
+- FakeTelegram - Bot API: sendMessage, editMessageText, deleteMessage, getFile
+  и скачивание файлов по /file/bot<token>/<path>
+- FakeGigaChat - OAuth, загрузка/удаление файлов, chat/completions, список моделей
+- FakeGoogle - обновление токена, events.insert, events.list и batch запросы
+
+Задержки ответов настраиваются; счётчики вызовов отдаются на GET /_stats.
+Адреса подставляются в бота через TELEGRAM_API_URL, GIGACHAT_BASE_URL,
+GIGACHAT_AUTH_URL, GOOGLE_CALENDAR_API_URL и token_uri сохранённых токенов.
+"""
+import asyncio
+import email
+import itertools
+import json
+import time
+import uuid
+from collections import Counter
+from datetime import date
+
+from aiohttp import web
+
+
+def _ok(result) -> web.Response:
+    return web.json_response({"ok": True, "result": result})
+
+
+class _Fake:
+    """Общее: задержка ответа и счётчики вызовов"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = Counter()
+
+    async def _delay(self, name: str, latency: float = None):
+        self.calls[name] += 1
+        latency = self.latency if latency is None else latency
+        if latency > 0:
+            await asyncio.sleep(latency)
+
+    def stats(self) -> dict:
+        return dict(self.calls)
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_get("/_stats", self.handle_stats)
+        self.add_routes(app)
+        return app
+
+    def add_routes(self, app: web.Application):
+        raise NotImplementedError
+
+
+class FakeTelegram(_Fake):
+    """Bot API: отвечает на методы, которые вызывают хэндлеры, и отдаёт голосовые"""
+
+    def __init__(self, latency: float, voice_ogg: bytes):
+        super().__init__(latency)
+        self.voice_ogg = voice_ogg
+        self._message_ids = itertools.count(1_000_000)
+
+    def add_routes(self, app: web.Application):
+        app.router.add_post("/bot{token}/{method}", self.handle_method)
+        app.router.add_get("/file/bot{token}/{path:.+}", self.handle_file)
+
+    def _message(self, chat_id, text: str, message_id: int = None) -> dict:
+        return {
+            "message_id": message_id or next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "private"},
+            "text": text,
+        }
+
+    async def handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        data = await request.post()
+        await self._delay(method)
+
+        if method == "sendmessage":
+            return _ok(self._message(data["chat_id"], data.get("text", "")))
+        if method == "editmessagetext":
+            return _ok(self._message(data["chat_id"], data.get("text", ""), int(data["message_id"])))
+        if method == "getfile":
+            file_id = data["file_id"]
+            return _ok({
+                "file_id": file_id,
+                "file_unique_id": file_id,
+                "file_size": len(self.voice_ogg),
+                "file_path": f"voice/{file_id}.oga",
+            })
+        if method == "getme":
+            return _ok({"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"})
+        # deleteMessage, answerCallbackQuery, setWebhook и прочее
+        return _ok(True)
+
+    async def handle_file(self, request: web.Request) -> web.Response:
+        await self._delay("download")
+        return web.Response(body=self.voice_ogg, content_type="audio/ogg")
+
+
+class FakeGigaChat(_Fake):
+    """
+    GigaChat API. Расшифровка голосового - очередная фраза из phrases,
+    события - шаблон с названием из текста запроса (по событию на часть,
+    разделённую " и ").
+    """
+
+    def __init__(self, latency: float, file_latency: float, phrases: list[str]):
+        super().__init__(latency)
+        self.file_latency = file_latency
+        self._phrases = itertools.cycle(phrases)
+        # file_id -> (created_at, bytes, filename)
+        self.files: dict[str, tuple[int, int, str]] = {}
+
+    def add_routes(self, app: web.Application):
+        app.router.add_post("/api/v2/oauth", self.handle_oauth)
+        app.router.add_get("/api/v1/models", self.handle_models)
+        app.router.add_post("/api/v1/files", self.handle_upload)
+        app.router.add_get("/api/v1/files", self.handle_list)
+        app.router.add_post("/api/v1/files/{file_id}/delete", self.handle_delete)
+        app.router.add_post("/api/v1/chat/completions", self.handle_chat)
+
+    def stats(self) -> dict:
+        return {**self.calls, "files_stored": len(self.files)}
+
+    async def handle_oauth(self, request: web.Request) -> web.Response:
+        await self._delay("oauth", 0)
+        return web.json_response({
+            "access_token": f"fake-{uuid.uuid4().hex}",
+            "expires_at": int((time.time() + 1800) * 1000),
+        })
+
+    async def handle_models(self, request: web.Request) -> web.Response:
+        await self._delay("models", 0)
+        return web.json_response({
+            "object": "list",
+            "data": [{"id": "GigaChat-2-Pro", "object": "model", "owned_by": "bench"}],
+        })
+
+    async def handle_upload(self, request: web.Request) -> web.Response:
+        size = 0
+        filename = "voice.mp3"
+        reader = await request.multipart()
+        async for part in reader:
+            if part.name == "file":
+                filename = part.filename or filename
+                size = len(await part.read())
+        await self._delay("upload", self.file_latency)
+        file_id = str(uuid.uuid4())
+        self.files[file_id] = (int(time.time()), size, filename)
+        return web.json_response(self._file(file_id))
+
+    def _file(self, file_id: str) -> dict:
+        created_at, size, filename = self.files[file_id]
+        return {
+            "id": file_id,
+            "object": "file",
+            "bytes": size,
+            "created_at": created_at,
+            "filename": filename,
+            "purpose": "general",
+            "access_policy": "private",
+        }
+
+    async def handle_list(self, request: web.Request) -> web.Response:
+        await self._delay("list_files", self.file_latency)
+        return web.json_response({"object": "list", "data": [self._file(file_id) for file_id in self.files]})
+
+    async def handle_delete(self, request: web.Request) -> web.Response:
+        file_id = request.match_info["file_id"]
+        await self._delay("delete", self.file_latency)
+        self.files.pop(file_id, None)
+        return web.json_response({"id": file_id, "deleted": True})
+
+    @staticmethod
+    def _events(text: str) -> list[dict]:
+        return [
+            {
+                "title": part[:40],
+                "date": date.today().strftime("%Y-%m-%d"),
+                "time_start": "10:00",
+                "time_end": "11:00",
+            }
+            for part in text.split(" и ")
+        ]
+
+    async def handle_chat(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        messages = body.get("messages", [])
+        system = messages[0].get("content", "") if messages and messages[0].get("role") == "system" else ""
+        last = messages[-1] if messages else {}
+
+        if last.get("attachments"):
+            transcript = next(self._phrases)
+            if '"transcript"' in system:
+                await self._delay("chat_combined")
+                content = json.dumps({"transcript": transcript, "events": self._events(transcript)}, ensure_ascii=False)
+            else:
+                await self._delay("chat_transcribe")
+                content = transcript
+        else:
+            await self._delay("chat_parse_event")
+            content = json.dumps(self._events(last.get("content", "")), ensure_ascii=False)
+
+        return web.json_response({
+            "choices": [{"message": {"role": "assistant", "content": content}, "index": 0, "finish_reason": "stop"}],
+            "created": int(time.time()),
+            "model": body.get("model", "GigaChat-2-Pro"),
+            "usage": {"prompt_tokens": 100, "completion_tokens": 30, "total_tokens": 130},
+            "object": "chat.completion",
+        })
+
+
+class FakeGoogle(_Fake):
+    """Google OAuth token endpoint, Calendar events.insert и events.list"""
+
+    def add_routes(self, app: web.Application):
+        app.router.add_post("/token", self.handle_token)
+        app.router.add_post("/calendar/v3/calendars/{calendar_id}/events", self.handle_insert)
+        app.router.add_get("/calendar/v3/calendars/{calendar_id}/events", self.handle_list)
+        app.router.add_post("/batch/calendar/v3", self.handle_batch)
+
+    async def handle_token(self, request: web.Request) -> web.Response:
+        await self._delay("token_refresh")
+        return web.json_response({
+            "access_token": f"fake-{uuid.uuid4().hex}",
+            "expires_in": 3600,
+            "token_type": "Bearer",
+        })
+
+    @staticmethod
+    def _created(body: dict) -> dict:
+        event_id = uuid.uuid4().hex
+        return {
+            "id": event_id,
+            "htmlLink": f"https://calendar.example/event?eid={event_id}",
+            "summary": body.get("summary"),
+            "start": body.get("start"),
+            "end": body.get("end"),
+        }
+
+    async def handle_insert(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        await self._delay("events_insert")
+        return web.json_response(self._created(body))
+
+    async def handle_list(self, request: web.Request) -> web.Response:
+        """Календарь пустой: полная и инкрементальная синхронизация без событий"""
+        kind = "incremental" if "syncToken" in request.query else "full"
+        await self._delay(f"events_list_{kind}")
+        return web.json_response({"items": [], "nextSyncToken": f"sync-{uuid.uuid4().hex}"})
+
+    async def handle_batch(self, request: web.Request) -> web.Response:
+        """multipart/mixed с events.insert в каждой части"""
+        raw = await request.read()
+        message = email.message_from_bytes(f"Content-Type: {request.headers['Content-Type']}\r\n\r\n".encode() + raw)
+        await self._delay("events_batch")
+        boundary = f"batch_{uuid.uuid4().hex}"
+        parts = []
+        for part in message.get_payload():
+            self.calls["events_batch_items"] += 1
+            content_id = part.get("Content-ID", "").strip("<>")
+            inner = (part.get_payload(decode=True) or b"").replace(b"\r\n", b"\n")
+            body = json.loads(inner.partition(b"\n\n")[2] or b"{}")
+            parts.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n\r\n"
+                "HTTP/1.1 200 OK\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n"
+                f"{json.dumps(self._created(body), ensure_ascii=False)}\r\n"
+            )
+        parts.append(f"--{boundary}--\r\n")
+        return web.Response(
+            body="".join(parts).encode(),
+            headers={"Content-Type": f"multipart/mixed; boundary={boundary}"},
+        )
+
+
+def serve(fakes: dict[int, tuple[type, dict]]):
+    """
+    Поднять заменители на 127.0.0.1:<port> и работать до остановки процесса.
+
+    Args:
+        fakes: {порт: (класс заменителя, аргументы конструктора)} - объекты
+            создаются здесь, в процессе заменителей
+    """
+
+    async def run():
+        for port, (fake_class, kwargs) in fakes.items():
+            runner = web.AppRunner(fake_class(**kwargs).app(), access_log=None)
+            await runner.setup()
+            await web.TCPSite(runner, "127.0.0.1", port).start()
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
@@ -0,0 +1,57 @@
+"""
+Сравнение services.fast_parser с ответами GigaChat на корпусе
+tests/test_fast_parser.py: доля фраз, разобранных без LLM, и совпадение
+с тем, что вернула бы модель.
+
+Запуск из корня репозитория (нужен доступ к GigaChat):
+    python -m bench.fast_parser_agreement
+
+Совпадение с записанным эталоном корпуса проверяет pytest.
+"""
+import argparse
+import time
+from unittest import mock
+
+from services.fast_parser import parse_event_fast
+from tests.test_fast_parser import CORPUS, TODAY, same_event
+
+
+def _live_reference(phrase: str):
+    from services.gigachat_service import gigachat_service
+
+    with mock.patch("services.gigachat_service.datetime") as fake_datetime:
+        fake_datetime.now.return_value.strftime.return_value = TODAY.strftime("%Y-%m-%d")
+        events = gigachat_service.parse_event(phrase)
+    # Быстрый парсер разбирает только фразы с одним событием
+    return events[0] if len(events) == 1 else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.parse_args()
+
+    fast_count = agree = 0
+    disagreements = []
+    started = time.perf_counter()
+    results = [(phrase, parse_event_fast(phrase, TODAY)) for phrase, _ in CORPUS]
+    elapsed_us = (time.perf_counter() - started) / len(CORPUS) * 1_000_000
+
+    for phrase, fast in results:
+        if fast is None:
+            continue
+        fast_count += 1
+        expected = _live_reference(phrase)
+        if expected is not None and same_event(fast, expected):
+            agree += 1
+        else:
+            disagreements.append((phrase, fast, expected))
+
+    print(f"Фраз в корпусе: {len(CORPUS)}, разобрано без LLM: {fast_count}")
+    print(f"Совпадений с GigaChat: {agree}/{fast_count}")
+    print(f"Среднее время разбора: {elapsed_us:.0f} мкс")
+    for phrase, got, expected in disagreements:
+        print(f"  ✗ {phrase!r}: {got} != {expected}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+"""
+Нагрузочный стенд без внешних сервисов: настоящие dp и хэндлеры против
+локальных заменителей Telegram, GigaChat и Google (bench.fakes) и Redis.
+
+Запуск из корня репозитория:
+    python -m bench.load_test --users 50 --messages 4 --voice-share 0.3
+    python -m bench.load_test --fakeredis --save baseline.json
+    python -m bench.load_test --baseline baseline.json
+
+Каждый пользователь отправляет сообщения последовательно (как живой человек),
+пользователи работают параллельно. Обновления подаются в dp.feed_raw_update,
+как при webhook. Заменители работают в отдельном процессе, поэтому пик RSS
+и число потоков относятся только к боту.
+
+Redis: по умолчанию отдельная база redis://localhost:6379/15, которая
+ОЧИЩАЕТСЯ перед запуском; --fakeredis - без Redis сервера (pip install fakeredis).
+Для голосовых нужен ffmpeg в PATH.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Фразы для текстовых сообщений и "расшифровок": часть разбирается локальной
+# грамматикой, часть уходит в GigaChat
+PHRASES = [
+    "завтра в 10 созвон",
+    "встреча с командой в 15:00",
+    "в понедельник в 9:30 планёрка",
+    "во вторник с 10 до 12 воркшоп",
+    "сегодня в полдень обед на 2 часа",
+    "в пятницу созвон",
+    "завтра утром пробежка",
+    "в понедельник и в среду в 10 планёрка",
+    "поставь встречу завтра в 10",
+    "через два часа созвон",
+]
+
+BOT_TOKEN = "123456:bench"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_port(port: int, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"заменитель на порту {port} не поднялся")
+
+
+def make_voice(duration: int) -> bytes:
+    """Синтетическое голосовое в формате Telegram: OGG/Opus, моно, 48 кГц"""
+    return subprocess.run(
+        [
+            os.getenv("FFMPEG_BINARY", "ffmpeg"), "-hide_banner", "-loglevel", "error",
+            "-f", "lavfi", "-i", f"sine=frequency=220:duration={duration}",
+            "-ac", "1", "-ar", "48000", "-c:a", "libopus", "-b:a", "32k",
+            "-f", "ogg", "pipe:1",
+        ],
+        stdout=subprocess.PIPE,
+        check=True,
+    ).stdout
+
+
+def _start_fakes(args, voice_ogg: bytes) -> tuple[multiprocessing.Process, dict]:
+    """Поднять заменители в отдельном процессе; вернуть процесс и адреса"""
+    from bench import fakes
+
+    ports = {"telegram": _free_port(), "gigachat": _free_port(), "google": _free_port()}
+    servers = {
+        ports["telegram"]: (fakes.FakeTelegram, {"latency": args.telegram_latency, "voice_ogg": voice_ogg}),
+        ports["gigachat"]: (fakes.FakeGigaChat, {
+            "latency": args.llm_latency, "file_latency": args.llm_file_latency, "phrases": PHRASES,
+        }),
+        ports["google"]: (fakes.FakeGoogle, {"latency": args.google_latency}),
+    }
+    process = multiprocessing.get_context("spawn").Process(target=fakes.serve, args=(servers,), daemon=True)
+    process.start()
+    for port in ports.values():
+        _wait_port(port)
+    urls = {name: f"http://127.0.0.1:{port}" for name, port in ports.items()}
+    return process, urls
+
+
+def _configure_env(args, urls: dict):
+    """Конфиг бота читается при импорте - выставляем окружение до импорта модулей бота"""
+    os.environ.update({
+        "TELEGRAM_BOT_TOKEN": BOT_TOKEN,
+        "TELEGRAM_API_URL": urls["telegram"],
+        "GIGACHAT_AUTH_KEY": "YmVuY2g6YmVuY2g=",
+        "GIGACHAT_BASE_URL": f"{urls['gigachat']}/api/v1",
+        "GIGACHAT_AUTH_URL": f"{urls['gigachat']}/api/v2/oauth",
+        "GOOGLE_CALENDAR_API_URL": f"{urls['google']}/calendar/v3",
+        "GOOGLE_CALENDAR_BATCH_URL": f"{urls['google']}/batch/calendar/v3",
+        "REDIS_URL": args.redis_url,
+        "BOT_MODE": "polling",
+        "TOKEN_REFRESH_ENABLED": "0",
+        "LOG_LEVEL": args.log_level,
+    })
+
+
+def _use_fakeredis(app):
+    """Подменить клиентов Redis бота на fakeredis с общим in-memory сервером"""
+    import fakeredis
+
+    from services.storage import storage
+
+    server = fakeredis.FakeServer()
+    storage.redis = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+    app.dp.fsm.storage.redis = fakeredis.aioredis.FakeRedis(server=server)
+
+
+def _token_data(google_url: str) -> dict:
+    """Токен в формате Credentials.to_json(), действующий час"""
+    expiry = datetime.utcnow() + timedelta(hours=1)
+    return {
+        "token": "fake-access",
+        "refresh_token": "fake-refresh",
+        "token_uri": f"{google_url}/token",
+        "client_id": "bench",
+        "client_secret": "bench",
+        "scopes": ["https://www.googleapis.com/auth/calendar"],
+        "expiry": expiry.strftime("%Y-%m-%dT%H:%M:%SZ"),
+    }
+
+
+def _quantile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+    return sorted_values[index]
+
+
+def _histogram_quantiles(histogram, label: str, quantiles=(0.5, 0.95, 0.99)) -> dict:
+    """
+    Квантили по бакетам гистограммы Prometheus (как histogram_quantile),
+    outcome суммируется. Возвращает {значение метки: {count, p50, ...}} в мс.
+    """
+    buckets: dict[str, dict[float, float]] = {}
+    for metric in histogram.collect():
+        for sample in metric.samples:
+            if not sample.name.endswith("_bucket"):
+                continue
+            bounds = buckets.setdefault(sample.labels[label], {})
+            le = float(sample.labels["le"])
+            bounds[le] = bounds.get(le, 0.0) + sample.value
+
+    result = {}
+    for name, bounds in sorted(buckets.items()):
+        edges = sorted(bounds.items())
+        total = edges[-1][1]
+        if not total:
+            continue
+        row = {"count": int(total)}
+        for q in quantiles:
+            rank = q * total
+            lower, below = 0.0, 0.0
+            value = lower
+            for upper, cumulative in edges:
+                if cumulative >= rank:
+                    # В бакете +Inf оценка - верхняя конечная граница
+                    if upper != float("inf"):
+                        inside = cumulative - below
+                        value = lower + (upper - lower) * ((rank - below) / inside if inside else 1)
+                    break
+                lower, below, value = upper, cumulative, upper
+            row[f"p{int(q * 100)}"] = round(value * 1000, 1)
+        result[name] = row
+    return result
+
+
+class _Sampler:
+    """Пик числа потоков процесса во время прогона"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_threads = threading.active_count()
+
+    async def run(self):
+        while True:
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+            await asyncio.sleep(self.interval)
+
+
+async def _run(args, urls: dict) -> dict:
+    from aiohttp import ClientSession
+
+    from logging_setup import setup_logging
+    from main import Application
+    from services.executors import executors_stats
+    from services.metrics import PIPELINE_DURATION, SCHEDULER_QUEUE_WAIT, STAGE_DURATION, TIME_TO_EVENT
+    from services.storage import storage
+
+    setup_logging(level=args.log_level, stream=sys.stderr)
+    app = Application()
+    if args.fakeredis:
+        _use_fakeredis(app)
+    else:
+        await storage.redis.flushdb()
+
+    base_user = 10_000
+    users = [base_user + i for i in range(args.users)]
+    connected = users[: int(len(users) * args.connected_share)]
+    token_data = _token_data(urls["google"])
+    for user_id in connected:
+        await storage.save_token(user_id, token_data)
+
+    update_ids = iter(range(1, 10 ** 9))
+    latencies: dict[str, list[float]] = {"text": [], "voice": []}
+
+    def make_update(user_id: int, index: int, kind: str) -> dict:
+        update_id = next(update_ids)
+        message = {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+        }
+        if kind == "voice":
+            file_id = f"voice-{user_id}-{index}"
+            # Пересланные голосовые: несколько сообщений с одним file_unique_id
+            unique_id = f"voice-{update_id % args.distinct_voices}" if args.distinct_voices else file_id
+            message["voice"] = {"file_id": file_id, "file_unique_id": unique_id, "duration": args.voice_seconds}
+        else:
+            text = PHRASES[(user_id + index) % len(PHRASES)]
+            if args.unique_texts:
+                text = f"{text} (№{update_id})"
+            message["text"] = text
+        return {"update_id": update_id, "message": message}
+
+    async def simulate_user(user_id: int):
+        for index in range(args.messages):
+            # Голосовые равномерно распределены по сообщениям прогона
+            n = (user_id - base_user) * args.messages + index
+            kind = "voice" if int((n + 1) * args.voice_share) > int(n * args.voice_share) else "text"
+            update = make_update(user_id, index, kind)
+            started = time.perf_counter()
+            await app.dp.feed_raw_update(app.bot, update)
+            latencies[kind].append(time.perf_counter() - started)
+            if args.think_time:
+                await asyncio.sleep(args.think_time)
+
+    sampler = _Sampler()
+    sampler_task = asyncio.create_task(sampler.run())
+    # Фоновые задачи, как в проде
+    app.start_background_tasks()
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(simulate_user(user_id) for user_id in users))
+        elapsed = time.perf_counter() - started
+    finally:
+        sampler_task.cancel()
+        executors = executors_stats()
+        await app.close()
+
+    fakes_stats = {}
+    async with ClientSession() as session:
+        for name, url in urls.items():
+            async with session.get(f"{url}/_stats") as resp:
+                fakes_stats[name] = await resp.json()
+
+    total = sum(len(values) for values in latencies.values())
+    outcomes = {}
+    for metric in PIPELINE_DURATION.collect():
+        for sample in metric.samples:
+            if sample.name.endswith("_count"):
+                key = f"{sample.labels['pipeline']}:{sample.labels['outcome']}"
+                outcomes[key] = int(sample.value)
+
+    return {
+        "params": {k: v for k, v in vars(args).items() if k not in ("save", "baseline")},
+        "messages": total,
+        "elapsed_s": round(elapsed, 2),
+        "messages_per_s": round(total / elapsed, 2) if elapsed else 0.0,
+        "end_to_end_ms": {
+            kind: {
+                "count": len(values),
+                "p50": round(_quantile(sorted(values), 0.5) * 1000, 1),
+                "p95": round(_quantile(sorted(values), 0.95) * 1000, 1),
+                "p99": round(_quantile(sorted(values), 0.99) * 1000, 1),
+            }
+            for kind, values in latencies.items() if values
+        },
+        "time_to_event_ms": _histogram_quantiles(TIME_TO_EVENT, "pipeline"),
+        "queue_wait_ms": _histogram_quantiles(SCHEDULER_QUEUE_WAIT, "lane"),
+        "outcomes": outcomes,
+        "stages_ms": _histogram_quantiles(STAGE_DURATION, "stage"),
+        # ru_maxrss в Linux - в килобайтах
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "peak_threads": sampler.peak_threads,
+        "executors": executors,
+        "upstream_calls": fakes_stats,
+    }
+
+
+def _print_report(report: dict, baseline: dict = None):
+    def delta(path: list[str]) -> str:
+        if not baseline:
+            return ""
+        old, new = baseline, report
+        for key in path:
+            old, new = (old or {}).get(key), (new or {}).get(key)
+        if not old or new is None:
+            return ""
+        return f"  ({(new - old) / old * 100:+.0f}%)"
+
+    print(f"Сообщений: {report['messages']} за {report['elapsed_s']}s")
+    print(f"Пропускная способность: {report['messages_per_s']} сообщ/с{delta(['messages_per_s'])}")
+    print(f"Пик RSS: {report['peak_rss_mb']} МБ{delta(['peak_rss_mb'])}, "
+          f"пик потоков: {report['peak_threads']}{delta(['peak_threads'])}")
+    print("Исходы:", ", ".join(f"{k}={v}" for k, v in sorted(report["outcomes"].items())))
+
+    print(f"\n{'сквозная задержка':<28} {'n':>6} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9}")
+    for kind, row in report["end_to_end_ms"].items():
+        print(f"{kind:<28} {row['count']:>6} {row['p50']:>9} {row['p95']:>9} {row['p99']:>9}"
+              f"{delta(['end_to_end_ms', kind, 'p95'])}")
+
+    for kind, row in report.get("time_to_event_ms", {}).items():
+        print(f"{'до показа события: ' + kind:<28} {row['count']:>6} {row['p50']:>9} {row['p95']:>9} {row['p99']:>9}"
+              f"{delta(['time_to_event_ms', kind, 'p95'])}")
+
+    for lane, row in report.get("queue_wait_ms", {}).items():
+        print(f"{'ожидание в очереди: ' + lane:<28} {row['count']:>6} {row['p50']:>9} {row['p95']:>9} {row['p99']:>9}"
+              f"{delta(['queue_wait_ms', lane, 'p95'])}")
+
+    print(f"\n{'стадия':<28} {'n':>6} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9}")
+    for stage, row in report["stages_ms"].items():
+        print(f"{stage:<28} {row['count']:>6} {row['p50']:>9} {row['p95']:>9} {row['p99']:>9}"
+              f"{delta(['stages_ms', stage, 'p95'])}")
+
+    print("\nВызовы заменителей:")
+    for name, calls in report["upstream_calls"].items():
+        print(f"  {name}: " + ", ".join(f"{k}={v}" for k, v in sorted(calls.items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=50, help="одновременных пользователей")
+    parser.add_argument("--messages", type=int, default=4, help="сообщений от каждого пользователя")
+    parser.add_argument("--voice-share", type=float, default=0.3, help="доля голосовых")
+    parser.add_argument("--voice-seconds", type=int, default=5, help="длительность голосового")
+    parser.add_argument("--distinct-voices", type=int, default=0, help="различных голосовых (0 - все разные)")
+    parser.add_argument("--connected-share", type=float, default=1.0, help="доля пользователей с Google Calendar")
+    parser.add_argument("--unique-texts", action="store_true", help="уникальные тексты (без попаданий в кэш парсинга)")
+    parser.add_argument("--think-time", type=float, default=0.0, help="пауза пользователя между сообщениями, с")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="задержка chat/completions, с")
+    parser.add_argument("--llm-file-latency", type=float, default=0.15, help="задержка загрузки/удаления файла, с")
+    parser.add_argument("--google-latency", type=float, default=0.15, help="задержка Google API, с")
+    parser.add_argument("--telegram-latency", type=float, default=0.03, help="задержка Bot API, с")
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15", help="база очищается перед запуском")
+    parser.add_argument("--fakeredis", action="store_true", help="fakeredis вместо Redis сервера")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--save", help="сохранить отчёт в JSON (база для сравнения)")
+    parser.add_argument("--baseline", help="сравнить с сохранённым отчётом")
+    args = parser.parse_args()
+
+    voice_ogg = make_voice(args.voice_seconds) if args.voice_share > 0 else b""
+    process, urls = _start_fakes(args, voice_ogg)
+    try:
+        _configure_env(args, urls)
+        report = asyncio.run(_run(args, urls))
+    finally:
+        process.terminate()
+        process.join()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    _print_report(report, baseline)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
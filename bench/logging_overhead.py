@@ -0,0 +1,89 @@
+"""
+Стоимость логирования в вызывающем потоке: старая схема (basicConfig DEBUG,
+синхронная запись, json.dumps(indent=2) в f-строке) против logging_setup
+(очередь + поток записи, INFO, LazyJson, сэмплирование payload).
+
+Запуск из корня репозитория:
+    python -m bench.logging_overhead [--messages 20000] [--sample-rate 0.1]
+
+Вывод пишется в os.devnull; время - на одно сообщение в вызывающем потоке,
+отдельно - время до полного сброса очереди.
+"""
+import argparse
+import json
+import logging
+import os
+import time
+
+from logging_setup import LazyJson, PAYLOAD, setup_logging, stop_logging
+
+# Похоже на response_info из GigaChatService
+RESPONSE = {
+    "content": "Встреча с командой завтра в 15:00, обсудить релиз и планы на квартал. " * 4,
+    "response_metadata": {
+        "token_usage": {"prompt_tokens": 812, "completion_tokens": 64, "total_tokens": 876},
+        "model_name": "GigaChat-Pro",
+        "finish_reason": "stop",
+    },
+    "id": "3f1c2a9e-7a55-4d8f-9f0e-2b6c1d8e4a10",
+}
+EVENT = {"title": "Встреча с командой", "date": "2026-10-17", "time_start": "15:00", "time_end": "16:00"}
+
+
+def _workload_old(logger: logging.Logger, n: int):
+    for _ in range(n):
+        logger.info("📝 Transcribing audio...")
+        logger.info(f"📥 Audio API response: {json.dumps(RESPONSE, ensure_ascii=False, indent=2)}")
+        logger.debug(f"📋 Parsed event data: {json.dumps(EVENT, ensure_ascii=False, indent=2)}")
+
+
+def _workload_new(logger: logging.Logger, n: int):
+    for _ in range(n):
+        logger.info("📝 Transcribing audio...")
+        logger.info("📥 Audio API response: %s", LazyJson(RESPONSE), extra=PAYLOAD)
+        logger.debug("📋 Parsed event data: %s", LazyJson(EVENT), extra=PAYLOAD)
+
+
+def bench_old(n: int, devnull) -> tuple[float, float]:
+    root = logging.getLogger()
+    root.handlers[:] = []
+    logging.basicConfig(level=logging.DEBUG, stream=devnull, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    logger = logging.getLogger("bench.old")
+    started = time.perf_counter()
+    _workload_old(logger, n)
+    elapsed = time.perf_counter() - started
+    return elapsed, elapsed
+
+
+def bench_new(n: int, devnull, sample_rate: float, fmt: str) -> tuple[float, float]:
+    logging.getLogger().handlers[:] = []
+    setup_logging(level="INFO", fmt=fmt, payload_sample_rate=sample_rate, stream=devnull)
+    logger = logging.getLogger("bench.new")
+    started = time.perf_counter()
+    _workload_new(logger, n)
+    caller = time.perf_counter() - started
+    stop_logging()
+    return caller, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=20000, help="итераций (по 3 вызова логгера)")
+    parser.add_argument("--sample-rate", type=float, default=0.1, help="LOG_PAYLOAD_SAMPLE_RATE")
+    args = parser.parse_args()
+    calls = args.messages * 3
+
+    with open(os.devnull, "w", encoding="utf-8") as devnull:
+        rows = [("basicConfig DEBUG, eager json", *bench_old(args.messages, devnull))]
+        for fmt in ("text", "json"):
+            for rate in (1.0, args.sample_rate):
+                caller, total = bench_new(args.messages, devnull, rate, fmt)
+                rows.append((f"queue INFO {fmt}, payload {rate:g}", caller, total))
+
+    print(f"{'режим':<36} {'вызов, мкс':>11} {'со сбросом, мкс':>16}")
+    for name, caller, total in rows:
+        print(f"{name:<36} {caller / calls * 1e6:>11.2f} {total / calls * 1e6:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
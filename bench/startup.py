@@ -0,0 +1,152 @@
+"""
+Время старта бота: импорт модулей и время до первого обработанного обновления.
+
+Запуск из корня репозитория:
+    python -m bench.startup [--runs 5] [--fakeredis] [--importtime 15]
+
+Каждый прогон - новый процесс Python (холодный старт, как у пода после
+рестарта). В нём по отдельности замеряются импорт main, создание бота и
+диспетчера (main.Application) и обработка первого обновления: текстовое
+сообщение пользователя с подключённым календарём, разбор локальной
+грамматикой и запись в календарь. Обновление подаётся в dp.feed_raw_update,
+как при webhook; для сравнения замеряется и второе, "тёплое" обновление.
+Сквозное время - от запуска процесса (вместе со стартом интерпретатора и
+подготовкой данных в Redis) до конца первого обновления.
+
+Внешние API - заменители из bench.fakes, Redis - как в bench.load_test
+(отдельная база, которая ОЧИЩАЕТСЯ, или --fakeredis).
+--importtime N печатает N самых тяжёлых модулей по python -X importtime.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from bench.load_test import _configure_env, _start_fakes, _token_data, _use_fakeredis
+
+USER_ID = 10_000
+TEXT = "завтра в 10 созвон"
+
+
+def _update(update_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": USER_ID, "type": "private"},
+            "from": {"id": USER_ID, "is_bot": False, "first_name": "bench"},
+            "text": TEXT,
+        },
+    }
+
+
+async def _child(args) -> dict:
+    """Один холодный старт; вызывается в отдельном процессе"""
+    timings = {}
+
+    started = time.perf_counter()
+    import main
+    timings["import_ms"] = (time.perf_counter() - started) * 1000
+
+    from logging_setup import setup_logging
+    from services.storage import storage
+
+    setup_logging(level=args.log_level, stream=sys.stderr)
+
+    started = time.perf_counter()
+    app = main.Application()
+    # Бот и диспетчер создаются при первом обращении - обращаемся здесь, чтобы замерить отдельно
+    app.bot
+    app.dp
+    timings["build_ms"] = (time.perf_counter() - started) * 1000
+
+    # Подготовка данных в Redis в замер не входит
+    if args.fakeredis:
+        _use_fakeredis(app)
+    else:
+        await storage.redis.flushdb()
+    await storage.save_token(USER_ID, _token_data(args.child))
+
+    try:
+        for update_id, name in ((1, "first_update_ms"), (2, "second_update_ms")):
+            started = time.perf_counter()
+            await app.dp.feed_raw_update(app.bot, _update(update_id))
+            timings[name] = (time.perf_counter() - started) * 1000
+            if update_id == 1:
+                timings["first_update_at"] = time.time()
+    finally:
+        await app.close()
+    return timings
+
+
+def _run_once(args, google_url: str) -> dict:
+    command = [sys.executable, "-m", "bench.startup", "--child", google_url, "--log-level", args.log_level]
+    if args.fakeredis:
+        command.append("--fakeredis")
+    started = time.time()
+    result = subprocess.run(command, stdout=subprocess.PIPE, check=True, env=os.environ)
+    timings = json.loads(result.stdout.decode().strip().splitlines()[-1])
+    timings["process_to_first_update_ms"] = (timings.pop("first_update_at") - started) * 1000
+    return timings
+
+
+def _print_importtime(top: int):
+    """Самые тяжёлые модули верхнего уровня при импорте main"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        stderr=subprocess.PIPE,
+        check=True,
+        env=os.environ,
+    )
+    rows = []
+    for line in result.stderr.decode().splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Вложенные импорты отмечены отступом
+        if not name.startswith("  "):
+            rows.append((int(cumulative), name.strip()))
+    rows.sort(reverse=True)
+    print(f"\n{'модуль':<40} {'импорт, мс':>11}")
+    for cumulative, name in rows[:top]:
+        print(f"{name:<40} {cumulative / 1000:>11.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="холодных стартов")
+    parser.add_argument("--fakeredis", action="store_true", help="без Redis сервера (pip install fakeredis)")
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--importtime", type=int, default=0, metavar="N", help="показать N самых тяжёлых модулей")
+    parser.add_argument("--child", metavar="GOOGLE_URL", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(_child(args))))
+        return
+
+    # Заменители без задержек: замеряется только сам бот
+    fake_args = argparse.Namespace(telegram_latency=0, llm_latency=0, llm_file_latency=0, google_latency=0)
+    fakes_process, urls = _start_fakes(fake_args, b"")
+    try:
+        _configure_env(args, urls)
+        runs = [_run_once(args, urls["google"]) for _ in range(args.runs)]
+        if args.importtime:
+            _print_importtime(args.importtime)
+    finally:
+        fakes_process.terminate()
+
+    print(f"\n{'стадия':<28} {'медиана, мс':>12} {'мин, мс':>9} {'макс, мс':>9}")
+    for name in ("import_ms", "build_ms", "first_update_ms", "second_update_ms", "process_to_first_update_ms"):
+        values = [run[name] for run in runs]
+        print(f"{name:<28} {statistics.median(values):>12.1f} {min(values):>9.1f} {max(values):>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Сравнение конвертации голосовых: старый путь (временные файлы + pydub) против
+стадии services.transcoder (pipe ffmpeg в отдельном процессе), без
+предобработки и с ней (обрезка тишины, моно, речевые частота и битрейт -
+AUDIO_* в config.py).
+
+Запуск из корня репозитория:
+    python -m bench.voice_pipeline [--repeat 5] [--silence 2]
+
+Для старого пути нужен pydub (pip install pydub), для обоих - ffmpeg в PATH.
+Память - пик Python-аллокаций (tracemalloc) в процессе бота; ffmpeg во всех
+путях работает отдельным процессом. Размер MP3 - то, что уйдёт в GigaChat.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+from config import FFMPEG_BINARY
+from services.transcoder import Transcoder
+
+DURATIONS = (5, 60, 300)
+
+
+def make_voice(duration: int, silence: float = 0) -> bytes:
+    """
+    Синтетическое голосовое в формате Telegram: OGG/Opus, моно, 48 кГц.
+    
+    Args:
+        silence: тишина в начале и в конце, секунд (как у записи, которую
+            начали говорить не сразу)
+    """
+    return subprocess.run(
+        [
+            FFMPEG_BINARY, "-hide_banner", "-loglevel", "error",
+            "-f", "lavfi", "-i", f"sine=frequency=220:duration={duration}",
+            "-af", f"adelay={int(silence * 1000)},apad=pad_dur={silence}",
+            "-ac", "1", "-ar", "48000", "-c:a", "libopus", "-b:a", "32k",
+            "-f", "ogg", "pipe:1",
+        ],
+        stdout=subprocess.PIPE,
+        check=True,
+    ).stdout
+
+
+def legacy_path(ogg_data: bytes) -> bytes:
+    """Прежний путь: .ogg на диск -> pydub AudioSegment -> .mp3 на диск -> чтение"""
+    from pydub import AudioSegment
+
+    with tempfile.NamedTemporaryFile(suffix=".ogg", delete=False) as tmp_file:
+        tmp_file.write(ogg_data)
+        tmp_path = tmp_file.name
+    try:
+        sound = AudioSegment.from_file(tmp_path, format="ogg")
+        with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as tmp_mp3:
+            sound.export(tmp_mp3.name, format="mp3")
+            tmp_mp3_path = tmp_mp3.name
+        try:
+            with open(tmp_mp3_path, "rb") as f:
+                return f.read()
+        finally:
+            os.unlink(tmp_mp3_path)
+    finally:
+        os.unlink(tmp_path)
+
+
+def measure(func, ogg_data: bytes, repeat: int) -> tuple[float, float, int]:
+    """Медиана времени (мс), пик памяти Python (МБ) и размер MP3 (байт)"""
+    timings = []
+    peak = 0
+    size = 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        started = time.perf_counter()
+        size = len(func(ogg_data))
+        timings.append((time.perf_counter() - started) * 1000)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return statistics.median(timings), peak / 1024 / 1024, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--silence", type=float, default=2, help="тишина в начале и в конце, секунд")
+    args = parser.parse_args()
+
+    # Транскодеры работают в одном event loop на весь замер
+    loop = asyncio.new_event_loop()
+    transcoders = {
+        "in-memory": Transcoder(workers=1, preprocess=False),
+        "preprocess": Transcoder(workers=1, preprocess=True),
+    }
+    paths = {
+        name: lambda ogg_data, transcoder=transcoder: loop.run_until_complete(transcoder.convert(ogg_data))
+        for name, transcoder in transcoders.items()
+    }
+    try:
+        import pydub  # noqa: F401
+        paths = {"legacy": legacy_path, **paths}
+    except ImportError:
+        print("⚠️ pydub не установлен - измеряю только новые пути")
+
+    print(f"{'длительность':>12} {'путь':>10} {'время, мс':>10} {'пик, МБ':>8} {'MP3, КБ':>8}")
+    for duration in DURATIONS:
+        ogg_data = make_voice(duration, args.silence)
+        for name, func in paths.items():
+            elapsed, peak_mb, size = measure(func, ogg_data, args.repeat)
+            print(f"{duration:>11}s {name:>10} {elapsed:>10.1f} {peak_mb:>8.2f} {size / 1024:>8.1f}")
+
+    for transcoder in transcoders.values():
+        loop.run_until_complete(transcoder.close())
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,30 @@
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.fsm.storage.redis import RedisStorage
 
-from config import TELEGRAM_BOT_TOKEN
+from config import TELEGRAM_BOT_TOKEN, TELEGRAM_API_URL, REDIS_URL, FSM_STATE_TTL
 
-bot = Bot(token=TELEGRAM_BOT_TOKEN)
-storage = MemoryStorage()
-dp = Dispatcher(storage=storage)
+# Бот и диспетчер создаёт контейнер приложения (main.Application), а не импорт пакета
 
-# Импортируем хэндлеры для регистрации
-from . import handlers  # noqa: F401, E402
 
+def create_bot() -> Bot:
+    """Клиент Bot API"""
+    # Свой Bot API сервер (локальный telegram-bot-api или стенд нагрузочного теста)
+    session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)) if TELEGRAM_API_URL else None
+    return Bot(token=TELEGRAM_BOT_TOKEN, session=session)
+
+
+def create_dispatcher() -> Dispatcher:
+    """Диспетчер с хэндлерами бота"""
+    from .handlers import router
+
+    # FSM в общем Redis, чтобы состояние пользователя было видно всем репликам
+    storage = RedisStorage.from_url(
+        REDIS_URL,
+        state_ttl=FSM_STATE_TTL or None,
+        data_ttl=FSM_STATE_TTL or None,
+    )
+    dp = Dispatcher(storage=storage)
+    dp.include_router(router)
+    return dp
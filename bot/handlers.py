@@ -1,18 +1,35 @@
-import os
 import asyncio
-import tempfile
+import io
+import logging
+import re
+from typing import Awaitable, Callable, Optional
 
-from aiogram import F
+from aiogram import Bot, F, Router
 from aiogram.filters import Command
-from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
+from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, Voice
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
-from bot import bot, dp
-from services import GigaChatService, calendar_service
+from config import FAST_PARSER_ENABLED, VOICE_COMBINED_MODE
+from services import calendar_service
+from services.executors import llm_executor, spawn
+from services.fast_parser import parse_event_fast
+from services.gigachat_service import gigachat_service
+from services.metrics import TIME_TO_EVENT, StageTimer, pipeline_timer, stage_timer
+from services.resilience import UpstreamUnavailableError
+from services.scheduler import LANE_TEXT, LANE_VOICE, SchedulerBusyError, SupersededError, scheduler
+from services.transcoder import transcoder, TranscoderBusyError
+from services.transcript_cache import transcript_cache
 
 
-gigachat_service = GigaChatService()
+logger = logging.getLogger(__name__)
+
+# Подключается к диспетчеру в bot.create_dispatcher()
+router = Router()
+
+GIGACHAT_UNAVAILABLE_TEXT = (
+    "😔 Сервис распознавания сейчас перегружен. Попробуй через пару минут."
+)
 
 
 class AuthStates(StatesGroup):
@@ -20,14 +37,14 @@ class AuthStates(StatesGroup):
     waiting_for_code = State()
 
 
-@dp.message(Command("start"))
+@router.message(Command("start"))
 async def cmd_start(message: Message):
     """Обработчик команды /start"""
     user_id = message.from_user.id
     first_name = message.from_user.first_name
     
     # Проверяем авторизацию в Google Calendar
-    is_auth = calendar_service.is_user_authenticated(user_id)
+    is_auth = await calendar_service.is_user_authenticated(user_id)
     calendar_status = "✅ подключен" if is_auth else "❌ не подключен"
     
     # Формируем клавиатуру
@@ -53,12 +70,12 @@ async def cmd_start(message: Message):
     )
 
 
-@dp.callback_query(F.data == "connect")
+@router.callback_query(F.data == "connect")
 async def callback_connect(callback: CallbackQuery, state: FSMContext):
     """Начало подключения Google Calendar"""
     user_id = callback.from_user.id
     
-    auth_url = calendar_service.get_auth_url(user_id)
+    auth_url = await calendar_service.get_auth_url(user_id)
     if not auth_url:
         await callback.message.answer(
             "❌ Не удалось создать ссылку для авторизации.\n"
@@ -83,11 +100,11 @@ async def callback_connect(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-@dp.callback_query(F.data == "disconnect")
+@router.callback_query(F.data == "disconnect")
 async def callback_disconnect(callback: CallbackQuery):
     """Отключение Google Calendar"""
     user_id = callback.from_user.id
-    calendar_service.disconnect(user_id)
+    await calendar_service.disconnect(user_id)
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="🔐 Подключить Google Calendar", callback_data="connect")]
@@ -101,7 +118,7 @@ async def callback_disconnect(callback: CallbackQuery):
     await callback.answer()
 
 
-@dp.message(AuthStates.waiting_for_code)
+@router.message(AuthStates.waiting_for_code)
 async def process_auth_code(message: Message, state: FSMContext):
     """Обработка кода авторизации"""
     user_id = message.from_user.id
@@ -109,11 +126,8 @@ async def process_auth_code(message: Message, state: FSMContext):
     
     status_msg = await message.answer("🔄 Проверяю код...")
     
-    # Выполняем в executor чтобы не блокировать
-    loop = asyncio.get_event_loop()
-    success = await loop.run_in_executor(
-        None, calendar_service.complete_auth, user_id, auth_code
-    )
+    # Обмен кода на токен выполняется в отдельном пуле OAuth, event loop не блокируется
+    success = await calendar_service.complete_auth(user_id, auth_code)
     
     await status_msg.delete()
     
@@ -137,102 +151,210 @@ async def process_auth_code(message: Message, state: FSMContext):
     await state.clear()
 
 
-@dp.message(F.voice)
-async def handle_voice(message: Message, state: FSMContext):
+@router.message(F.voice)
+async def handle_voice(message: Message, raw_state: Optional[str], bot: Bot):
     """Обработчик голосовых сообщений"""
-    # Проверяем, не ждём ли мы код авторизации
-    current_state = await state.get_state()
-    if current_state == AuthStates.waiting_for_code:
+    # Проверяем, не ждём ли мы код авторизации (состояние уже прочитано
+    # FSM middleware - повторно в Redis не ходим)
+    if raw_state == AuthStates.waiting_for_code.state:
         await message.answer("⚠️ Сначала отправь код авторизации или нажми /start для отмены.")
         return
     
     user_id = message.from_user.id
     status_msg = await message.answer("🎤 Принял голосовое, обрабатываю...")
     
+    with pipeline_timer("voice") as pipeline_stat:
+        await _schedule(
+            message,
+            LANE_VOICE,
+            status_msg,
+            pipeline_stat,
+            lambda: _process_voice(bot, message.voice, user_id, status_msg, pipeline_stat),
+        )
+
+
+async def _process_voice(bot: Bot, voice: Voice, user_id: int, status_msg: Message, pipeline_stat: StageTimer):
+    """Конвейер голосового: расшифровка, разбор события, запись в календарь"""
+    transcribed_text, events = None, None
+    # Пересланное или повторное голосовое - расшифровка уже есть
+    if transcript_cache.enabled:
+        with stage_timer("transcript_cache_lookup"):
+            transcribed_text = await transcript_cache.get(voice.file_unique_id)
+        if transcribed_text is not None:
+            logger.info("⚡ Расшифровка взята из кэша")
+    
+    if transcribed_text is None:
+        result = await _transcribe_voice(bot, voice, status_msg, pipeline_stat)
+        if result is None:
+            return
+        transcribed_text, events = result
+        if transcript_cache.enabled:
+            spawn(transcript_cache.set(voice.file_unique_id, transcribed_text))
+    
+    if events is None:
+        # Расшифровка - показываем сразу, пока разбирается событие
+        await _show_progress(status_msg, [_transcript_line(transcribed_text), "🔍 Разбираю событие..."])
+        events = await _parse_events(transcribed_text)
+    
+    await _respond_progressively(
+        status_msg,
+        "voice",
+        pipeline_stat,
+        user_id=user_id,
+        transcribed_text=transcribed_text,
+        events=events,
+    )
+
+
+async def _schedule(
+    message: Message,
+    lane: str,
+    status_msg: Message,
+    pipeline_stat: StageTimer,
+    factory: Callable[[], Awaitable[None]],
+):
+    """
+    Обработать сообщение через планировщик (очередь пользователя, полоса lane)
+    и ответить пользователю об ошибках конвейера.
+    """
     try:
-        # Скачиваем голосовое сообщение
-        voice = message.voice
+        await scheduler.run(
+            message.from_user.id,
+            lane,
+            factory,
+            # Пересланные сообщения - отдельные события, а не исправления предыдущих
+            supersedable=message.forward_origin is None,
+        )
+    except SupersededError:
+        pipeline_stat.outcome = "superseded"
+        await status_msg.edit_text("⏭️ Пропускаю: обрабатываю твоё следующее сообщение.")
+    except SchedulerBusyError:
+        pipeline_stat.outcome = "busy"
+        await status_msg.edit_text("⏳ Слишком много сообщений подряд. Дождись ответа на предыдущие.")
+    except UpstreamUnavailableError as e:
+        pipeline_stat.outcome = "unavailable"
+        logger.warning(f"⚠️ GigaChat недоступен: {e}")
+        await status_msg.edit_text(GIGACHAT_UNAVAILABLE_TEXT)
+    except Exception:
+        pipeline_stat.outcome = "error"
+        logger.exception(f"❌ Ошибка обработки сообщения пользователя {message.from_user.id} ({lane})")
+        # Текст исключения пользователю не показываем: он бесполезен и может раскрыть детали
+        await status_msg.edit_text("❌ Произошла ошибка. Попробуй ещё раз чуть позже.")
+
+
+async def _transcribe_voice(
+    bot: Bot,
+    voice: Voice,
+    status_msg: Message,
+    pipeline_stat: StageTimer,
+) -> tuple[str, list[dict] | None] | None:
+    """
+    Скачать, сконвертировать и расшифровать голосовое.
+    
+    Returns:
+        (расшифровка, события или None - если их ещё нужно разобрать);
+        None - очередь конвертации переполнена, пользователь уже предупреждён
+    """
+    # Скачиваем голосовое сообщение в память
+    with stage_timer("telegram_get_file"):
         file = await bot.get_file(voice.file_id)
-        
-        with tempfile.NamedTemporaryFile(suffix=".ogg", delete=False) as tmp_file:
-            await bot.download_file(file.file_path, tmp_file.name)
-            tmp_path = tmp_file.name
-        
-        try:
-            loop = asyncio.get_event_loop()
-            # 1) Расшифровка
-            transcribed_text = await loop.run_in_executor(
-                None, gigachat_service.transcribe_audio, tmp_path
-            )
-            # 2) Парсинг события
-            event_data = await loop.run_in_executor(
-                None, gigachat_service.parse_event, transcribed_text
-            )
-            
-            final_text = _build_response(
-                user_id=user_id,
-                transcribed_text=transcribed_text,
-                event_data=event_data
-            )
-            
-            await message.answer(final_text, parse_mode="Markdown")
-            await status_msg.delete()
-                
-        finally:
-            os.unlink(tmp_path)
-            
-    except Exception as e:
-        await message.answer(f"❌ Произошла ошибка: {str(e)}")
-
-
-@dp.message(F.text)
-async def handle_text(message: Message, state: FSMContext):
+    audio_buffer = io.BytesIO()
+    with stage_timer("telegram_download"):
+        await bot.download_file(file.file_path, destination=audio_buffer)
+    
+    async def notify_queued(position: int):
+        await status_msg.edit_text(
+            f"⏳ Сейчас много голосовых, ты в очереди: позиция {position}"
+        )
+    
+    # 1) Предобработка и конвертация OGG -> MP3 в выделенной стадии (отдельные процессы ffmpeg)
+    try:
+        mp3_data = await transcoder.convert(
+            audio_buffer.getvalue(), on_queued=notify_queued, duration=voice.duration
+        )
+    except TranscoderBusyError:
+        pipeline_stat.outcome = "busy"
+        await status_msg.edit_text(
+            "⏳ Сейчас слишком много голосовых. Попробуй через минуту "
+            "или отправь событие текстом."
+        )
+        return None
+    
+    if VOICE_COMBINED_MODE:
+        # 2+3) Расшифровка и события одним запросом
+        return await llm_executor.run(gigachat_service.transcribe_and_parse, mp3_data)
+    
+    # 2) Расшифровка
+    transcribed_text = await llm_executor.run(gigachat_service.transcribe_audio, mp3_data)
+    return transcribed_text, None
+
+
+@router.message(F.text)
+async def handle_text(message: Message, raw_state: Optional[str]):
     """Обработчик текстовых сообщений"""
     if message.text.startswith("/"):
         return
     
     # Проверяем, не ждём ли мы код авторизации (обрабатывается в process_auth_code)
-    current_state = await state.get_state()
-    if current_state == AuthStates.waiting_for_code:
+    if raw_state == AuthStates.waiting_for_code.state:
         return  # Уже обрабатывается в process_auth_code
     
     user_id = message.from_user.id
     status_msg = await message.answer("⚙️ Обрабатываю...")
     
-    try:
-        loop = asyncio.get_event_loop()
-        event_data = await loop.run_in_executor(
-            None, gigachat_service.parse_event, message.text
-        )
-        
-        final_text = _build_response(
-            user_id=user_id,
-            transcribed_text=None,
-            event_data=event_data
+    with pipeline_timer("text") as pipeline_stat:
+        await _schedule(
+            message,
+            LANE_TEXT,
+            status_msg,
+            pipeline_stat,
+            lambda: _process_text(message.text, user_id, status_msg, pipeline_stat),
         )
-        
-        await message.answer(final_text, parse_mode="Markdown")
-        await status_msg.delete()
-    except Exception as e:
-        await message.answer(f"❌ Произошла ошибка: {str(e)}")
 
 
-def _build_response(user_id: int, transcribed_text: str | None, event_data: dict | None) -> str:
-    """Формирует итоговое сообщение одним блоком"""
-    if not event_data:
-        return "❌ Не удалось извлечь информацию о событии. Попробуй еще раз."
+async def _process_text(text: str, user_id: int, status_msg: Message, pipeline_stat: StageTimer):
+    """Конвейер текста: разбор события и запись в календарь"""
+    events = await _parse_events(text)
+    await _respond_progressively(
+        status_msg,
+        "text",
+        pipeline_stat,
+        user_id=user_id,
+        transcribed_text=None,
+        events=events,
+    )
+
+
+async def _parse_events(text: str) -> list[dict]:
+    """Парсинг событий: сначала локальная грамматика, при неуверенности - GigaChat"""
+    if FAST_PARSER_ENABLED:
+        event_data = parse_event_fast(text)
+        if event_data:
+            logger.info(f"⚡ Событие разобрано без LLM: {event_data}")
+            return [event_data]
     
+    return await llm_executor.run(gigachat_service.parse_event, text)
+
+
+async def _show_progress(status_msg: Message, parts: list[str], parse_mode: str | None = None):
+    """Обновить статусное сообщение очередным этапом"""
+    with stage_timer("telegram_edit_status"):
+        await status_msg.edit_text("\n".join(parts), parse_mode=parse_mode)
+
+
+def _transcript_line(transcribed_text: str) -> str:
+    return f"📝 Текст: \"{transcribed_text}\""
+
+
+def _format_event(event_data: dict) -> list[str]:
+    """Строки с описанием разобранного события"""
     # Капитализируем название события
     title = event_data.get('title', 'Без названия')
     if title:
         title = title[0].upper() + title[1:] if len(title) > 1 else title.upper()
     event_data['title'] = title
     
-    parts = []
-    if transcribed_text:
-        parts.append(f"📝 Текст: \"{transcribed_text}\"")
-    
-    parts.append("📅 Событие:")
+    parts = ["📅 Событие:"]
     parts.append(f"• Название: {title}")
     parts.append(f"• Дата: {event_data.get('date', 'Не указана')}")
     parts.append(f"• Время: {event_data.get('time_start', '?')} - {event_data.get('time_end', '?')}")
@@ -240,23 +362,113 @@ def _build_response(user_id: int, transcribed_text: str | None, event_data: dict
         parts.append(f"• Описание: {event_data['description']}")
     if event_data.get('color'):
         parts.append(f"• Цвет: {event_data['color']}")
+    return parts
+
+
+def _format_events(events: list[dict]) -> list[str]:
+    """Одно событие - подробно, несколько - по строке на событие"""
+    if len(events) == 1:
+        return _format_event(events[0])
     
-    # Добавляем в Google Calendar (если пользователь авторизован)
-    if calendar_service.is_user_authenticated(user_id):
-        result = calendar_service.create_event(
-            user_id=user_id,
-            title=event_data.get('title', 'Событие'),
-            date=event_data.get('date'),
-            time_start=event_data.get('time_start', '10:00'),
-            time_end=event_data.get('time_end', '11:00'),
-            description=event_data.get('description'),
-            color=event_data.get('color'),
+    parts = [f"📅 Событий: {len(events)}"]
+    for index, event_data in enumerate(events, 1):
+        title = event_data.get('title') or 'Без названия'
+        event_data['title'] = title[0].upper() + title[1:]
+        line = (
+            f"{index}. {event_data['title']} - {event_data.get('date', '?')} "
+            f"{event_data.get('time_start', '?')}-{event_data.get('time_end', '?')}"
         )
+        if event_data.get('color'):
+            line += f" ({event_data['color']})"
+        parts.append(line)
+    return parts
+
+
+async def _insert_events(user_id: int, events: list[dict]) -> list[str]:
+    """
+    Проверить пересечения с календарём, добавить события в Google Calendar
+    (одним batch запросом), вернуть строки с итогом
+    """
+    conflicts = await calendar_service.check_conflicts(user_id, events)
+    results = await calendar_service.create_events(user_id, events)
+    
+    if len(results) == 1:
+        if results[0]:
+            parts = [f"✅ Добавлено в календарь: [ссылка]({results[0]['link']})"]
+        else:
+            parts = ["⚠️ Не удалось добавить в календарь."]
+        return parts + _format_conflicts(conflicts)
+    
+    created = sum(result is not None for result in results)
+    parts = [f"{'✅' if created == len(results) else '⚠️'} Добавлено в календарь: {created} из {len(results)}"]
+    for index, result in enumerate(results, 1):
         if result:
-            parts.append(f"✅ Добавлено в календарь: [ссылка]({result['link']})")
+            parts.append(f"{index}. [ссылка]({result['link']})")
         else:
-            parts.append("⚠️ Не удалось добавить в календарь.")
-    else:
+            parts.append(f"{index}. не удалось добавить")
+    return parts + _format_conflicts(conflicts)
+
+
+def _escape_markdown(text: str) -> str:
+    """Экранировать символы разметки Markdown в тексте из календаря"""
+    return re.sub(r"([_*`\[])", r"\\\1", text)
+
+
+def _format_conflicts(conflicts: list[dict | None]) -> list[str]:
+    """Предупреждения о пересечениях и свободное время в тот же день"""
+    parts = []
+    for index, conflict in enumerate(conflicts, 1):
+        if not conflict:
+            continue
+        prefix = f"{index}. " if len(conflicts) > 1 else ""
+        busy = ", ".join(
+            f"«{_escape_markdown(summary or 'Без названия')}» {start:%H:%M}-{end:%H:%M}"
+            for start, end, summary in conflict["overlaps"][:3]
+        )
+        parts.append(f"⚠️ {prefix}Пересекается с: {busy}")
+        if conflict["free_slot"]:
+            start, end = conflict["free_slot"]
+            parts.append(f"💡 Свободно в этот день: {start:%H:%M}-{end:%H:%M}")
+        else:
+            parts.append("💡 Свободного времени такой длительности в этот день нет")
+    return parts
+
+
+async def _respond_progressively(
+    status_msg: Message,
+    pipeline: str,
+    pipeline_stat: StageTimer,
+    user_id: int,
+    transcribed_text: str | None,
+    events: list[dict],
+):
+    """
+    Показать разобранные события и дописать результат записи в календарь.
+    
+    Запись в календарь запускается параллельно с показом событий, поэтому
+    пользователь видит их, не дожидаясь ответа Google.
+    """
+    parts = [_transcript_line(transcribed_text)] if transcribed_text else []
+    if not events:
+        parts.append("❌ Не удалось извлечь информацию о событии. Попробуй еще раз.")
+        await _show_progress(status_msg, parts)
+        return
+    
+    parts.extend(_format_events(events))
+    
+    if not await calendar_service.is_user_authenticated(user_id):
         parts.append("⚠️ Google Calendar не подключен. Нажми /start для подключения.")
+        await _show_progress(status_msg, parts)
+        TIME_TO_EVENT.labels(pipeline).observe(pipeline_stat.running())
+        return
+    
+    # Дальше изменения внешние - новое сообщение пользователя уже не отменяет это
+    scheduler.commit()
+    insert_task = asyncio.create_task(_insert_events(user_id, events))
+    try:
+        await _show_progress(status_msg, parts + ["⏳ Добавляю в календарь..."])
+        TIME_TO_EVENT.labels(pipeline).observe(pipeline_stat.running())
+    finally:
+        calendar_lines = await insert_task
     
-    return "\n".join(parts)
+    await _show_progress(status_msg, parts + calendar_lines, parse_mode="Markdown")
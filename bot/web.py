@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+from aiohttp import web
+
+from config import READINESS_CACHE_TTL, READINESS_TIMEOUT
+from services.calendar_service import calendar_service
+from services.event_cache import event_parse_cache
+from services.file_reaper import file_reaper
+from services.executors import executors_stats, probe_executor, spawn
+from services.gigachat_service import gigachat_service, gigachat_guard, gigachat_background_guard
+from services.metrics import render as render_metrics
+from services.scheduler import scheduler
+from services.storage import storage
+from services.token_refresher import token_refresher
+from services.transcript_cache import transcript_cache
+
+logger = logging.getLogger(__name__)
+
+
+class ReadinessChecker:
+    """
+    Проверка доступности зависимостей (Redis, GigaChat) с кэшированием результата.
+    
+    Ответ GigaChat ждём не дольше timeout: зависшая проверка считается
+    неудачной, но продолжает выполняться в probe_executor, и следующие
+    проверки ждут её, а не ставят новые в очередь потока.
+    """
+    
+    def __init__(self, cache_ttl: float = READINESS_CACHE_TTL, timeout: float = READINESS_TIMEOUT):
+        self._cache_ttl = cache_ttl
+        self._timeout = timeout
+        self._checked_at = 0.0
+        self._result: dict[str, bool] = {}
+        self._lock = asyncio.Lock()
+        self._gigachat_ping: Optional[asyncio.Task] = None
+    
+    async def check(self) -> dict[str, bool]:
+        """Статус каждой зависимости: {"redis": True, "gigachat": False}"""
+        async with self._lock:
+            if self._result and time.monotonic() - self._checked_at < self._cache_ttl:
+                return self._result
+            
+            redis_ok, gigachat_ok = await asyncio.gather(
+                storage.ping(),
+                self._ping_gigachat(),
+            )
+            self._result = {"redis": redis_ok, "gigachat": gigachat_ok}
+            self._checked_at = time.monotonic()
+            if not all(self._result.values()):
+                logger.warning(f"⚠️ Зависимости недоступны: {self._result}")
+            return self._result
+    
+    async def _ping_gigachat(self) -> bool:
+        if self._gigachat_ping is None or self._gigachat_ping.done():
+            self._gigachat_ping = spawn(probe_executor.run(gigachat_service.ping))
+        try:
+            # shield: по таймауту отменяем ожидание, а не саму проверку
+            return await asyncio.wait_for(asyncio.shield(self._gigachat_ping), self._timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ GigaChat не ответил на проверку за {self._timeout}s")
+            return False
+
+
+readiness_checker = ReadinessChecker()
+
+
+async def healthz(request: web.Request) -> web.Response:
+    """Liveness: процесс жив и event loop отвечает"""
+    return web.json_response({"status": "ok"})
+
+
+async def readyz(request: web.Request) -> web.Response:
+    """Readiness: Redis и GigaChat доступны"""
+    checks = await readiness_checker.check()
+    ready = all(checks.values())
+    return web.json_response(
+        {"status": "ok" if ready else "unavailable", "checks": checks},
+        status=200 if ready else 503,
+    )
+
+
+def _rss_mb() -> float:
+    """Текущий RSS процесса, МБ"""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return round(resident_pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024, 1)
+    except (OSError, ValueError):
+        return 0.0
+
+
+async def stats(request: web.Request) -> web.Response:
+    """Внутренняя статистика: попадания в кэши, размер кэшей, память процесса"""
+    return web.json_response({
+        "process": {"rss_mb": _rss_mb()},
+        "parse_cache": event_parse_cache.stats(),
+        "transcript_cache": transcript_cache.stats(),
+        "calendar_cache": calendar_service.cache_stats(),
+        "token_cache": storage.token_cache_stats(),
+        "token_refresher": token_refresher.stats(),
+        "file_reaper": {
+            **file_reaper.stats(),
+            "pending": await storage.pending_files_count(),
+        },
+        "gigachat": gigachat_guard.stats(),
+        "gigachat_background": gigachat_background_guard.stats(),
+        "scheduler": scheduler.stats(),
+        "executors": executors_stats(),
+    })
+
+
+async def metrics(request: web.Request) -> web.Response:
+    """Метрики стадий в формате Prometheus"""
+    body, content_type = render_metrics()
+    return web.Response(body=body, headers={"Content-Type": content_type})
+
+
+def create_app() -> web.Application:
+    """HTTP приложение с пробами; webhook регистрируется поверх в main.py"""
+    app = web.Application()
+    app.router.add_get("/healthz", healthz)
+    app.router.add_get("/readyz", readyz)
+    app.router.add_get("/stats", stats)
+    app.router.add_get("/metrics", metrics)
+    return app
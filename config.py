@@ -13,49 +13,203 @@ except ImportError:
 
 # ============= КОНФИГУРАЦИЯ =============
 
+# Обязательные значения проверяет validate_config() при запуске (main.py),
+# импорт модулей бота работает и без них
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-if not TELEGRAM_BOT_TOKEN:
-    raise ValueError(
-        "❌ TELEGRAM_BOT_TOKEN не установлен!\n"
-        "Установите переменную окружения:\n"
-        "  export TELEGRAM_BOT_TOKEN='your_token'\n"
-        "Или создайте файл .env с содержимым:\n"
-        "  TELEGRAM_BOT_TOKEN=your_token"
-    )
-
 AUTHORIZATION_KEY = os.getenv("GIGACHAT_AUTH_KEY")
-if not AUTHORIZATION_KEY:
-    raise ValueError(
-        "❌ GIGACHAT_AUTH_KEY не установлен!\n"
-        "Установите переменную окружения:\n"
-        "  export GIGACHAT_AUTH_KEY='your_key'\n"
-        "Или создайте файл .env с содержимым:\n"
-        "  GIGACHAT_AUTH_KEY=your_key"
-    )
 
 GIGACHAT_MODEL = os.getenv("GIGACHAT_MODEL", "GigaChat-2-Pro")
+# Адреса API GigaChat и сервера авторизации (пусто - адреса по умолчанию из SDK)
+GIGACHAT_BASE_URL = os.getenv("GIGACHAT_BASE_URL") or None
+GIGACHAT_AUTH_URL = os.getenv("GIGACHAT_AUTH_URL") or None
+# Таймаут запроса к GigaChat, секунд
+GIGACHAT_TIMEOUT = float(os.getenv("GIGACHAT_TIMEOUT", "60"))
+# Ограничение нагрузки на GigaChat (на процесс): запросов в секунду, всплеск, параллельных запросов
+GIGACHAT_RATE_LIMIT = float(os.getenv("GIGACHAT_RATE_LIMIT", "5"))
+GIGACHAT_BURST = int(os.getenv("GIGACHAT_BURST", "10"))
+GIGACHAT_MAX_CONCURRENCY = int(os.getenv("GIGACHAT_MAX_CONCURRENCY", "4"))
+# Сколько секунд запрос может ждать слота/лимита, прежде чем пользователь получит отказ
+GIGACHAT_MAX_WAIT = float(os.getenv("GIGACHAT_MAX_WAIT", "20"))
+# Повторы транзиентных ошибок (429, 5xx, таймауты) с экспоненциальной задержкой
+GIGACHAT_RETRIES = int(os.getenv("GIGACHAT_RETRIES", "3"))
+GIGACHAT_RETRY_BASE_DELAY = float(os.getenv("GIGACHAT_RETRY_BASE_DELAY", "0.5"))
+GIGACHAT_RETRY_MAX_DELAY = float(os.getenv("GIGACHAT_RETRY_MAX_DELAY", "8"))
+# Circuit breaker: ошибок подряд до размыкания и пауза перед пробным запросом, секунд
+GIGACHAT_CB_FAILURES = int(os.getenv("GIGACHAT_CB_FAILURES", "5"))
+GIGACHAT_CB_RESET_TIMEOUT = float(os.getenv("GIGACHAT_CB_RESET_TIMEOUT", "30"))
+# Разбирать типовые фразы ("завтра в 10 созвон") локально, без запроса к GigaChat
+FAST_PARSER_ENABLED = os.getenv("FAST_PARSER_ENABLED", "1") == "1"
+# Сколько событий можно создать из одного сообщения (остальные отбрасываются)
+MAX_EVENTS_PER_MESSAGE = int(os.getenv("MAX_EVENTS_PER_MESSAGE", "10"))
+# Голосовые: расшифровка и извлечение события одним запросом к GigaChat
+VOICE_COMBINED_MODE = os.getenv("VOICE_COMBINED_MODE", "0") == "1"
+# Удаление загруженных в GigaChat файлов в фоне: период проверки очереди (секунд) и размер пачки
+GIGACHAT_FILE_REAPER_INTERVAL = int(os.getenv("GIGACHAT_FILE_REAPER_INTERVAL", "10"))
+GIGACHAT_FILE_REAPER_BATCH = int(os.getenv("GIGACHAT_FILE_REAPER_BATCH", "50"))
+# Сколько попыток удаления файла делать, прежде чем оставить его сборщику сирот
+GIGACHAT_FILE_DELETE_ATTEMPTS = int(os.getenv("GIGACHAT_FILE_DELETE_ATTEMPTS", "5"))
+# Раз в сколько секунд удалять загруженные ботом файлы старше GIGACHAT_ORPHAN_MAX_AGE (брошенные после неудач)
+GIGACHAT_ORPHAN_SWEEP_INTERVAL = int(os.getenv("GIGACHAT_ORPHAN_SWEEP_INTERVAL", "3600"))
+GIGACHAT_ORPHAN_MAX_AGE = int(os.getenv("GIGACHAT_ORPHAN_MAX_AGE", "3600"))
+# Лимит фоновых запросов к GigaChat (удаление файлов), запросов в секунду - отдельно от пользовательского
+GIGACHAT_BACKGROUND_RATE_LIMIT = float(os.getenv("GIGACHAT_BACKGROUND_RATE_LIMIT", "1"))
+
+# ============= ЛОГИРОВАНИЕ =============
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# text - человекочитаемый формат, json - однострочные записи для сборщика логов
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+# Доля записей с объёмными данными (ответы API, тела событий), которые попадают в лог
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "1.0"))
+
+# ============= РЕЖИМ ЗАПУСКА =============
+# polling - для локальной разработки, webhook - для production (k8s)
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+
+# Публичный адрес, на который Telegram будет слать обновления (например, https://bot.example.com)
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+# Секрет для заголовка X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or None
+
+# Адрес Bot API сервера (пусто - api.telegram.org; например, локальный telegram-bot-api)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "").rstrip("/")
+
+# HTTP сервер для webhook и проб /healthz, /readyz (поднимается в обоих режимах)
+HTTP_HOST = os.getenv("HTTP_HOST", "0.0.0.0")
+HTTP_PORT = int(os.getenv("HTTP_PORT", "8080"))
+# Как долго кэшировать результат проверки зависимостей для /readyz, секунд
+READINESS_CACHE_TTL = float(os.getenv("READINESS_CACHE_TTL", "15"))
+# Сколько ждать ответа зависимости в /readyz, секунд (меньше timeoutSeconds пробы)
+READINESS_TIMEOUT = float(os.getenv("READINESS_TIMEOUT", "3"))
+
+# ============= АУДИО =============
+# Путь к ffmpeg (конвертация голосовых через pipe, без временных файлов)
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+# Число одновременных процессов ffmpeg (0 - по лимиту CPU контейнера)
+TRANSCODE_WORKERS = int(os.getenv("TRANSCODE_WORKERS", "0"))
+# Сколько голосовых может ждать конвертации; при переполнении пользователь получает отказ
+TRANSCODE_QUEUE_SIZE = int(os.getenv("TRANSCODE_QUEUE_SIZE", "20"))
+# Предобработка перед загрузкой в GigaChat: обрезка тишины, моно, речевая частота и битрейт
+AUDIO_PREPROCESS_ENABLED = os.getenv("AUDIO_PREPROCESS_ENABLED", "1") == "1"
+# Порог тишины по уровню сигнала, дБ (тише - считается тишиной)
+AUDIO_SILENCE_THRESHOLD_DB = float(os.getenv("AUDIO_SILENCE_THRESHOLD_DB", "-45"))
+# Минимальная длительность звука выше порога, с которой начинается речь, секунд
+AUDIO_SILENCE_MIN_DURATION = float(os.getenv("AUDIO_SILENCE_MIN_DURATION", "0.1"))
+# Сколько тишины оставить на краях, чтобы не срезать начало и конец слов, секунд
+AUDIO_SILENCE_KEEP = float(os.getenv("AUDIO_SILENCE_KEEP", "0.3"))
+# Частота дискретизации для распознавания речи, Гц
+AUDIO_SAMPLE_RATE = int(os.getenv("AUDIO_SAMPLE_RATE", "16000"))
+# Битрейт MP3 после предобработки, кбит/с (CBR)
+AUDIO_BITRATE_KBPS = int(os.getenv("AUDIO_BITRATE_KBPS", "32"))
+
+# ============= ПЛАНИРОВЩИК СООБЩЕНИЙ =============
+# Сообщения одного пользователя обрабатываются по очереди, пользователи - по кругу.
+# Сколько сообщений обрабатывается одновременно и сколько из них может быть голосовыми.
+# Голосовых всегда меньше, чем одновременных вызовов GigaChat (llm_executor и
+# GIGACHAT_MAX_CONCURRENCY): оставшиеся вызовы достаются разбору текста
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "32"))
+SCHEDULER_VOICE_WORKERS = int(os.getenv("SCHEDULER_VOICE_WORKERS", str(max(1, GIGACHAT_MAX_CONCURRENCY // 2))))
+# Сколько текстовых сообщений берётся перед одним голосовым, когда ждут и те, и другие
+SCHEDULER_TEXT_WEIGHT = int(os.getenv("SCHEDULER_TEXT_WEIGHT", "4"))
+# Сколько сообщений одного пользователя может ждать; при переполнении - отказ
+SCHEDULER_USER_QUEUE = int(os.getenv("SCHEDULER_USER_QUEUE", "5"))
+# Новое сообщение в течение стольких секунд отменяет предыдущее, ещё не записанное
+# в календарь (быстрое исправление: "нет, в 16:00"); 0 - не отменять. По умолчанию
+# выключено: два разных события подряд иначе теряют первое
+SCHEDULER_SUPERSEDE_WINDOW = float(os.getenv("SCHEDULER_SUPERSEDE_WINDOW", "0"))
+
+# ============= ПУЛЫ ПОТОКОВ =============
+# Отдельные пулы по классам нагрузки, чтобы медленная стадия не занимала потоки остальных
+# (Redis и Google API - асинхронные клиенты на event loop, пулы им не нужны)
+EXECUTOR_LLM_WORKERS = int(os.getenv("EXECUTOR_LLM_WORKERS", "8"))
+EXECUTOR_OAUTH_WORKERS = int(os.getenv("EXECUTOR_OAUTH_WORKERS", "2"))
 
 # ============= GOOGLE CALENDAR =============
 GOOGLE_CREDENTIALS_FILE = "credentials.json"
+# REST endpoint Google Calendar API v3
+GOOGLE_CALENDAR_API_URL = os.getenv("GOOGLE_CALENDAR_API_URL", "https://www.googleapis.com/calendar/v3").rstrip("/")
+# Batch endpoint: несколько events.insert одним HTTP запросом (multipart/mixed)
+GOOGLE_CALENDAR_BATCH_URL = os.getenv("GOOGLE_CALENDAR_BATCH_URL", "https://www.googleapis.com/batch/calendar/v3")
+# Размер пула keep-alive соединений к Google API (общий на все запросы процесса)
+GOOGLE_HTTP_POOL_SIZE = int(os.getenv("GOOGLE_HTTP_POOL_SIZE", "20"))
+# Таймаут HTTP запроса к Google API, секунд
+GOOGLE_HTTP_TIMEOUT = float(os.getenv("GOOGLE_HTTP_TIMEOUT", "15"))
+# Сколько держать простаивающее соединение к Google открытым, секунд
+GOOGLE_HTTP_KEEPALIVE = float(os.getenv("GOOGLE_HTTP_KEEPALIVE", "60"))
+# Кэш access token в памяти процесса: максимум пользователей и предельный TTL записи, секунд
+CALENDAR_CACHE_SIZE = int(os.getenv("CALENDAR_CACHE_SIZE", "1000"))
+CALENDAR_CACHE_TTL = int(os.getenv("CALENDAR_CACHE_TTL", "1800"))
+# Access token считается истёкшим за столько секунд до фактического expiry
+TOKEN_EXPIRY_SKEW = int(os.getenv("TOKEN_EXPIRY_SKEW", "60"))
+# Фоновое обновление access token незадолго до истечения (для недавно активных пользователей)
+TOKEN_REFRESH_ENABLED = os.getenv("TOKEN_REFRESH_ENABLED", "1") == "1"
+# Период проверки, за сколько секунд до истечения обновлять, окно активности и размер пачки
+TOKEN_REFRESH_INTERVAL = int(os.getenv("TOKEN_REFRESH_INTERVAL", "60"))
+TOKEN_REFRESH_LEAD = int(os.getenv("TOKEN_REFRESH_LEAD", "600"))
+TOKEN_REFRESH_ACTIVE_WINDOW = int(os.getenv("TOKEN_REFRESH_ACTIVE_WINDOW", str(7 * 24 * 3600)))
+TOKEN_REFRESH_BATCH = int(os.getenv("TOKEN_REFRESH_BATCH", "100"))
+# Как часто записывать активность пользователя в Redis, секунд
+ACTIVITY_TOUCH_INTERVAL = int(os.getenv("ACTIVITY_TOUCH_INTERVAL", "600"))
+# Время жизни незавершённой OAuth авторизации, секунд
+OAUTH_FLOW_TTL = int(os.getenv("OAUTH_FLOW_TTL", "600"))
+# Индекс ближайших событий пользователя в Redis (предупреждение о пересечениях и свободное время)
+CALENDAR_INDEX_ENABLED = os.getenv("CALENDAR_INDEX_ENABLED", "1") == "1"
+# Горизонт индекса, дней: события дальше не хранятся (полная синхронизация, когда остаётся половина)
+CALENDAR_INDEX_HORIZON_DAYS = int(os.getenv("CALENDAR_INDEX_HORIZON_DAYS", "30"))
+# Максимум событий на пользователя (ближайшие); после последнего проверка не выполняется
+CALENDAR_INDEX_MAX_EVENTS = int(os.getenv("CALENDAR_INDEX_MAX_EVENTS", "500"))
+# Индекс без обращений удаляется из Redis через столько секунд
+CALENDAR_INDEX_TTL = int(os.getenv("CALENDAR_INDEX_TTL", str(7 * 24 * 3600)))
+# Перед проверкой индекс досинхронизируется по syncToken, если последняя синхронизация старше, секунд
+CALENDAR_SYNC_INTERVAL = int(os.getenv("CALENDAR_SYNC_INTERVAL", "60"))
+# Сколько страниц events.list (по 250 событий) читать за одну синхронизацию; больше - индекс не строится
+CALENDAR_SYNC_MAX_PAGES = int(os.getenv("CALENDAR_SYNC_MAX_PAGES", "20"))
+# После неудачной синхронизации (ошибка или слишком много страниц) следующая - не раньше чем через, секунд
+CALENDAR_SYNC_BACKOFF = int(os.getenv("CALENDAR_SYNC_BACKOFF", "900"))
 
 # ============= REDIS =============
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Пул соединений: максимум соединений процесса и сколько ждать свободного, секунд
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "5"))
+# Таймаут подключения и ответа Redis, секунд
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "5"))
+# Проверка простаивающего соединения перед использованием, секунд
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+# Локальный кэш токенов и статуса подключения (в том числе "не подключен"):
+# TTL записи, секунд (страховка на случай потерянной инвалидации через pub/sub) и размер
+TOKEN_CACHE_TTL = int(os.getenv("TOKEN_CACHE_TTL", "60"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+# TTL состояния и данных FSM в Redis, секунд (0 - без ограничения)
+FSM_STATE_TTL = int(os.getenv("FSM_STATE_TTL", "3600"))
+# Кэш результатов парсинга событий: TTL в Redis (секунд) и размер LRU в памяти процесса
+PARSE_CACHE_TTL = int(os.getenv("PARSE_CACHE_TTL", "86400"))
+PARSE_CACHE_LOCAL_SIZE = int(os.getenv("PARSE_CACHE_LOCAL_SIZE", "1024"))
+# Кэш расшифровок по file_unique_id голосового (пересланные голосовые не распознаются заново):
+# TTL с последнего обращения (секунд, 0 - кэш выключен) и предельный общий размер в Redis
+TRANSCRIPT_CACHE_TTL = int(os.getenv("TRANSCRIPT_CACHE_TTL", str(7 * 24 * 3600)))
+TRANSCRIPT_CACHE_MAX_BYTES = int(os.getenv("TRANSCRIPT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
 
 # ============= ПРОМПТЫ =============
 
 TRANSCRIPTION_PROMPT = """Расшифруй аудиофайл и верни только текст, который был сказан. 
 Без комментариев, только расшифровка речи."""
 
-EVENT_EXTRACTION_PROMPT = """Ты помощник для создания событий в календаре. 
-Из сообщения пользователя извлеки информацию о событии и верни JSON в формате:
-{{
-    "title": "название события",
-    "date": "YYYY-MM-DD",
-    "time_start": "HH:MM",
-    "time_end": "HH:MM",
-    "description": "описание события (опционально)",
-    "color": "цвет события (опционально)"
-}}
+# Формат и правила извлечения событий - общие для текста и голосового в один вызов
+_EVENT_RULES = """[
+    {{
+        "title": "название события",
+        "date": "YYYY-MM-DD",
+        "time_start": "HH:MM",
+        "time_end": "HH:MM",
+        "description": "описание события (опционально)",
+        "color": "цвет события (опционально)"
+    }}
+]
+
+Если в сообщении несколько событий (например: "в понедельник и в среду в 10 планёрка"
+или расписание на неделю) - верни отдельный объект для каждого события.
+Если событие одно - верни массив из одного объекта.
 
 Если какая-то информация не указана, используй разумные значения по умолчанию:
 - Если не указана дата - используй сегодняшнюю
@@ -67,6 +221,60 @@ EVENT_EXTRACTION_PROMPT = """Ты помощник для создания со
 Если пользователь указал цвет (например: "с красным цветом", "красное событие", "пометь красным") - добавь его в поле color.
 
 Сегодняшняя дата: {today}
+"""
 
-ВАЖНО: Верни ТОЛЬКО JSON без дополнительного текста.
+EVENT_EXTRACTION_PROMPT = """Ты помощник для создания событий в календаре. 
+Из сообщения пользователя извлеки информацию о событиях и верни JSON массив в формате:
+""" + _EVENT_RULES + """
+ВАЖНО: Верни ТОЛЬКО JSON массив без дополнительного текста.
 """
+
+# Без заключительных строк TRANSCRIPTION_PROMPT ("только текст") и EVENT_EXTRACTION_PROMPT
+# ("только массив") - иначе модель может вернуть не тот формат ответа
+VOICE_COMBINED_PROMPT = """Тебе прислали голосовое сообщение. Ты помощник для создания событий в календаре.
+Расшифруй речь дословно, без комментариев, и извлеки из расшифровки события.
+
+События - JSON массив в формате:
+""" + _EVENT_RULES + """
+ВАЖНО: Верни ТОЛЬКО один JSON объект без дополнительного текста:
+{{
+    "transcript": "расшифровка речи",
+    "events": [ ...JSON массив событий... ]
+}}
+"""
+
+
+def validate_config():
+    """
+    Проверить обязательные настройки перед запуском бота.
+    
+    Raises:
+        ValueError: со всеми найденными ошибками сразу
+    """
+    errors = []
+    if not TELEGRAM_BOT_TOKEN:
+        errors.append(
+            "❌ TELEGRAM_BOT_TOKEN не установлен!\n"
+            "Установите переменную окружения:\n"
+            "  export TELEGRAM_BOT_TOKEN='your_token'\n"
+            "Или создайте файл .env с содержимым:\n"
+            "  TELEGRAM_BOT_TOKEN=your_token"
+        )
+    if not AUTHORIZATION_KEY:
+        errors.append(
+            "❌ GIGACHAT_AUTH_KEY не установлен!\n"
+            "Установите переменную окружения:\n"
+            "  export GIGACHAT_AUTH_KEY='your_key'\n"
+            "Или создайте файл .env с содержимым:\n"
+            "  GIGACHAT_AUTH_KEY=your_key"
+        )
+    if BOT_MODE not in ("polling", "webhook"):
+        errors.append(f"❌ Неизвестный BOT_MODE: {BOT_MODE} (ожидается polling или webhook)")
+    if BOT_MODE == "webhook" and not WEBHOOK_URL:
+        errors.append(
+            "❌ WEBHOOK_URL не установлен!\n"
+            "В режиме BOT_MODE=webhook укажите публичный адрес бота:\n"
+            "  export WEBHOOK_URL='https://bot.example.com'"
+        )
+    if errors:
+        raise ValueError("\n\n".join(errors))
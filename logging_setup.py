@@ -0,0 +1,120 @@
+"""
+Настройка логирования процесса.
+
+- Запись в stdout идёт из отдельного потока (QueueHandler + QueueListener),
+  рабочие потоки и event loop только кладут запись в очередь.
+- Объёмные данные (ответы API, тела событий) логируются через LazyJson и
+  extra=PAYLOAD: сериализация происходит только если уровень включён и запись
+  прошла сэмплирование LOG_PAYLOAD_SAMPLE_RATE.
+- LOG_FORMAT=json - однострочные JSON записи для сборщика логов.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from config import LOG_LEVEL, LOG_FORMAT, LOG_PAYLOAD_SAMPLE_RATE
+
+# Пометка записи с объёмными данными: logger.info("...: %s", LazyJson(data), extra=PAYLOAD)
+PAYLOAD = {"payload": True}
+
+_TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class LazyJson:
+    """Сериализуется в JSON только при форматировании записи"""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: Any):
+        self.data = data
+
+    def __str__(self) -> str:
+        return json.dumps(self.data, ensure_ascii=False, default=str)
+
+
+class PayloadSampler(logging.Filter):
+    """Пропускает долю rate записей с extra=PAYLOAD, остальные - всегда"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "payload", False):
+            return True
+        return self.rate >= 1 or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """Однострочная JSON запись"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # Запись из очереди: _QueueHandler уже превратил exc_info в текст
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который не форматирует запись в вызывающем потоке"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Стандартный prepare() форматирует сообщение здесь же; нам достаточно
+        # отвязать exc_info от фрейма - форматирование сделает поток listener'а
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(
+    level: str = LOG_LEVEL,
+    fmt: str = LOG_FORMAT,
+    payload_sample_rate: float = LOG_PAYLOAD_SAMPLE_RATE,
+    stream=None,
+) -> logging.handlers.QueueListener:
+    """Настроить корневой логгер; повторный вызов перенастраивает"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+    else:
+        atexit.register(stop_logging)
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(_TEXT_FORMAT))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(PayloadSampler(payload_sample_rate))
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Дописать очередь и остановить поток записи"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
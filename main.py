@@ -1,13 +1,135 @@
 import asyncio
+from functools import cached_property
 
-from bot import dp, bot
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from bot import create_bot, create_dispatcher
+from bot.web import create_app
+from logging_setup import setup_logging
+from config import (
+    BOT_MODE,
+    HTTP_HOST,
+    HTTP_PORT,
+    WEBHOOK_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    TOKEN_REFRESH_ENABLED,
+    validate_config,
+)
+from services import calendar_service
+from services.executors import shutdown_executors
+from services.file_reaper import file_reaper
+from services.gigachat_service import gigachat_service
+from services.scheduler import scheduler
+from services.storage import storage
+from services.token_refresher import token_refresher
+from services.transcoder import transcoder
+
+
+class Application:
+    """
+    Контейнер приложения: бот, диспетчер, фоновые задачи и их остановка.
+
+    Ничего не создаётся при импорте: бот и диспетчер - при первом обращении,
+    клиенты сервисов (Redis, GigaChat, Google) - при первом запросе к ним.
+    Сервисы - синглтоны модулей services, по одному клиенту на процесс.
+    """
+
+    def __init__(self):
+        self._background_tasks: list[asyncio.Task] = []
+
+    @cached_property
+    def bot(self) -> Bot:
+        return create_bot()
+
+    @cached_property
+    def dp(self) -> Dispatcher:
+        return create_dispatcher()
+
+    def start_background_tasks(self):
+        """Фоновые задачи (внутри работающего event loop)"""
+        self._background_tasks.append(asyncio.create_task(storage.listen_invalidations()))
+        self._background_tasks.append(asyncio.create_task(file_reaper.run(gigachat_service)))
+        if TOKEN_REFRESH_ENABLED:
+            self._background_tasks.append(asyncio.create_task(token_refresher.run()))
+
+    async def close(self):
+        """Остановить фоновые задачи и закрыть клиентов"""
+        for task in self._background_tasks:
+            task.cancel()
+        await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        self._background_tasks = []
+        await scheduler.close()
+        await transcoder.close()
+        shutdown_executors()
+        await calendar_service.close()
+        await storage.close()
+        if "bot" in self.__dict__:
+            await self.bot.session.close()
+
+    async def _start_http_server(self, app: web.Application) -> web.AppRunner:
+        """Поднять HTTP сервер (пробы и, в режиме webhook, приём обновлений)"""
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, HTTP_HOST, HTTP_PORT)
+        await site.start()
+        print(f"🌐 HTTP сервер слушает {HTTP_HOST}:{HTTP_PORT}")
+        return runner
+
+    async def run_polling(self):
+        """Long polling - для локальной разработки"""
+        runner = await self._start_http_server(create_app())
+        try:
+            # Webhook и polling взаимоисключающие - снимаем webhook, если он был установлен
+            await self.bot.delete_webhook()
+            await self.dp.start_polling(self.bot)
+        finally:
+            await runner.cleanup()
+
+    async def run_webhook(self):
+        """Webhook - обновления приходят HTTP запросами, можно балансировать между подами"""
+        app = create_app()
+        SimpleRequestHandler(
+            dispatcher=self.dp,
+            bot=self.bot,
+            secret_token=WEBHOOK_SECRET,
+        ).register(app, path=WEBHOOK_PATH)
+        setup_application(app, self.dp, bot=self.bot)
+
+        runner = await self._start_http_server(app)
+        try:
+            await self.bot.set_webhook(
+                f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=self.dp.resolve_used_update_types(),
+            )
+            print(f"🔗 Webhook установлен: {WEBHOOK_URL}{WEBHOOK_PATH}")
+            # Webhook не снимаем при остановке: другие реплики продолжают принимать обновления
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    async def run(self):
+        """Запустить бота в режиме BOT_MODE и остановить всё при выходе"""
+        self.start_background_tasks()
+        try:
+            if BOT_MODE == "webhook":
+                await self.run_webhook()
+            else:
+                await self.run_polling()
+        finally:
+            await self.close()
 
 
 async def main():
     """Запуск бота"""
-    print("🤖 Бот запущен...")
+    validate_config()
+    setup_logging()
+    print(f"🤖 Бот запущен (режим: {BOT_MODE})...")
     print("📋 Используется GigaChat для распознавания речи и парсинга событий")
-    await dp.start_polling(bot)
+    await Application().run()
 
 
 if __name__ == "__main__":
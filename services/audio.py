@@ -0,0 +1,94 @@
+import logging
+from typing import Optional
+
+from config import (
+    FFMPEG_BINARY,
+    AUDIO_PREPROCESS_ENABLED,
+    AUDIO_SILENCE_THRESHOLD_DB,
+    AUDIO_SILENCE_MIN_DURATION,
+    AUDIO_SILENCE_KEEP,
+    AUDIO_SAMPLE_RATE,
+    AUDIO_BITRATE_KBPS,
+)
+from services.metrics import AUDIO_BYTES, AUDIO_BYTES_SAVED, AUDIO_PREPROCESS, AUDIO_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Настройки MP3 по умолчанию у ffmpeg (libmp3lame) - с ними сравнивается экономия
+_DEFAULT_BITRATE_KBPS = 128
+
+AUDIO_PREPROCESS.set(1 if AUDIO_PREPROCESS_ENABLED else 0)
+
+
+class AudioConversionError(RuntimeError):
+    """Ошибка конвертации аудио через ffmpeg"""
+
+
+def silence_trim_filter() -> str:
+    """
+    Фильтр ffmpeg: обрезка тишины в начале и в конце по уровню сигнала.
+    
+    silenceremove срезает только начало, поэтому конец обрезается тем же
+    фильтром на развёрнутом звуке. Паузы внутри фразы не трогаем.
+    """
+    trim = (
+        "silenceremove=start_periods=1"
+        f":start_duration={AUDIO_SILENCE_MIN_DURATION}"
+        f":start_threshold={AUDIO_SILENCE_THRESHOLD_DB}dB"
+        f":start_silence={AUDIO_SILENCE_KEEP}"
+    )
+    return f"{trim},areverse,{trim},areverse"
+
+
+def ffmpeg_mp3_args(preprocess: bool = AUDIO_PREPROCESS_ENABLED) -> list[str]:
+    """
+    Аргументы ffmpeg: OGG/Opus со stdin -> MP3 в stdout.
+    
+    Args:
+        preprocess: обрезать тишину, свести в моно и кодировать с речевыми
+            частотой и битрейтом; иначе - настройки MP3 по умолчанию
+    """
+    args = [
+        FFMPEG_BINARY,
+        "-hide_banner",
+        "-loglevel", "error",
+        "-i", "pipe:0",
+        "-vn",
+    ]
+    if preprocess:
+        args += [
+            "-af", silence_trim_filter(),
+            "-ac", "1",
+            "-ar", str(AUDIO_SAMPLE_RATE),
+            "-b:a", f"{AUDIO_BITRATE_KBPS}k",
+        ]
+    args += ["-f", "mp3", "pipe:1"]
+    return args
+
+
+def report_conversion(ogg_size: int, mp3_size: int, duration: Optional[float] = None):
+    """
+    Записать метрики конвертации.
+    
+    Args:
+        ogg_size: размер исходного голосового
+        mp3_size: размер MP3, который уйдёт в GigaChat
+        duration: длительность голосового из Telegram, секунд (если известна)
+    """
+    AUDIO_BYTES.labels(stage="input").inc(ogg_size)
+    AUDIO_BYTES.labels(stage="upload").inc(mp3_size)
+    message = f"🎛️ OGG {ogg_size} байт -> MP3 {mp3_size} байт"
+    
+    if duration and AUDIO_PREPROCESS_ENABLED:
+        # Битрейт постоянный, поэтому длительность после обрезки видна по размеру
+        uploaded = min(duration, mp3_size * 8 / (AUDIO_BITRATE_KBPS * 1000))
+        saved = max(0, int(duration * _DEFAULT_BITRATE_KBPS * 1000 / 8) - mp3_size)
+        AUDIO_SECONDS.labels(stage="input").inc(duration)
+        AUDIO_SECONDS.labels(stage="upload").inc(uploaded)
+        AUDIO_BYTES_SAVED.inc(saved)
+        message += f", {duration:.0f}s -> {uploaded:.1f}s, сэкономлено ~{saved} байт"
+    elif duration:
+        AUDIO_SECONDS.labels(stage="input").inc(duration)
+        AUDIO_SECONDS.labels(stage="upload").inc(duration)
+    logger.debug(message)
+
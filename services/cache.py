@@ -0,0 +1,58 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class LRUCache:
+    """Потокобезопасный LRU кэш в памяти процесса с TTL на запись"""
+    
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # {key: (value, expires_at)}
+        self._data: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Получить значение (истекшие записи удаляются)"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+    
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Сохранить значение; ttl переопределяет TTL кэша для этой записи"""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else float("inf")
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            # Заодно выбрасываем давно неиспользуемые истекшие записи
+            now = time.monotonic()
+            while self._data:
+                oldest_key, (_, oldest_expires_at) = next(iter(self._data.items()))
+                if oldest_expires_at > now:
+                    break
+                del self._data[oldest_key]
+    
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Удалить запись"""
+        with self._lock:
+            item = self._data.pop(key, None)
+        return item[0] if item is not None else default
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def __len__(self) -> int:
+        return len(self._data)
@@ -1,22 +1,67 @@
+import asyncio
+import email
 import json
 import logging
+import re
 import time
-from typing import Optional
+import uuid
+import weakref
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Optional
+from urllib.parse import urlsplit
 
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+import aiohttp
 
-from config import GOOGLE_CREDENTIALS_FILE
+from config import (
+    ACTIVITY_TOUCH_INTERVAL,
+    CALENDAR_CACHE_SIZE,
+    CALENDAR_CACHE_TTL,
+    CALENDAR_INDEX_ENABLED,
+    CALENDAR_SYNC_MAX_PAGES,
+    GOOGLE_CALENDAR_API_URL,
+    GOOGLE_CALENDAR_BATCH_URL,
+    GOOGLE_CREDENTIALS_FILE,
+    GOOGLE_HTTP_KEEPALIVE,
+    GOOGLE_HTTP_POOL_SIZE,
+    GOOGLE_HTTP_TIMEOUT,
+    OAUTH_FLOW_TTL,
+    TOKEN_EXPIRY_SKEW,
+)
+from logging_setup import LazyJson, PAYLOAD
+from services.cache import LRUCache
+from services.executors import oauth_executor, spawn
+from services.event_index import SYNC_FULL, SYNC_INCREMENTAL, event_index
+from services.metrics import (
+    CALENDAR_CONFLICTS,
+    CALENDAR_SYNC,
+    CALENDAR_SYNC_CHANGES,
+    CALENDAR_SYNC_PAGES,
+    stage_timer,
+)
 from services.storage import storage
 
+if TYPE_CHECKING:
+    # google-auth загружается при первом обращении к пользователю, не при импорте
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
 logger = logging.getLogger(__name__)
 
 # Права доступа к календарю
 SCOPES = ["https://www.googleapis.com/auth/calendar"]
 
+# Сколько запросов Calendar API принимает в одном batch
+BATCH_MAX_REQUESTS = 50
+
+# Адреса методов Calendar API - общие для всех пользователей, собираются один раз
+EVENTS_INSERT_URL = f"{GOOGLE_CALENDAR_API_URL}/calendars/primary/events"
+# Тот же метод внутри batch запроса - путь без хоста
+EVENTS_INSERT_PATH = urlsplit(EVENTS_INSERT_URL).path
+# events.list - тот же ресурс, GET запрос
+EVENTS_LIST_URL = EVENTS_INSERT_URL
+# Событий на странице events.list при синхронизации индекса
+SYNC_PAGE_SIZE = 250
+
 # Маппинг цветов на colorId Google Calendar
 # https://developers.google.com/calendar/api/v3/reference/colors
 COLOR_MAP = {
@@ -41,24 +86,93 @@ COLOR_MAP = {
 }
 
 
+def _encode_batch(path: str, bodies: list[dict], boundary: str) -> bytes:
+    """Тело batch запроса: по одному events.insert на часть multipart/mixed"""
+    parts = []
+    for index, body in enumerate(bodies):
+        parts.append(
+            f"--{boundary}\r\n"
+            "Content-Type: application/http\r\n"
+            f"Content-ID: <item{index}>\r\n\r\n"
+            f"POST {path} HTTP/1.1\r\n"
+            "Content-Type: application/json; charset=UTF-8\r\n\r\n"
+            f"{json.dumps(body, ensure_ascii=False)}\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n")
+    return "".join(parts).encode()
+
+
+def _decode_batch(body: bytes, content_type: str) -> dict[int, tuple[int, Optional[dict]]]:
+    """Ответ batch запроса: {номер запроса: (HTTP статус, JSON тело)}"""
+    message = email.message_from_bytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+    results = {}
+    for part in message.get_payload() if message.is_multipart() else []:
+        match = re.search(r"item(\d+)", part.get("Content-ID", ""))
+        raw = part.get_payload(decode=True) or b""
+        head, _, payload = raw.replace(b"\r\n", b"\n").partition(b"\n\n")
+        status_line = head.split(b"\n", 1)[0].split()
+        if not match or len(status_line) < 2:
+            continue
+        try:
+            data = json.loads(payload) if payload.strip() else None
+        except json.JSONDecodeError:
+            data = None
+        results[int(match.group(1))] = (int(status_line[1]), data)
+    return results
+
+
 class CalendarService:
-    """Сервис для работы с Google Calendar API (многопользовательский)"""
+    """
+    Сервис для работы с Google Calendar API (многопользовательский).
+    
+    Клиент один на процесс: общий пул соединений aiohttp и заранее собранные
+    адреса методов. От пользователя в запросе только заголовок Authorization
+    с его access token.
+    """
     
     def __init__(self):
-        # Кэш сервисов для пользователей (в памяти для производительности)
-        self._services: dict[int, any] = {}
-        # Pending flows для OAuth (в памяти, так как содержат lambda функции)
-        # Формат: {user_id: (flow, timestamp)}
-        self._pending_flows: dict[int, tuple] = {}
-        # TTL для flows (10 минут)
-        self._flow_ttl = 600
+        # Кэш access token пользователей: ограничен по размеру, запись живёт
+        # не дольше токена (после истечения - перечитываем из Redis). Полные
+        # Credentials нужны только для обновления токена и в памяти не держатся
+        self._tokens = LRUCache(maxsize=CALENDAR_CACHE_SIZE, ttl=CALENDAR_CACHE_TTL)
+        # Когда пользователь последний раз отмечался активным (чтобы не писать в Redis на каждое сообщение)
+        self._touched = LRUCache(maxsize=CALENDAR_CACHE_SIZE, ttl=ACTIVITY_TOUCH_INTERVAL)
+        # Общий пул HTTP соединений к Google (создаётся лениво внутри event loop)
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Блокировки индекса событий по пользователям: синхронизация и дописывание
+        # созданных событий читают и перезаписывают одну запись в Redis
+        self._index_locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+        # Токен изменили на другой реплике - забываем закэшированный access token
+        storage.add_token_listener(self._tokens.pop)
     
-    def _get_credentials(self, user_id: int) -> Optional[Credentials]:
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Получить общую HTTP сессию с пулом keep-alive соединений"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=GOOGLE_HTTP_POOL_SIZE,
+                ttl_dns_cache=300,
+                keepalive_timeout=GOOGLE_HTTP_KEEPALIVE,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=GOOGLE_HTTP_TIMEOUT),
+            )
+        return self._session
+    
+    async def close(self):
+        """Закрыть HTTP сессию (при остановке бота)"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+    
+    async def _load_credentials(self, user_id: int) -> Optional["Credentials"]:
         """Получить credentials из хранилища"""
-        token_data = storage.get_token(user_id)
+        token_data = await storage.get_token(user_id)
         if not token_data:
             return None
         
+        from google.oauth2.credentials import Credentials
+        
         try:
             creds = Credentials.from_authorized_user_info(token_data, SCOPES)
             return creds
@@ -66,175 +180,371 @@ class CalendarService:
             logger.error(f"❌ Ошибка загрузки credentials: {e}")
             return None
     
-    def _save_credentials(self, user_id: int, creds: Credentials) -> bool:
+    async def _save_credentials(self, user_id: int, creds: "Credentials") -> bool:
         """Сохранить credentials в хранилище"""
         try:
             token_data = json.loads(creds.to_json())
-            return storage.save_token(user_id, token_data)
         except Exception as e:
             logger.error(f"❌ Ошибка сохранения credentials: {e}")
             return False
+        return await storage.save_token(user_id, token_data)
     
-    def get_service(self, user_id: int):
-        """Получить Google Calendar service для пользователя"""
-        # Проверяем кэш
-        if user_id in self._services:
-            return self._services[user_id]
-        
-        # Пытаемся получить credentials
-        creds = self._get_credentials(user_id)
+    async def _refresh_credentials(self, creds: "Credentials") -> None:
+        """Обновить access token через refresh token (без блокировки event loop)"""
+        session = self._get_session()
+        payload = {
+            "grant_type": "refresh_token",
+            "client_id": creds.client_id,
+            "client_secret": creds.client_secret,
+            "refresh_token": creds.refresh_token,
+        }
+        with stage_timer("google_token_refresh"):
+            async with session.post(creds.token_uri, data=payload) as resp:
+                data = await resp.json(content_type=None)
+                if resp.status != 200:
+                    raise RuntimeError(f"token refresh failed ({resp.status}): {data}")
+        
+        creds.token = data["access_token"]
+        # google-auth хранит expiry как naive UTC
+        creds.expiry = datetime.utcnow() + timedelta(seconds=int(data.get("expires_in", 3600)))
+    
+    def _cache_token(self, user_id: int, creds: "Credentials"):
+        """Положить access token в кэш до его истечения"""
+        ttl = CALENDAR_CACHE_TTL
+        if creds.expiry is not None:
+            ttl = min(ttl, (creds.expiry - datetime.utcnow()).total_seconds() - TOKEN_EXPIRY_SKEW)
+        if ttl > 0 and creds.token:
+            self._tokens.set(user_id, creds.token, ttl=ttl)
+        else:
+            self._tokens.pop(user_id)
+    
+    def cache_stats(self) -> dict:
+        """Статистика кэша access token"""
+        return {
+            "cached_users": len(self._tokens),
+            "max_users": self._tokens.maxsize,
+        }
+    
+    def _touch(self, user_id: int):
+        """Отметить активность пользователя в Redis (не чаще раза в ACTIVITY_TOUCH_INTERVAL)"""
+        if self._touched.get(user_id):
+            return
+        self._touched.set(user_id, True)
+        spawn(storage.touch_user(user_id))
+    
+    async def get_access_token(self, user_id: int) -> Optional[str]:
+        """Получить действующий access token пользователя (с обновлением токена)"""
+        self._touch(user_id)
+        # Запись в кэше живёт не дольше токена - если она есть, токен действует
+        token = self._tokens.get(user_id)
+        if token is not None:
+            return token
+        
+        # Промах или истёкший токен - перечитываем из Redis (мог обновиться на другой реплике)
+        creds = await self._load_credentials(user_id)
         if not creds:
+            self._tokens.pop(user_id)
+            return None
+        
+        if creds.valid:
+            self._cache_token(user_id, creds)
+            return creds.token
+        
+        if not (creds.expired and creds.refresh_token):
+            logger.warning(f"⚠️ Токен пользователя {user_id} невалиден")
+            self._tokens.pop(user_id)
             return None
         
         try:
-            if not creds.valid:
-                if creds.expired and creds.refresh_token:
-                    logger.info(f"🔄 Обновляю токен для пользователя {user_id}...")
-                    creds.refresh(Request())
-                    # Сохраняем обновленный токен
-                    self._save_credentials(user_id, creds)
-                else:
-                    logger.warning(f"⚠️ Токен пользователя {user_id} невалиден")
-                    return None
-            
-            service = build("calendar", "v3", credentials=creds)
-            self._services[user_id] = service
+            logger.info(f"🔄 Обновляю токен для пользователя {user_id}...")
+            await self._refresh_credentials(creds)
+            # Сохраняем обновленный токен
+            await self._save_credentials(user_id, creds)
+            self._cache_token(user_id, creds)
             logger.info(f"✅ Google Calendar подключен для пользователя {user_id}")
-            return service
-            
+            return creds.token
         except Exception as e:
             logger.error(f"❌ Ошибка авторизации пользователя {user_id}: {e}")
             # Если токен невалиден, удаляем его
-            storage.delete_token(user_id)
+            self._tokens.pop(user_id)
+            await storage.delete_token(user_id)
             return None
     
-    def is_user_authenticated(self, user_id: int) -> bool:
+    async def refresh_token(self, user_id: int) -> bool:
+        """Проактивно обновить access token (фоновая задача, см. services.token_refresher)"""
+        creds = await self._load_credentials(user_id)
+        if not creds or not creds.refresh_token:
+            return False
+        try:
+            await self._refresh_credentials(creds)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось обновить токен пользователя {user_id}: {e}")
+            return False
+        if not await self._save_credentials(user_id, creds):
+            return False
+        self._cache_token(user_id, creds)
+        logger.info(f"🔄 Токен пользователя {user_id} обновлён заранее")
+        return True
+    
+    async def is_user_authenticated(self, user_id: int) -> bool:
         """Проверка авторизации пользователя"""
-        return self.get_service(user_id) is not None
+        return await self.get_access_token(user_id) is not None
     
-    def _cleanup_expired_flows(self):
-        """Очистить истекшие flows"""
-        current_time = time.time()
-        expired_users = [
-            user_id for user_id, (_, timestamp) in self._pending_flows.items()
-            if current_time - timestamp > self._flow_ttl
-        ]
-        for user_id in expired_users:
-            del self._pending_flows[user_id]
-            logger.debug(f"🧹 Удалён истекший flow для пользователя {user_id}")
+    def _create_flow(self, state: Optional[str] = None) -> "InstalledAppFlow":
+        """Создать OAuth flow из client secrets"""
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        
+        return InstalledAppFlow.from_client_secrets_file(
+            GOOGLE_CREDENTIALS_FILE,
+            SCOPES,
+            state=state,
+            redirect_uri="urn:ietf:wg:oauth:2.0:oob",  # Для ручного ввода кода
+            autogenerate_code_verifier=True,
+        )
+    
+    def _start_flow(self) -> tuple[str, dict]:
+        """URL авторизации и состояние flow (чтение client secrets с диска)"""
+        flow = self._create_flow()
+        auth_url, state = flow.authorization_url(
+            access_type='offline',
+            include_granted_scopes='true',
+            prompt='consent'
+        )
+        return auth_url, {"state": state, "code_verifier": flow.code_verifier}
+    
+    def _finish_flow(self, flow_data: dict, auth_code: str) -> "Credentials":
+        """Обменять код на токены (блокирующий HTTP запрос)"""
+        flow = self._create_flow(state=flow_data.get("state"))
+        flow.code_verifier = flow_data.get("code_verifier")
+        flow.fetch_token(code=auth_code)
+        return flow.credentials
     
-    def get_auth_url(self, user_id: int) -> Optional[str]:
+    async def get_auth_url(self, user_id: int) -> Optional[str]:
         """Получить URL для авторизации пользователя"""
         import os
         if not os.path.exists(GOOGLE_CREDENTIALS_FILE):
             logger.error(f"❌ Файл {GOOGLE_CREDENTIALS_FILE} не найден!")
             return None
         
-        # Очищаем истекшие flows перед созданием нового
-        self._cleanup_expired_flows()
-        
         try:
-            flow = InstalledAppFlow.from_client_secrets_file(
-                GOOGLE_CREDENTIALS_FILE, 
-                SCOPES,
-                redirect_uri="urn:ietf:wg:oauth:2.0:oob"  # Для ручного ввода кода
-            )
-            auth_url, _ = flow.authorization_url(
-                access_type='offline',
-                include_granted_scopes='true',
-                prompt='consent'
-            )
-            # Сохраняем flow в памяти с timestamp (TTL 10 минут)
-            self._pending_flows[user_id] = (flow, time.time())
-            logger.info(f"💾 OAuth flow пользователя {user_id} сохранён в памяти (TTL: {self._flow_ttl}s)")
+            auth_url, flow_data = await oauth_executor.run(self._start_flow)
+            # Сохраняем state и code_verifier в Redis, истечение - через TTL ключа
+            if not await storage.save_oauth_flow(user_id, flow_data, OAUTH_FLOW_TTL):
+                return None
+            logger.info(f"💾 OAuth flow пользователя {user_id} сохранён в Redis (TTL: {OAUTH_FLOW_TTL}s)")
             return auth_url
         except Exception as e:
             logger.error(f"❌ Ошибка создания auth URL: {e}")
             return None
     
-    def complete_auth(self, user_id: int, auth_code: str) -> bool:
+    async def complete_auth(self, user_id: int, auth_code: str) -> bool:
         """Завершить авторизацию с полученным кодом"""
-        # Очищаем истекшие flows перед проверкой
-        self._cleanup_expired_flows()
-        
-        flow_data = self._pending_flows.get(user_id)
+        # Забираем flow атомарно: код одноразовый, повторная попытка требует новой ссылки
+        flow_data = await storage.pop_oauth_flow(user_id)
         if not flow_data:
-            logger.error(f"❌ Нет pending flow для пользователя {user_id}")
-            return False
-        
-        flow, timestamp = flow_data
-        
-        # Проверяем, не истек ли flow
-        if time.time() - timestamp > self._flow_ttl:
-            logger.error(f"❌ Flow для пользователя {user_id} истёк")
-            del self._pending_flows[user_id]
+            logger.error(f"❌ Нет pending flow для пользователя {user_id} (или он истёк)")
             return False
         
         try:
-            flow.fetch_token(code=auth_code)
-            creds = flow.credentials
+            creds = await oauth_executor.run(self._finish_flow, flow_data, auth_code)
             
             # Сохраняем токен в Redis
-            if not self._save_credentials(user_id, creds):
+            if not await storage.save_token(user_id, json.loads(creds.to_json())):
                 return False
             
             logger.info(f"✅ Пользователь {user_id} успешно авторизован")
+            # Индекс мог остаться от другого аккаунта Google
+            await event_index.clear(user_id)
             
-            # Очищаем pending flow из памяти
-            del self._pending_flows[user_id]
-            
-            # Убираем из кэша чтобы пересоздать сервис
-            if user_id in self._services:
-                del self._services[user_id]
+            # Кладём свежий access token в кэш
+            self._cache_token(user_id, creds)
             
             return True
             
         except Exception as e:
             logger.error(f"❌ Ошибка завершения авторизации: {e}")
-            # Удаляем flow при ошибке
-            if user_id in self._pending_flows:
-                del self._pending_flows[user_id]
             return False
     
-    def disconnect(self, user_id: int):
-        """Отключить пользователя от Google Calendar"""
-        storage.delete_token(user_id)
-        if user_id in self._services:
-            del self._services[user_id]
-        logger.info(f"🔓 Пользователь {user_id} отключен от Google Calendar")
+    # ============= Индекс событий (services.event_index) =============
     
-    def create_event(
+    async def check_conflicts(
         self,
         user_id: int,
-        title: str,
-        date: str,
-        time_start: str,
-        time_end: str,
-        description: Optional[str] = None,
+        events: list[dict],
         timezone: str = "Europe/Moscow",
-        color: Optional[str] = None
-    ) -> Optional[dict]:
+    ) -> list[Optional[dict]]:
         """
-        Создание события в Google Calendar пользователя
+        Пересечения новых событий с календарём пользователя до их записи.
         
-        Args:
-            user_id: ID пользователя Telegram
-            title: Название события
-            date: Дата в формате YYYY-MM-DD
-            time_start: Время начала HH:MM
-            time_end: Время окончания HH:MM
-            description: Описание события
-            timezone: Часовой пояс
-            color: Название цвета (русское или английское)
+        Проверка идёт по индексу событий в Redis; перед ней индекс дочитывается
+        по syncToken, если давно не синхронизировался. Ошибка проверки не
+        мешает созданию событий - считаем, что пересечений нет.
         
         Returns:
-            dict с информацией о созданном событии или None при ошибке
+            по каждому событию результат EventIndex.conflicts (None - пересечений нет)
         """
-        service = self.get_service(user_id)
-        if not service:
-            logger.error(f"❌ Google Calendar не подключен для пользователя {user_id}")
-            return None
+        if not CALENDAR_INDEX_ENABLED:
+            return [None] * len(events)
+        try:
+            token = await self.get_access_token(user_id)
+            if not token:
+                return [None] * len(events)
+            
+            async with self._index_lock(user_id):
+                index = await self._synced_index(user_id, token)
+            if index is None:
+                return [None] * len(events)
+            conflicts = event_index.conflicts(index, self._build_event_bodies(events, timezone))
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError, TypeError) as e:
+            # Сеть, неожиданный ответ Google, повреждённый индекс или дата события
+            logger.warning(f"⚠️ Не удалось проверить пересечения для {user_id}: {e}")
+            return [None] * len(events)
+        except Exception:
+            # Ошибка в коде - с трассировкой, но создание событий всё равно не блокируем
+            logger.exception(f"❌ Ошибка проверки пересечений для {user_id}")
+            return [None] * len(events)
+        CALENDAR_CONFLICTS.inc(sum(conflict is not None for conflict in conflicts))
+        return conflicts
+    
+    def _index_lock(self, user_id: int) -> asyncio.Lock:
+        """Блокировка индекса событий пользователя (живёт, пока её кто-то держит)"""
+        lock = self._index_locks.get(user_id)
+        if lock is None:
+            lock = self._index_locks[user_id] = asyncio.Lock()
+        return lock
+    
+    async def _synced_index(self, user_id: int, token: str) -> Optional[dict]:
+        """Индекс событий пользователя, при необходимости синхронизированный с Google"""
+        index = await event_index.load(user_id)
+        kind = event_index.sync_kind(index)
+        if kind is None:
+            return index
+        if await event_index.in_backoff(user_id):
+            # Недавняя синхронизация не удалась - проверяем по последнему состоянию
+            return index
+        
+        if kind == SYNC_INCREMENTAL:
+            synced, outcome = await self._sync_events(user_id, token, index, SYNC_INCREMENTAL)
+            if outcome == "expired":
+                # syncToken больше не принимается (410 Gone) - строим индекс заново
+                kind = SYNC_FULL
+        
+        if kind == SYNC_FULL:
+            synced, outcome = await self._sync_events(user_id, token, event_index.new(), SYNC_FULL)
+        
+        if synced is not None:
+            await event_index.save(user_id, synced)
+            return synced
+        # Google недоступен или календарь слишком большой: не повторяем синхронизацию
+        # на каждом сообщении, а до конца backoff проверяем по последнему состоянию
+        await event_index.mark_failed(user_id, outcome)
+        return await event_index.load(user_id)
+    
+    async def _sync_events(
+        self,
+        user_id: int,
+        token: str,
+        index: dict,
+        kind: str,
+    ) -> tuple[Optional[dict], str]:
+        """
+        Прочитать events.list (все страницы) и применить события к индексу.
+        
+        Returns:
+            (индекс с новым syncToken или None, исход: ok/expired/too_large/error)
+        """
+        params = {"singleEvents": "true", "maxResults": str(SYNC_PAGE_SIZE)}
+        if kind == SYNC_INCREMENTAL:
+            params["syncToken"] = index["sync_token"]
+        else:
+            # События дальше горизонта индекс всё равно не хранит, а без timeMax
+            # одно бесконечное повторяющееся событие (singleEvents) даёт сотни страниц
+            params["timeMin"] = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+            params["timeMax"] = datetime.utcfromtimestamp(index["horizon_until"]).strftime("%Y-%m-%dT%H:%M:%SZ")
         
+        session = self._get_session()
+        changes = 0
+        outcome = "too_large"
+        try:
+            with stage_timer("google_events_sync") as timer:
+                for _ in range(CALENDAR_SYNC_MAX_PAGES):
+                    async with session.get(
+                        EVENTS_LIST_URL,
+                        params=params,
+                        headers={"Authorization": f"Bearer {token}"},
+                    ) as resp:
+                        data = await resp.json(content_type=None)
+                    CALENDAR_SYNC_PAGES.labels(kind).inc()
+                    if resp.status == 410:
+                        outcome = "expired"
+                        break
+                    if resp.status >= 400:
+                        if resp.status == 401:
+                            self._tokens.pop(user_id)
+                        logger.error(f"❌ Ошибка синхронизации событий ({resp.status}): {data}")
+                        outcome = "error"
+                        break
+                    if not isinstance(data, dict):
+                        logger.error(f"❌ Неожиданный ответ синхронизации событий: {data!r}")
+                        outcome = "error"
+                        break
+                    
+                    items = data.get("items", [])
+                    changes += len(items)
+                    event_index.apply(index, items)
+                    if data.get("nextPageToken"):
+                        params["pageToken"] = data["nextPageToken"]
+                        continue
+                    # Без nextSyncToken следующая проверка снова выполнит полную синхронизацию
+                    index["sync_token"] = data.get("nextSyncToken")
+                    index["synced_at"] = time.time()
+                    outcome = "ok"
+                    break
+                timer.outcome = "ok" if outcome == "ok" else "error"
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as error:
+            # ValueError - тело ответа не JSON (например, HTML страница 502 от прокси)
+            logger.error(f"❌ Ошибка синхронизации событий: {error}")
+            outcome = "error"
+        
+        CALENDAR_SYNC.labels(kind, outcome).inc()
+        CALENDAR_SYNC_CHANGES.labels(kind).inc(changes)
+        if outcome == "too_large":
+            logger.warning(f"⚠️ Календарь пользователя {user_id} больше {CALENDAR_SYNC_MAX_PAGES} страниц - индекс не построен")
+        if outcome != "ok":
+            return None, outcome
+        logger.info(f"🔄 Индекс событий пользователя {user_id}: {kind} синхронизация, {changes} изменений")
+        return index, outcome
+    
+    async def _index_created(self, user_id: int, results: list[Optional[dict]]):
+        """Добавить созданные события в индекс, не дожидаясь синхронизации"""
+        created = [result for result in results if result]
+        if not CALENDAR_INDEX_ENABLED or not created:
+            return
+        async with self._index_lock(user_id):
+            index = await event_index.load(user_id)
+            # Нет индекса - события попадут в него при полной синхронизации
+            if index is not None:
+                event_index.apply(index, created)
+                await event_index.save(user_id, index)
+    
+    async def disconnect(self, user_id: int):
+        """Отключить пользователя от Google Calendar"""
+        self._tokens.pop(user_id)
+        await storage.delete_token(user_id)
+        await event_index.clear(user_id)
+        logger.info(f"🔓 Пользователь {user_id} отключен от Google Calendar")
+    
+    @staticmethod
+    def _build_event_body(
+        title: str,
+        date: str,
+        time_start: str,
+        time_end: str,
+        description: Optional[str],
+        timezone: str,
+        color: Optional[str],
+    ) -> dict:
+        """Сформировать тело события для Calendar API"""
         # Проверяем и корректируем время окончания
         if time_end <= time_start:
             # Добавляем 1 час к времени начала
@@ -275,27 +585,183 @@ class CalendarService:
                 event_body["colorId"] = color_id
                 logger.info(f"🎨 Установлен цвет: {color} (colorId={color_id})")
         
+        return event_body
+    
+    async def create_event(
+        self,
+        user_id: int,
+        title: str,
+        date: str,
+        time_start: str,
+        time_end: str,
+        description: Optional[str] = None,
+        timezone: str = "Europe/Moscow",
+        color: Optional[str] = None
+    ) -> Optional[dict]:
+        """
+        Создание события в Google Calendar пользователя
+        
+        Args:
+            user_id: ID пользователя Telegram
+            title: Название события
+            date: Дата в формате YYYY-MM-DD
+            time_start: Время начала HH:MM
+            time_end: Время окончания HH:MM
+            description: Описание события
+            timezone: Часовой пояс
+            color: Название цвета (русское или английское)
+        
+        Returns:
+            dict с информацией о созданном событии или None при ошибке
+        """
+        token = await self.get_access_token(user_id)
+        if not token:
+            logger.error(f"❌ Google Calendar не подключен для пользователя {user_id}")
+            return None
+        
+        event_body = self._build_event_body(
+            title, date, time_start, time_end, description, timezone, color
+        )
+        
         logger.info(f"📅 Создаю событие для {user_id}: {title} на {date} {time_start}-{time_end}")
-        logger.debug(f"📋 Event body: {event_body}")
+        logger.debug("📋 Event body: %s", LazyJson(event_body), extra=PAYLOAD)
         
+        session = self._get_session()
         try:
-            event = service.events().insert(
-                calendarId="primary",
-                body=event_body
-            ).execute()
+            with stage_timer("google_events_insert") as timer:
+                async with session.post(
+                    EVENTS_INSERT_URL,
+                    json=event_body,
+                    headers={"Authorization": f"Bearer {token}"},
+                ) as resp:
+                    event = await resp.json(content_type=None)
+                    if resp.status == 401:
+                        # Токен отозван или протух раньше срока - перечитаем при следующем запросе
+                        self._tokens.pop(user_id)
+                    if resp.status >= 400 or not isinstance(event, dict):
+                        timer.outcome = "error"
+                        logger.error(f"❌ Ошибка Google Calendar API ({resp.status}): {event}")
+                        return None
             
             logger.info(f"✅ Событие создано: {event.get('htmlLink')}")
-            return {
-                "id": event.get("id"),
-                "link": event.get("htmlLink"),
-                "summary": event.get("summary"),
-                "start": event.get("start"),
-                "end": event.get("end"),
-            }
+            return self._event_result(event)
             
-        except HttpError as error:
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as error:
+            # ValueError - тело ответа не JSON (например, HTML страница 502 от прокси)
             logger.error(f"❌ Ошибка Google Calendar API: {error}")
             return None
+    
+    @staticmethod
+    def _event_result(event: dict) -> dict:
+        """Краткая информация о созданном событии"""
+        return {
+            "id": event.get("id"),
+            "link": event.get("htmlLink"),
+            "summary": event.get("summary"),
+            "start": event.get("start"),
+            "end": event.get("end"),
+        }
+    
+    async def create_events(
+        self,
+        user_id: int,
+        events: list[dict],
+        timezone: str = "Europe/Moscow",
+    ) -> list[Optional[dict]]:
+        """
+        Создание нескольких событий одним batch запросом к Google Calendar
+        
+        Args:
+            user_id: ID пользователя Telegram
+            events: события в формате GigaChatService.parse_event
+            timezone: Часовой пояс
+        
+        Returns:
+            результат по каждому событию в том же порядке (None - событие не создано)
+        """
+        if len(events) == 1:
+            event = events[0]
+            results = [await self.create_event(
+                user_id=user_id,
+                title=event.get("title", "Событие"),
+                date=event.get("date"),
+                time_start=event.get("time_start", "10:00"),
+                time_end=event.get("time_end", "11:00"),
+                description=event.get("description"),
+                timezone=timezone,
+                color=event.get("color"),
+            )]
+            spawn(self._index_created(user_id, results))
+            return results
+        
+        token = await self.get_access_token(user_id)
+        if not token:
+            logger.error(f"❌ Google Calendar не подключен для пользователя {user_id}")
+            return [None] * len(events)
+        
+        bodies = self._build_event_bodies(events, timezone)
+        logger.info(f"📅 Создаю {len(bodies)} событий для {user_id} batch запросом")
+        
+        results: list[Optional[dict]] = []
+        for offset in range(0, len(bodies), BATCH_MAX_REQUESTS):
+            results.extend(await self._insert_batch(user_id, token, bodies[offset:offset + BATCH_MAX_REQUESTS]))
+        spawn(self._index_created(user_id, results))
+        return results
+    
+    @classmethod
+    def _build_event_bodies(cls, events: list[dict], timezone: str) -> list[dict]:
+        """Тела событий в формате GigaChatService.parse_event для Calendar API"""
+        return [
+            cls._build_event_body(
+                event.get("title", "Событие"),
+                event.get("date"),
+                event.get("time_start", "10:00"),
+                event.get("time_end", "11:00"),
+                event.get("description"),
+                timezone,
+                event.get("color"),
+            )
+            for event in events
+        ]
+    
+    async def _insert_batch(self, user_id: int, token: str, bodies: list[dict]) -> list[Optional[dict]]:
+        """Один batch запрос с events.insert для каждого тела"""
+        boundary = f"batch_{uuid.uuid4().hex}"
+        session = self._get_session()
+        try:
+            with stage_timer("google_events_batch") as timer:
+                async with session.post(
+                    GOOGLE_CALENDAR_BATCH_URL,
+                    data=_encode_batch(EVENTS_INSERT_PATH, bodies, boundary),
+                    headers={
+                        "Authorization": f"Bearer {token}",
+                        "Content-Type": f"multipart/mixed; boundary={boundary}",
+                    },
+                ) as resp:
+                    payload = await resp.read()
+                    if resp.status == 401:
+                        self._tokens.pop(user_id)
+                    if resp.status >= 400:
+                        timer.outcome = "error"
+                        logger.error(f"❌ Ошибка batch запроса Google Calendar ({resp.status}): {payload[:500]!r}")
+                        return [None] * len(bodies)
+                    responses = _decode_batch(payload, resp.headers.get("Content-Type", ""))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+            logger.error(f"❌ Ошибка Google Calendar API: {error}")
+            return [None] * len(bodies)
+        
+        results: list[Optional[dict]] = []
+        for index in range(len(bodies)):
+            status, event = responses.get(index, (None, None))
+            if status is None or status >= 400 or not isinstance(event, dict):
+                if status == 401:
+                    self._tokens.pop(user_id)
+                logger.error(f"❌ Событие {index} из batch не создано ({status}): {event}")
+                results.append(None)
+            else:
+                results.append(self._event_result(event))
+        logger.info(f"✅ Batch: создано {sum(r is not None for r in results)} из {len(bodies)}")
+        return results
 
 
 # Синглтон
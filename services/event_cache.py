@@ -0,0 +1,94 @@
+import hashlib
+import logging
+import re
+import threading
+from typing import Optional
+
+from config import GIGACHAT_MODEL, PARSE_CACHE_TTL, PARSE_CACHE_LOCAL_SIZE
+from services.cache import LRUCache
+from services.storage import storage
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Нормализация команды: регистр, ё/е, пробелы, концевая пунктуация"""
+    text = text.casefold().replace("ё", "е")
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip(".!?… ")
+
+
+class EventParseCache:
+    """
+    Кэш результатов parse_event (список событий): LRU в памяти процесса перед Redis.
+    
+    Ключ - нормализованный текст + дата "сегодня" из промпта + модель, поэтому
+    относительные даты ("завтра") не переживают смену дня. Вызывается из потоков
+    llm_executor: запросы к Redis выполняются на event loop через storage.run_threadsafe.
+    """
+    
+    def __init__(self, ttl: int = PARSE_CACHE_TTL, local_size: int = PARSE_CACHE_LOCAL_SIZE):
+        self.ttl = ttl
+        self._local = LRUCache(maxsize=local_size, ttl=ttl)
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+    
+    def _key(self, text: str, today: str) -> str:
+        digest = hashlib.sha256(
+            f"{GIGACHAT_MODEL}|{today}|{normalize_text(text)}".encode()
+        ).hexdigest()
+        return f"parse_events:{digest}"
+    
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+    
+    def get(self, text: str, today: str) -> Optional[list[dict]]:
+        """Найти результат парсинга (копии, чтобы вызывающий мог их менять)"""
+        key = self._key(text, today)
+        
+        cached = self._local.get(key)
+        if cached is not None:
+            self._count("local_hits")
+            return [dict(event) for event in cached]
+        
+        try:
+            cached = storage.run_threadsafe(storage.get_json(key))
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка чтения кэша {key}: {e}")
+            cached = None
+        if isinstance(cached, list):
+            self._count("redis_hits")
+            self._local.set(key, cached)
+            return [dict(event) for event in cached]
+        
+        self._count("misses")
+        return None
+    
+    def set(self, text: str, today: str, events: list[dict]):
+        """Сохранить результат парсинга"""
+        key = self._key(text, today)
+        self._local.set(key, [dict(event) for event in events])
+        try:
+            # Запись в Redis не задерживает ответ пользователю
+            storage.run_threadsafe(storage.set_json(key, events, ttl=self.ttl), wait=False)
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка записи кэша {key}: {e}")
+    
+    def stats(self) -> dict:
+        """Счётчики попаданий: сколько вызовов LLM удалось сэкономить"""
+        hits = self.local_hits + self.redis_hits
+        total = hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_ratio": round(hits / total, 4) if total else 0.0,
+            "local_size": len(self._local),
+        }
+
+
+# Синглтон
+event_parse_cache = EventParseCache()
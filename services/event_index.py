@@ -0,0 +1,232 @@
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from config import (
+    CALENDAR_INDEX_HORIZON_DAYS,
+    CALENDAR_INDEX_MAX_EVENTS,
+    CALENDAR_INDEX_TTL,
+    CALENDAR_SYNC_BACKOFF,
+    CALENDAR_SYNC_INTERVAL,
+)
+from services.storage import storage
+
+logger = logging.getLogger(__name__)
+
+# Виды синхронизации с Google Calendar (метка kind в метриках)
+SYNC_FULL = "full"
+SYNC_INCREMENTAL = "incremental"
+
+
+def _timestamp(when: dict) -> float:
+    """Unix time из start/end события Calendar API (dateTime со смещением или с timeZone)"""
+    moment = datetime.fromisoformat(when["dateTime"].replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=ZoneInfo(when.get("timeZone") or "UTC"))
+    return moment.timestamp()
+
+
+def busy_interval(event: dict) -> Optional[list]:
+    """
+    Занятое время события Calendar API: [начало, конец, название].
+
+    None - событие не занимает время: удалено, помечено "свободен"
+    (transparency) или на весь день.
+    """
+    if event.get("status") == "cancelled" or event.get("transparency") == "transparent":
+        return None
+    start, end = event.get("start") or {}, event.get("end") or {}
+    if "dateTime" not in start or "dateTime" not in end:
+        return None
+    try:
+        return [_timestamp(start), _timestamp(end), event.get("summary") or ""]
+    except (ValueError, KeyError) as e:
+        logger.warning(f"⚠️ Не удалось разобрать время события {event.get('id')}: {e}")
+        return None
+
+
+class EventIndex:
+    """
+    Индекс ближайших событий пользователя в Redis для проверки пересечений.
+
+    Одна JSON запись на пользователя: события (id -> [начало, конец, название]),
+    syncToken последней синхронизации и covered_until - до этого момента индекс
+    полон. Заполняется полной синхронизацией events.list на horizon_days вперёд,
+    дальше изменения дочитываются по syncToken. Если событий больше max_events,
+    хранятся ближайшие, а covered_until сдвигается к первому не поместившемуся.
+    Закончившиеся события удаляются при каждой записи.
+
+    События, которые не менялись, syncToken не возвращает, поэтому когда до
+    границы полной синхронизации (horizon_until) остаётся меньше половины
+    горизонта, индекс строится заново.
+
+    После неудачной синхронизации пишется отметка с TTL backoff: пока она
+    есть, проверка идёт по последнему сохранённому индексу без запросов к Google.
+    """
+
+    def __init__(
+        self,
+        horizon_days: int = CALENDAR_INDEX_HORIZON_DAYS,
+        max_events: int = CALENDAR_INDEX_MAX_EVENTS,
+        ttl: int = CALENDAR_INDEX_TTL,
+        sync_interval: int = CALENDAR_SYNC_INTERVAL,
+        backoff: int = CALENDAR_SYNC_BACKOFF,
+    ):
+        self.horizon = horizon_days * 24 * 3600
+        self.max_events = max_events
+        self.ttl = ttl
+        self.sync_interval = sync_interval
+        self.backoff = backoff
+
+    def _key(self, user_id: int) -> str:
+        return f"user:{user_id}:events"
+
+    def _backoff_key(self, user_id: int) -> str:
+        return f"user:{user_id}:events:backoff"
+
+    async def load(self, user_id: int) -> Optional[dict]:
+        """Индекс пользователя из Redis (None - ещё не построен или истёк)"""
+        index = await storage.get_json(self._key(user_id))
+        return index if isinstance(index, dict) else None
+
+    async def save(self, user_id: int, index: dict):
+        """Записать индекс, удалив закончившиеся и не поместившиеся события"""
+        self._prune(index)
+        await storage.set_json(self._key(user_id), index, ttl=self.ttl)
+
+    async def clear(self, user_id: int):
+        """Забыть индекс (пользователь отключил или сменил аккаунт Google)"""
+        await storage.delete_json(self._key(user_id))
+        await storage.delete_json(self._backoff_key(user_id))
+
+    async def mark_failed(self, user_id: int, outcome: str):
+        """Синхронизация не удалась: не повторять её до истечения backoff"""
+        await storage.set_json(self._backoff_key(user_id), outcome, ttl=self.backoff)
+
+    async def in_backoff(self, user_id: int) -> bool:
+        """Недавняя синхронизация не удалась - Google пока не спрашиваем"""
+        return await storage.get_json(self._backoff_key(user_id)) is not None
+
+    def new(self) -> dict:
+        """Пустой индекс для полной синхронизации"""
+        horizon_until = time.time() + self.horizon
+        return {
+            "sync_token": None,
+            "synced_at": 0.0,
+            "horizon_until": horizon_until,
+            "covered_until": horizon_until,
+            "events": {},
+        }
+
+    def sync_kind(self, index: Optional[dict]) -> Optional[str]:
+        """Какая синхронизация нужна перед проверкой: SYNC_FULL, SYNC_INCREMENTAL или None"""
+        now = time.time()
+        if index is None or not index.get("sync_token") or index["horizon_until"] < now + self.horizon / 2:
+            return SYNC_FULL
+        if now - index["synced_at"] >= self.sync_interval:
+            return SYNC_INCREMENTAL
+        return None
+
+    def apply(self, index: dict, events: list[dict]) -> int:
+        """
+        Применить события Calendar API (новые, изменённые и удалённые) к индексу.
+
+        Returns:
+            сколько событий попало в индекс
+        """
+        indexed = index["events"]
+        added = 0
+        for event in events:
+            event_id = event.get("id")
+            if not event_id:
+                continue
+            busy = busy_interval(event)
+            if busy is None or busy[0] >= index["covered_until"]:
+                indexed.pop(event_id, None)
+            else:
+                indexed[event_id] = busy
+                added += 1
+        return added
+
+    def _prune(self, index: dict):
+        now = time.time()
+        events = sorted(
+            (
+                (event_id, busy) for event_id, busy in index["events"].items()
+                if busy[1] > now and busy[0] < index["covered_until"]
+            ),
+            key=lambda item: item[1][0],
+        )
+        if len(events) > self.max_events:
+            index["covered_until"] = events[self.max_events][1][0]
+            events = events[:self.max_events]
+        index["events"] = dict(events)
+
+    def conflicts(self, index: dict, bodies: list[dict]) -> list[Optional[dict]]:
+        """
+        Пересечения новых событий с индексом и ближайшее свободное время в тот же день.
+
+        Каждое новое событие проверяется и с предыдущими из того же сообщения.
+
+        Args:
+            bodies: тела событий для Calendar API (start/end с dateTime и timeZone)
+
+        Returns:
+            по каждому событию: {"overlaps": [(начало, конец, название)],
+            "free_slot": (начало, конец) или None} с datetime в часовом поясе
+            события; None - пересечений нет или событие за пределами индекса
+        """
+        busy = [tuple(interval) for interval in index["events"].values()]
+        results: list[Optional[dict]] = []
+        for body in bodies:
+            zone = ZoneInfo(body["start"].get("timeZone") or "UTC")
+            start, end = _timestamp(body["start"]), _timestamp(body["end"])
+            if start >= index["covered_until"]:
+                results.append(None)
+                continue
+
+            overlaps = sorted(
+                (interval for interval in busy if interval[0] < end and interval[1] > start),
+                key=lambda interval: interval[0],
+            )
+            if overlaps:
+                slot = self._free_slot(busy, start, end - start, zone, index["covered_until"])
+                results.append({
+                    "overlaps": [
+                        (datetime.fromtimestamp(s, zone), datetime.fromtimestamp(e, zone), summary)
+                        for s, e, summary in overlaps
+                    ],
+                    "free_slot": slot and tuple(datetime.fromtimestamp(moment, zone) for moment in slot),
+                })
+            else:
+                results.append(None)
+            busy.append((start, end, body.get("summary") or ""))
+        return results
+
+    @staticmethod
+    def _free_slot(
+        busy: list[tuple],
+        start: float,
+        duration: float,
+        zone: ZoneInfo,
+        covered_until: float,
+    ) -> Optional[tuple[float, float]]:
+        """Первый промежуток длительностью duration не раньше start и до конца того же дня"""
+        day = datetime.fromtimestamp(start, zone).replace(hour=0, minute=0, second=0, microsecond=0)
+        day_end = min((day + timedelta(days=1)).timestamp(), covered_until)
+        candidate = start
+        # Каждый шаг переносит начало на конец одного из занятых интервалов
+        for _ in range(len(busy) + 1):
+            if candidate + duration > day_end:
+                return None
+            overlapping = [e for s, e, _ in busy if s < candidate + duration and e > candidate]
+            if not overlapping:
+                return candidate, candidate + duration
+            candidate = max(overlapping)
+        return None
+
+
+# Синглтон
+event_index = EventIndex()
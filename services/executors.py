@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, TypeVar
+
+from config import EXECUTOR_LLM_WORKERS, EXECUTOR_OAUTH_WORKERS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Ссылки на фоновые задачи: event loop держит только слабые ссылки
+_background_tasks: set[asyncio.Task] = set()
+
+
+def spawn(coro: Awaitable[T]) -> asyncio.Task:
+    """Запустить корутину без ожидания результата (fire-and-forget)"""
+    task = asyncio.ensure_future(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+class InstrumentedExecutor:
+    """
+    Отдельный пул потоков для класса нагрузки с учётом очереди и ожидания.
+
+    Медленная стадия занимает только свой пул и не вытесняет остальные,
+    как это было с общим default executor.
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """Выполнить блокирующую функцию в пуле и дождаться результата"""
+        submitted = time.perf_counter()
+        with self._lock:
+            self._queued += 1
+
+        def task():
+            wait = time.perf_counter() - submitted
+            with self._lock:
+                self._queued -= 1
+                self._active += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self.completed += 1
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, task)
+
+    def stats(self) -> dict:
+        with self._lock:
+            started = self.completed + self._active
+            return {
+                "max_workers": self.max_workers,
+                "queue_depth": self._queued,
+                "active_workers": self._active,
+                "completed": self.completed,
+                "avg_wait_ms": round(self.total_wait / started * 1000, 2) if started else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 2),
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Пулы по классам нагрузки (Redis и Google Calendar - асинхронные клиенты, им пулы не нужны)
+llm_executor = InstrumentedExecutor("llm", EXECUTOR_LLM_WORKERS)
+oauth_executor = InstrumentedExecutor("oauth", EXECUTOR_OAUTH_WORKERS)
+# Проверка GigaChat для /readyz: свой поток, чтобы проба не ждала в очереди llm_executor
+probe_executor = InstrumentedExecutor("probe", 1)
+# Фоновая уборка файлов GigaChat: один поток, не занимает llm_executor
+background_executor = InstrumentedExecutor("background", 1)
+
+EXECUTORS = (llm_executor, oauth_executor, probe_executor, background_executor)
+
+
+def executors_stats() -> dict:
+    return {executor.name: executor.stats() for executor in EXECUTORS}
+
+
+def shutdown_executors():
+    for executor in EXECUTORS:
+        executor.shutdown()
@@ -0,0 +1,263 @@
+"""
+Детерминированный разбор типовых команд без вызова LLM.
+
+Понимает небольшую грамматику: сегодня/завтра/послезавтра/в понедельник,
+время ("в 15:00", "в 10 утра", "с 10 до 12"), длительность ("на 2 часа",
+"на полчаса") и цвета из COLOR_MAP. Возвращает одно событие в формате
+элемента списка GigaChatService.parse_event или None, если фраза разобрана
+не полностью (в том числе если событий несколько) - тогда вызывающий код
+обращается к GigaChat.
+"""
+import re
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from services.calendar_service import COLOR_MAP
+
+_HOUR = r"([01]?\d|2[0-3])"
+_MINUTE = r"([0-5]\d)"
+_PERIOD = r"(утра|дня|вечера|ночи)"
+
+RELATIVE_DAYS = {"сегодня": 0, "завтра": 1, "послезавтра": 2}
+
+WEEKDAYS = {
+    "понедельник": 0, "вторник": 1, "среду": 2, "четверг": 3,
+    "пятницу": 4, "субботу": 5, "воскресенье": 6,
+}
+
+_RELATIVE_DAY_RE = re.compile(r"\b(" + "|".join(RELATIVE_DAYS) + r")\b")
+_WEEKDAY_RE = re.compile(r"(?:\bво?\s+)?\b(" + "|".join(WEEKDAYS) + r")\b")
+_RANGE_RE = re.compile(
+    rf"\bс\s+{_HOUR}(?::{_MINUTE})?(?:\s+{_PERIOD})?\s+до\s+{_HOUR}(?::{_MINUTE})?(?:\s+{_PERIOD})?\b"
+)
+_AT_RE = re.compile(rf"\bв\s+{_HOUR}(?::{_MINUTE})?(?:\s+(?:час(?:а|ов)?|ч)\b)?(?:\s+{_PERIOD})?\b")
+# Только через двоеточие: "10.11" - скорее дата, чем время, её разбирает LLM
+_CLOCK_RE = re.compile(rf"\b{_HOUR}:{_MINUTE}\b")
+_NOON_RE = re.compile(r"\bв\s+полдень\b")
+_DURATION_RE = re.compile(
+    r"\bна\s+(?:(\d{1,3})\s+(час|часа|часов|минуту|минуты|минут)|(час|полчаса|полтора\s+часа))\b"
+)
+
+# Окончания прилагательных: "красный", "с красным цветом", "красное событие"
+_ADJ_ENDINGS = r"(?:ый|ий|ой|ая|яя|ое|ее|ым|им|ого|его|ую|юю)"
+
+
+def _color_stems() -> dict[str, str]:
+    """Основа прилагательного -> название цвета из COLOR_MAP ("сер" -> "серый")"""
+    stems: dict[str, str] = {}
+    for name in COLOR_MAP:
+        if re.fullmatch(r"[а-яё-]+(?:ый|ий|ой)", name):
+            stems.setdefault(name[:-2], name)
+    return stems
+
+
+def _build_color_re(stems: dict[str, str]) -> re.Pattern:
+    return re.compile(
+        r"(?:\bс\s+)?\b("
+        + "|".join(re.escape(stem) for stem in sorted(stems, key=len, reverse=True))
+        + r")" + _ADJ_ENDINGS + r"\b(?:\s+(?:цвет(?:ом|а)?|событи[ея])\b)?"
+    )
+
+
+_COLOR_STEMS = _color_stems()
+_COLOR_RE = _build_color_re(_COLOR_STEMS)
+
+# Если после разбора в названии остались такие слова - фраза сложнее грамматики
+_LEFTOVER_STOP_RE = re.compile(
+    r"\d|\b(?:следующ\w*|через|кажды\w*|кажд\w*|ежедн\w*|утром|днем|днём|вечером|ночью|"
+    r"недел\w*|месяц\w*|числ\w*|январ\w*|феврал\w*|март\w*|апрел\w*|ма[йя]\w*|июн\w*|"
+    r"июл\w*|август\w*|сентябр\w*|октябр\w*|ноябр\w*|декабр\w*|после|до|пока|"
+    r"и|или|а также|отмени\w*|удали\w*|перенеси\w*|поставь|добавь|создай|запланируй|"
+    r"запиши|напомни\w*|пометь|отметь|цвет\w*)\b"
+)
+_DANGLING_RE = re.compile(r"(?:^|\s)(?:в|во|с|со|на|к|по|за)$|^(?:в|во|на|к|по|за)(?:\s|$)")
+
+
+def _apply_period(hour: int, period: Optional[str]) -> Optional[int]:
+    """Перевод "3 дня" / "7 вечера" / "12 ночи" в 24-часовой формат"""
+    if period is None:
+        return hour
+    if hour > 12:
+        return None
+    if period == "утра":
+        return hour if hour < 12 else None
+    if period in ("дня", "вечера"):
+        return hour if hour == 12 else hour + 12
+    # ночи; "12 ночи" - полночь, то есть 00:00 следующего дня
+    if hour == 12:
+        return 24
+    return hour if hour <= 5 else None
+
+
+def _parse_clock(hour: str, minute: Optional[str], period: Optional[str]) -> Optional[tuple[int, int]]:
+    h = _apply_period(int(hour), period)
+    if h is None:
+        return None
+    # "в 5" без уточнения - то ли утро, то ли вечер: решает LLM
+    if period is None and minute is None and 1 <= h <= 7:
+        return None
+    return h, int(minute) if minute else 0
+
+
+def _single(pattern: re.Pattern, text: str) -> tuple[Optional[re.Match], bool]:
+    """Единственное совпадение; второе значение False, если совпадений больше одного"""
+    matches = list(pattern.finditer(text))
+    if len(matches) > 1:
+        return None, False
+    return (matches[0] if matches else None), True
+
+
+def parse_event_fast(text: str, today: Optional[date] = None) -> Optional[dict]:
+    """
+    Разобрать фразу без LLM.
+
+    Returns:
+        событие как в списке GigaChatService.parse_event или None ("не уверен")
+    """
+    today = today or datetime.now().date()
+    lowered = text.lower()
+    # Позиции совпадений используются для вырезания из исходной строки
+    if len(lowered) != len(text) or len(text) > 200 or "\n" in text:
+        return None
+
+    spans: list[tuple[int, int]] = []
+
+    # Цвет
+    color = None
+    match, ok = _single(_COLOR_RE, lowered)
+    if not ok:
+        return None
+    if match:
+        color = _COLOR_STEMS[match.group(1)]
+        spans.append(match.span())
+
+    # День
+    event_date = today
+    day_match, ok = _single(_RELATIVE_DAY_RE, lowered)
+    if not ok:
+        return None
+    weekday_match, ok = _single(_WEEKDAY_RE, lowered)
+    if not ok or (day_match and weekday_match):
+        return None
+    if day_match:
+        event_date = today + timedelta(days=RELATIVE_DAYS[day_match.group(1)])
+        spans.append(day_match.span())
+    elif weekday_match:
+        delta = (WEEKDAYS[weekday_match.group(1)] - today.weekday()) % 7
+        if delta == 0:
+            # "в понедельник" в понедельник - сегодня или через неделю?
+            return None
+        event_date = today + timedelta(days=delta)
+        spans.append(weekday_match.span())
+
+    # Время
+    start = end = None
+    masked = _mask(lowered, spans)
+    range_match, ok = _single(_RANGE_RE, masked)
+    if not ok:
+        return None
+    if range_match:
+        h1, m1, p1, h2, m2, p2 = range_match.groups()
+        end = _parse_clock(h2, m2, p2 or p1)
+        start = _parse_clock(h1, m1, p1) if p1 else None
+        if not p1 and end is not None:
+            # "с 2 до 4 дня": период второй границы относится и к первой,
+            # если так начало остаётся раньше конца ("с 10 до 12 дня" - нет)
+            start = _parse_clock(h1, m1, p2) if p2 else None
+            if start is None or start >= end:
+                start = _parse_clock(h1, m1, None)
+        if start is None or end is None or end <= start:
+            return None
+        spans.append(range_match.span())
+    else:
+        for pattern in (_NOON_RE, _AT_RE, _CLOCK_RE):
+            masked = _mask(lowered, spans)
+            match, ok = _single(pattern, masked)
+            if not ok:
+                return None
+            if not match:
+                continue
+            if pattern is _NOON_RE:
+                start = (12, 0)
+            else:
+                start = _parse_clock(*match.groups()) if pattern is _AT_RE else _parse_clock(*match.groups(), None)
+                if start is None:
+                    return None
+            spans.append(match.span())
+            break
+
+    if end is not None and end[0] == 24:
+        # Интервал до полуночи переходит на следующий день - решает LLM
+        return None
+    if start is not None and start[0] == 24:
+        event_date += timedelta(days=1)
+        start = (0, start[1])
+
+    # Длительность
+    masked = _mask(lowered, spans)
+    duration_match, ok = _single(_DURATION_RE, masked)
+    if not ok:
+        return None
+    duration = timedelta(hours=1)
+    if duration_match:
+        if end is not None:
+            return None
+        amount, unit, word = duration_match.groups()
+        if word:
+            word = re.sub(r"\s+", " ", word)
+            duration = {
+                "час": timedelta(hours=1),
+                "полчаса": timedelta(minutes=30),
+                "полтора часа": timedelta(minutes=90),
+            }[word]
+        elif unit.startswith("час"):
+            duration = timedelta(hours=int(amount))
+        else:
+            duration = timedelta(minutes=int(amount))
+        if not timedelta(minutes=5) <= duration <= timedelta(hours=12):
+            return None
+        spans.append(duration_match.span())
+
+    if start is None and not (day_match or weekday_match):
+        # Ни даты, ни времени - нечего ускорять, пусть решает LLM
+        return None
+    if start is None:
+        start = (10, 0)
+    if end is None:
+        end_dt = datetime.combine(event_date, datetime.min.time()) + timedelta(hours=start[0], minutes=start[1]) + duration
+        if end_dt.date() != event_date:
+            return None
+        end = (end_dt.hour, end_dt.minute)
+
+    # Название - всё, что осталось
+    title = _cut(text, spans)
+    title = re.sub(r"\s+", " ", title).strip(" ,.!?;:-—")
+    if not title or len(title) > 80:
+        return None
+    title_lower = title.lower()
+    if _LEFTOVER_STOP_RE.search(title_lower) or _DANGLING_RE.search(title_lower):
+        return None
+
+    result = {
+        "title": title,
+        "date": event_date.strftime("%Y-%m-%d"),
+        "time_start": f"{start[0]:02d}:{start[1]:02d}",
+        "time_end": f"{end[0]:02d}:{end[1]:02d}",
+    }
+    if color:
+        result["color"] = color
+    return result
+
+
+def _mask(text: str, spans: list[tuple[int, int]]) -> str:
+    """Заменить уже разобранные фрагменты пробелами (длина строки сохраняется)"""
+    for start, end in spans:
+        text = text[:start] + " " * (end - start) + text[end:]
+    return text
+
+
+def _cut(text: str, spans: list[tuple[int, int]]) -> str:
+    """Вырезать разобранные фрагменты из исходного текста"""
+    for start, end in sorted(spans, reverse=True):
+        text = text[:start] + " " + text[end:]
+    return text
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import time
+
+from config import (
+    GIGACHAT_TIMEOUT,
+    GIGACHAT_RETRIES,
+    GIGACHAT_RETRY_MAX_DELAY,
+    GIGACHAT_MAX_WAIT,
+    GIGACHAT_FILE_REAPER_INTERVAL,
+    GIGACHAT_FILE_REAPER_BATCH,
+    GIGACHAT_FILE_DELETE_ATTEMPTS,
+    GIGACHAT_ORPHAN_SWEEP_INTERVAL,
+    GIGACHAT_ORPHAN_MAX_AGE,
+)
+from services.executors import background_executor
+from services.storage import storage
+
+logger = logging.getLogger(__name__)
+
+# Сколько файл может использоваться запросом к модели (с повторами): раньше
+# этого срока файл удаляется, только если запрос явно завершился (release)
+FILE_LEASE = (GIGACHAT_TIMEOUT + GIGACHAT_RETRY_MAX_DELAY) * (GIGACHAT_RETRIES + 1) + GIGACHAT_MAX_WAIT
+
+
+class FileReaper:
+    """
+    Удаление загруженных в GigaChat файлов вне пути ответа пользователю.
+
+    track() записывает file_id в Redis сразу после загрузки со сроком аренды,
+    release() после расшифровки делает файл доступным к удалению немедленно.
+    Фоновая задача пачками удаляет файлы из очереди, неудачные попытки
+    откладываются с экспоненциальной задержкой. Если под упал между загрузкой
+    и release(), файл удалится по истечении аренды на любой реплике; раз в
+    sweep_interval повторно удаляются файлы старше orphan_max_age, брошенные
+    после max_attempts неудач. Удаляются только файлы, загруженные ботом
+    (список в Redis), - чужие файлы аккаунта не трогаем.
+
+    Запросы идут через background_executor и gigachat_background_guard: уборка
+    не занимает потоки и лимит пользовательских запросов.
+    """
+
+    def __init__(
+        self,
+        interval: int = GIGACHAT_FILE_REAPER_INTERVAL,
+        batch: int = GIGACHAT_FILE_REAPER_BATCH,
+        max_attempts: int = GIGACHAT_FILE_DELETE_ATTEMPTS,
+        sweep_interval: int = GIGACHAT_ORPHAN_SWEEP_INTERVAL,
+        orphan_max_age: int = GIGACHAT_ORPHAN_MAX_AGE,
+    ):
+        self.interval = interval
+        self.batch = batch
+        self.max_attempts = max_attempts
+        self.sweep_interval = sweep_interval
+        self.orphan_max_age = orphan_max_age
+        self.deleted = 0
+        self.failed = 0
+        self.abandoned = 0
+        self.orphans_deleted = 0
+
+    # Вызываются из потоков llm_executor во время расшифровки: запись в Redis
+    # выполняется на event loop, поток ждёт её, как раньше ждал синхронный клиент
+
+    def track(self, file_id: str):
+        """Файл загружен: удалить после release() или по истечении аренды"""
+        storage.run_threadsafe(storage.track_file_upload(file_id, time.time() + FILE_LEASE))
+
+    def release(self, file_id: str):
+        """Файл больше не нужен: удалить при ближайшем проходе"""
+        storage.run_threadsafe(storage.schedule_file_delete(file_id, time.time()))
+
+    # Фоновая задача
+
+    async def run(self, service):
+        """
+        Бесконечный цикл; останавливается отменой задачи.
+
+        Args:
+            service: GigaChatService, через клиент которого удаляются файлы
+        """
+        logger.info(f"🧹 Фоновое удаление файлов GigaChat: каждые {self.interval}s")
+        last_sweep = 0.0
+        while True:
+            try:
+                await self.reap(service)
+                if self.sweep_interval and time.monotonic() - last_sweep >= self.sweep_interval:
+                    last_sweep = time.monotonic()
+                    await self.sweep_orphans(service)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Ошибка фонового удаления файлов: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def reap(self, service):
+        """Удалить пачку файлов, срок которых подошёл"""
+        # Одна реплика за проход: пачку не удаляют параллельно несколько подов
+        locked = await storage.acquire_lock("gigachat_file_reaper", self.interval)
+        if not locked:
+            return
+        file_ids = await storage.get_due_files(time.time(), self.batch)
+        if not file_ids:
+            return
+        # Одна задача на пачку в отдельном потоке
+        results = await background_executor.run(service.delete_files, file_ids)
+
+        done = [file_id for file_id, ok in zip(file_ids, results) if ok]
+        await storage.complete_file_delete(done)
+        self.deleted += len(done)
+
+        for file_id, ok in zip(file_ids, results):
+            if ok:
+                continue
+            self.failed += 1
+            attempts = await storage.count_file_delete_failure(file_id)
+            if attempts >= self.max_attempts:
+                # Дальше файл удалит сборщик сирот по возрасту
+                self.abandoned += 1
+                logger.warning(f"⚠️ Файл {file_id} не удалён за {attempts} попыток, оставляю сборщику сирот")
+                await storage.complete_file_delete([file_id], deleted=False)
+            else:
+                retry_at = time.time() + self.interval * 2 ** attempts
+                await storage.schedule_file_delete(file_id, retry_at)
+
+    async def sweep_orphans(self, service):
+        """Удалить загруженные ботом файлы старше orphan_max_age, брошенные после неудачных попыток"""
+        locked = await storage.acquire_lock("gigachat_orphan_sweep", self.sweep_interval)
+        if not locked:
+            return
+        tracked = await storage.get_uploaded_files(time.time() - max(self.orphan_max_age, FILE_LEASE))
+        if not tracked:
+            return
+        existing = {file.id_ for file in await background_executor.run(service.list_files)}
+        # Файлов уже нет в GigaChat (удалены вручную или истекли) - забываем
+        await storage.forget_uploaded_files([file_id for file_id in tracked if file_id not in existing])
+        orphans = [file_id for file_id in tracked if file_id in existing]
+        if not orphans:
+            return
+        logger.info(f"🧹 Найдено {len(orphans)} потерянных файлов в GigaChat")
+        results = await background_executor.run(service.delete_files, orphans)
+        deleted = [file_id for file_id, ok in zip(orphans, results) if ok]
+        await storage.complete_file_delete(deleted)
+        self.orphans_deleted += len(deleted)
+
+    def stats(self) -> dict:
+        return {
+            "deleted": self.deleted,
+            "failed": self.failed,
+            "abandoned": self.abandoned,
+            "orphans_deleted": self.orphans_deleted,
+        }
+
+
+# Синглтон
+file_reaper = FileReaper()
@@ -1,143 +1,332 @@
 import json
 import logging
-import os
-import tempfile
+import threading
 from datetime import datetime
 from typing import Optional
 
-from langchain_gigachat.chat_models import GigaChat
-from langchain_core.messages import HumanMessage, SystemMessage
-from pydub import AudioSegment
-
 from config import (
     AUTHORIZATION_KEY,
     GIGACHAT_MODEL,
+    GIGACHAT_BASE_URL,
+    GIGACHAT_AUTH_URL,
+    GIGACHAT_TIMEOUT,
+    GIGACHAT_RATE_LIMIT,
+    GIGACHAT_BURST,
+    GIGACHAT_MAX_CONCURRENCY,
+    GIGACHAT_BACKGROUND_RATE_LIMIT,
+    GIGACHAT_MAX_WAIT,
+    GIGACHAT_RETRIES,
+    GIGACHAT_RETRY_BASE_DELAY,
+    GIGACHAT_RETRY_MAX_DELAY,
+    GIGACHAT_CB_FAILURES,
+    GIGACHAT_CB_RESET_TIMEOUT,
+    MAX_EVENTS_PER_MESSAGE,
     TRANSCRIPTION_PROMPT,
     EVENT_EXTRACTION_PROMPT,
+    VOICE_COMBINED_PROMPT,
 )
+from logging_setup import LazyJson, PAYLOAD
+from services.event_cache import event_parse_cache
+from services.file_reaper import file_reaper
+from services.resilience import ResilientCaller
+from services.metrics import EXTRACT_JSON_FAILURES, stage_timer, format_timings
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
 logger = logging.getLogger(__name__)
 
 
+def _is_transient(error: Exception) -> bool:
+    """Транзиентные ошибки GigaChat: таймауты, сеть, 429 и 5xx"""
+    # К моменту ошибки клиент уже создан, модули загружены
+    import httpx
+    from gigachat.exceptions import ResponseError
+    
+    if isinstance(error, (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)):
+        return True
+    if isinstance(error, ResponseError) and len(error.args) > 1:
+        status_code = error.args[1]
+        return status_code == 429 or (isinstance(status_code, int) and status_code >= 500)
+    return False
+
+
+# Общий для всех экземпляров сервиса лимитер/breaker: квота GigaChat одна на процесс
+gigachat_guard = ResilientCaller(
+    name="gigachat",
+    is_transient=_is_transient,
+    rate=GIGACHAT_RATE_LIMIT,
+    burst=GIGACHAT_BURST,
+    max_concurrency=GIGACHAT_MAX_CONCURRENCY,
+    max_wait=GIGACHAT_MAX_WAIT,
+    retries=GIGACHAT_RETRIES,
+    base_delay=GIGACHAT_RETRY_BASE_DELAY,
+    max_delay=GIGACHAT_RETRY_MAX_DELAY,
+    failure_threshold=GIGACHAT_CB_FAILURES,
+    reset_timeout=GIGACHAT_CB_RESET_TIMEOUT,
+)
+
+# Фоновые запросы (удаление файлов): свой лимит ниже пользовательского - уборка
+# не тратит токены и слоты запросов пользователей и не размыкает их breaker
+gigachat_background_guard = ResilientCaller(
+    name="gigachat_background",
+    is_transient=_is_transient,
+    rate=GIGACHAT_BACKGROUND_RATE_LIMIT,
+    burst=1,
+    max_concurrency=1,
+    max_wait=GIGACHAT_MAX_WAIT,
+    retries=GIGACHAT_RETRIES,
+    base_delay=GIGACHAT_RETRY_BASE_DELAY,
+    max_delay=GIGACHAT_RETRY_MAX_DELAY,
+    failure_threshold=GIGACHAT_CB_FAILURES,
+    reset_timeout=GIGACHAT_CB_RESET_TIMEOUT,
+)
+
+
 class GigaChatService:
-    """Сервис для работы с GigaChat API"""
+    """
+    Сервис для работы с GigaChat API.
+    
+    Клиент (и langchain вместе с ним) загружается при первом запросе, поэтому
+    импорт модуля и создание сервиса ничего не стоят. Один клиент на процесс -
+    через синглтон gigachat_service.
+    """
     
     def __init__(self):
-        self.giga = GigaChat(
-            credentials=AUTHORIZATION_KEY,
-            verify_ssl_certs=False,
-            model=GIGACHAT_MODEL
+        self._giga = None
+        self._lock = threading.Lock()
+    
+    @property
+    def giga(self):
+        """Клиент langchain_gigachat, создаётся при первом обращении"""
+        if self._giga is None:
+            with self._lock:
+                if self._giga is None:
+                    from langchain_gigachat.chat_models import GigaChat
+                    
+                    self._giga = GigaChat(
+                        credentials=AUTHORIZATION_KEY,
+                        verify_ssl_certs=False,
+                        model=GIGACHAT_MODEL,
+                        timeout=GIGACHAT_TIMEOUT,
+                        base_url=GIGACHAT_BASE_URL,
+                        auth_url=GIGACHAT_AUTH_URL,
+                    )
+                    logger.info(f"✅ Клиент GigaChat создан (модель {GIGACHAT_MODEL})")
+        return self._giga
+    
+    def _upload_audio(self, mp3_data: bytes) -> str:
+        """Загрузить MP3 в GigaChat прямо из памяти, вернуть file_id"""
+        uploaded_file = gigachat_guard.call(
+            self.giga.upload_file, ("voice.mp3", mp3_data, "audio/mpeg"), purpose="general"
         )
+        
+        file_id = uploaded_file.id_
+        # Сразу в очередь удаления: если под упадёт, файл удалит другая реплика
+        file_reaper.track(file_id)
+        logger.info(f"📤 Файл загружен, ID: {file_id}")
+        
+        # Логируем информацию о загруженном файле
+        upload_info = {
+            "id": uploaded_file.id_,
+            "filename": uploaded_file.filename,
+            "bytes": uploaded_file.bytes_,
+            "purpose": uploaded_file.purpose,
+        }
+        logger.debug("📋 Upload response: %s", LazyJson(upload_info), extra=PAYLOAD)
+        return file_id
+    
+    def _invoke_with_file(self, system_prompt: str, file_id: str):
+        """Запрос к модели с прикреплённым аудиофайлом"""
+        from langchain_core.messages import HumanMessage, SystemMessage
+        
+        messages = [
+            SystemMessage(content=system_prompt),
+            HumanMessage(
+                content="Расшифруй этот аудиофайл",
+                additional_kwargs={"attachments": [file_id]}
+            )
+        ]
+        
+        logger.debug(f"📨 Отправляю запрос с file_id: {file_id}")
+        response = gigachat_guard.call(self.giga.invoke, messages)
+        
+        # Логируем полный ответ API
+        response_info = {
+            "content": response.content,
+            "type": response.type,
+            "response_metadata": response.response_metadata if hasattr(response, "response_metadata") else None,
+        }
+        logger.info("📥 Audio API response: %s", LazyJson(response_info), extra=PAYLOAD)
+        return response
     
-    def transcribe_audio(self, audio_file_path: str) -> str:
-        """Расшифровка аудио файла"""
-        logger.info(f"🎤 Начинаю расшифровку аудио: {audio_file_path}")
+    def transcribe_audio(self, mp3_data: bytes) -> str:
+        """Расшифровка аудио (MP3 в памяти, см. services.transcoder)"""
+        logger.info(f"🎤 Начинаю расшифровку аудио: {len(mp3_data)} байт")
+        timings = {}
         
-        # Конвертируем OGG в MP3 для совместимости с GigaChat
-        sound = AudioSegment.from_file(audio_file_path, format="ogg")
-        with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as tmp_mp3:
-            sound.export(tmp_mp3.name, format="mp3")
-            tmp_mp3_path = tmp_mp3.name
+        # 1. Загружаем файл в GigaChat
+        with stage_timer("gigachat_upload", timings):
+            file_id = self._upload_audio(mp3_data)
         
         try:
-            # 1. Загружаем файл в GigaChat
-            with open(tmp_mp3_path, "rb") as f:
-                uploaded_file = self.giga.upload_file(f, purpose="general")
-            
-            file_id = uploaded_file.id_
-            logger.info(f"📤 Файл загружен, ID: {file_id}")
-            
-            # Логируем информацию о загруженном файле
-            upload_info = {
-                "id": uploaded_file.id_,
-                "filename": uploaded_file.filename,
-                "bytes": uploaded_file.bytes_,
-                "purpose": uploaded_file.purpose,
-            }
-            logger.debug(f"📋 Upload response: {json.dumps(upload_info, ensure_ascii=False, indent=2)}")
+            # 2. Отправляем запрос с прикрепленным файлом
+            with stage_timer("gigachat_transcribe", timings):
+                response = self._invoke_with_file(TRANSCRIPTION_PROMPT, file_id)
+            return response.content
+        
+        finally:
+            # 3. Файл удалит фоновая задача - пользователь не ждёт лишний запрос
+            file_reaper.release(file_id)
+            logger.info(f"⏱️ voice mode=two_step {format_timings(timings)}")
+    
+    def transcribe_and_parse(self, mp3_data: bytes) -> tuple[str, Optional[list[dict]]]:
+        """
+        Расшифровка и извлечение событий одним запросом к модели.
+        
+        Если объединённый ответ не разобрался, тот же загруженный файл
+        расшифровывается обычным промптом, а события возвращаются как None -
+        их извлекает вызывающий код (двухшаговый путь).
+        
+        Returns:
+            (расшифровка, список событий или None)
+        """
+        logger.info(f"🎤 Расшифровка + парсинг одним запросом: {len(mp3_data)} байт")
+        today = datetime.now().strftime("%Y-%m-%d")
+        timings = {}
+        mode = "combined"
+        
+        with stage_timer("gigachat_upload", timings):
+            file_id = self._upload_audio(mp3_data)
+        
+        try:
+            with stage_timer("gigachat_combined_invoke", timings):
+                response = self._invoke_with_file(
+                    VOICE_COMBINED_PROMPT.format(today=today), file_id
+                )
+            parsed = self._extract_json(response.content)
+            if not isinstance(parsed, dict):
+                parsed = {}
+            transcript = parsed.get("transcript")
+            events = self._normalize_events(parsed.get("events", parsed.get("event")))
             
-            try:
-                # 2. Отправляем запрос с прикрепленным файлом
-                messages = [
-                    SystemMessage(content=TRANSCRIPTION_PROMPT),
-                    HumanMessage(
-                        content="Расшифруй этот аудиофайл",
-                        additional_kwargs={"attachments": [file_id]}
-                    )
-                ]
-                
-                logger.debug(f"📨 Отправляю запрос на расшифровку с file_id: {file_id}")
-                response = self.giga.invoke(messages)
-                
-                # Логируем полный ответ API
-                response_info = {
-                    "content": response.content,
-                    "type": response.type,
-                    "response_metadata": response.response_metadata if hasattr(response, "response_metadata") else None,
-                }
-                logger.info(f"📥 Transcription API response: {json.dumps(response_info, ensure_ascii=False, indent=2)}")
-                
-                return response.content
+            if isinstance(transcript, str) and transcript.strip() and events:
+                event_parse_cache.set(transcript, today, events)
+                return transcript, events
             
-            finally:
-                # 3. Удаляем файл после обработки
-                self._delete_file(file_id)
+            logger.warning("⚠️ Объединённый ответ не разобран, перехожу на двухшаговый путь")
+            EXTRACT_JSON_FAILURES.labels("combined").inc()
+            mode = "combined_fallback"
+            with stage_timer("gigachat_transcribe", timings):
+                response = self._invoke_with_file(TRANSCRIPTION_PROMPT, file_id)
+            return response.content, None
         
         finally:
-            os.unlink(tmp_mp3_path)
+            file_reaper.release(file_id)
+            logger.info(f"⏱️ voice mode={mode} {format_timings(timings)}")
     
-    def parse_event(self, text: str) -> Optional[dict]:
-        """Извлечение данных события из текста"""
+    def parse_event(self, text: str) -> list[dict]:
+        """
+        Извлечение событий из текста.
+        
+        Returns:
+            список событий (в сообщении их может быть несколько); пустой, если не разобрано
+        """
         today = datetime.now().strftime("%Y-%m-%d")
         logger.info(f"🔍 Парсинг события из текста: {text[:100]}...")
         
+        cached = event_parse_cache.get(text, today)
+        if cached is not None:
+            logger.info("⚡ Событие взято из кэша парсинга")
+            return cached
+        
+        from langchain_core.messages import HumanMessage, SystemMessage
+        
         messages = [
             SystemMessage(content=EVENT_EXTRACTION_PROMPT.format(today=today)),
             HumanMessage(content=text)
         ]
         
-        response = self.giga.invoke(messages)
+        with stage_timer("gigachat_parse_event"):
+            response = gigachat_guard.call(self.giga.invoke, messages)
         
         # Логируем ответ API для парсинга события
         response_info = {
             "content": response.content,
             "type": response.type,
         }
-        logger.info(f"📥 Event parsing API response: {json.dumps(response_info, ensure_ascii=False, indent=2)}")
+        logger.info("📥 Event parsing API response: %s", LazyJson(response_info), extra=PAYLOAD)
         
-        parsed = self._extract_json(response.content)
-        if parsed:
-            logger.debug(f"📋 Parsed event data: {json.dumps(parsed, ensure_ascii=False, indent=2)}")
+        events = self._normalize_events(self._extract_json(response.content))
+        if events:
+            event_parse_cache.set(text, today, events)
+            logger.debug("📋 Parsed events: %s", LazyJson(events), extra=PAYLOAD)
         else:
-            logger.debug("📋 Parsed event data: None")
+            EXTRACT_JSON_FAILURES.labels("parse_event").inc()
+            logger.debug("📋 Parsed events: []")
         
-        return parsed
+        return events
     
-    def _extract_json(self, text: str) -> Optional[dict]:
-        """Извлечение JSON из текста ответа"""
+    def _extract_json(self, text: str) -> Optional[dict | list]:
+        """Извлечение JSON объекта или массива из текста ответа"""
+        starts = [idx for idx in (text.find("{"), text.find("[")) if idx != -1]
+        if not starts:
+            return None
+        start_idx = min(starts)
+        closing = "}" if text[start_idx] == "{" else "]"
+        end_idx = text.rfind(closing) + 1
+        if end_idx <= start_idx:
+            return None
         try:
-            start_idx = text.find("{")
-            end_idx = text.rfind("}") + 1
-            if start_idx != -1 and end_idx > start_idx:
-                json_str = text[start_idx:end_idx]
-                return json.loads(json_str)
+            parsed = json.loads(text[start_idx:end_idx])
         except json.JSONDecodeError as e:
             logger.error(f"❌ JSON decode error: {e}")
+            return None
+        if isinstance(parsed, (dict, list)):
+            return parsed
+        logger.error(f"❌ Ожидался JSON объект или массив, получено: {type(parsed).__name__}")
         return None
     
-    def _delete_file(self, file_id: str) -> None:
+    @staticmethod
+    def _normalize_events(parsed) -> list[dict]:
+        """Список событий из ответа модели: массив, один объект или {"events": [...]}"""
+        if isinstance(parsed, dict):
+            parsed = parsed["events"] if isinstance(parsed.get("events"), list) else [parsed]
+        if not isinstance(parsed, list):
+            return []
+        events = [event for event in parsed if isinstance(event, dict) and event]
+        if len(events) > MAX_EVENTS_PER_MESSAGE:
+            logger.warning(f"⚠️ Событий {len(events)}, беру первые {MAX_EVENTS_PER_MESSAGE}")
+            events = events[:MAX_EVENTS_PER_MESSAGE]
+        return events
+    
+    def ping(self) -> bool:
+        """Проверить доступность GigaChat API (авторизация + список моделей)"""
+        try:
+            self.giga._client.get_models()
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ GigaChat недоступен: {e}")
+            return False
+    
+    def _delete_file(self, file_id: str) -> bool:
         """Удаление файла из GigaChat"""
         try:
-            self.giga._client.delete_file(file_id)
-            logger.info(f"🗑️ Файл {file_id} удален")
+            with stage_timer("gigachat_delete"):
+                gigachat_background_guard.call(self.giga._client.delete_file, file_id)
+            logger.debug(f"🗑️ Файл {file_id} удален")
+            return True
         except Exception as e:
-            logger.warning(f"⚠️ Не удалось удалить файл: {e}")
+            logger.warning(f"⚠️ Не удалось удалить файл {file_id}: {e}")
+            return False
+    
+    def delete_files(self, file_ids: list[str]) -> list[bool]:
+        """Удаление пачки файлов (фоновая задача services.file_reaper)"""
+        results = [self._delete_file(file_id) for file_id in file_ids]
+        logger.info(f"🗑️ Удалено файлов GigaChat: {sum(results)} из {len(file_ids)}")
+        return results
+    
+    def list_files(self) -> list:
+        """Файлы, загруженные в хранилище GigaChat"""
+        return gigachat_background_guard.call(self.giga._client.get_files).data
 
 
-# Синглтон для использования в хэндлерах
+# Синглтон: единственный клиент GigaChat в процессе (хэндлеры, проверки, фоновые задачи)
 gigachat_service = GigaChatService()
\ No newline at end of file
@@ -0,0 +1,170 @@
+"""
+Метрики стадий обработки в формате Prometheus (/metrics).
+
+Каждая стадия пишется в гистограмму bot_stage_duration_seconds с метками
+stage и outcome (ok/error), поэтому p50/p95/p99 по стадиям считаются через
+histogram_quantile.
+"""
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# Стадии длятся от миллисекунд (кэш, Redis) до минут (расшифровка длинных голосовых)
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+STAGE_DURATION = Histogram(
+    "bot_stage_duration_seconds",
+    "Длительность стадии обработки сообщения",
+    ["stage", "outcome"],
+    buckets=_BUCKETS,
+)
+
+PIPELINE_DURATION = Histogram(
+    "bot_pipeline_duration_seconds",
+    "Длительность обработки сообщения целиком",
+    ["pipeline", "outcome"],
+    buckets=_BUCKETS,
+)
+
+# Воспринимаемая задержка: событие показывается до записи в календарь
+TIME_TO_EVENT = Histogram(
+    "bot_time_to_event_seconds",
+    "От получения сообщения до показа разобранного события",
+    ["pipeline"],
+    buckets=_BUCKETS,
+)
+
+# Предобработка голосовых: задержки стадий transcode/gigachat_upload/gigachat_transcribe
+# сравниваются по периодам, когда bot_audio_preprocess_enabled равен 1 и 0
+AUDIO_PREPROCESS = Gauge(
+    "bot_audio_preprocess_enabled",
+    "Включена ли предобработка голосовых перед загрузкой",
+)
+
+AUDIO_BYTES = Counter(
+    "bot_audio_bytes_total",
+    "Объём голосовых: input - OGG из Telegram, upload - MP3 для GigaChat",
+    ["stage"],
+)
+
+AUDIO_SECONDS = Counter(
+    "bot_audio_seconds_total",
+    "Длительность голосовых: input - исходная, upload - после обрезки тишины",
+    ["stage"],
+)
+
+AUDIO_BYTES_SAVED = Counter(
+    "bot_audio_bytes_saved_total",
+    "Оценка экономии загрузки относительно MP3 128 кбит/с без предобработки",
+)
+
+# Планировщик сообщений (services.scheduler): ожидание слота по полосам text/voice
+SCHEDULER_QUEUE_WAIT = Histogram(
+    "bot_scheduler_queue_wait_seconds",
+    "Ожидание сообщения в очереди планировщика до начала обработки",
+    ["lane"],
+    buckets=_BUCKETS,
+)
+
+SCHEDULER_QUEUE_DEPTH = Gauge(
+    "bot_scheduler_queue_depth",
+    "Сообщения, ожидающие обработки",
+    ["lane"],
+)
+
+SCHEDULER_ACTIVE = Gauge(
+    "bot_scheduler_active",
+    "Сообщения в обработке",
+    ["lane"],
+)
+
+SCHEDULER_DROPPED = Counter(
+    "bot_scheduler_dropped_total",
+    "Сообщения, не дошедшие до конца: superseded - отменены новым сообщением, rejected - очередь полна",
+    ["lane", "reason"],
+)
+
+# Индекс событий (services.event_index): стоимость синхронизации с Google Calendar.
+# Длительность - стадия google_events_sync в bot_stage_duration_seconds
+CALENDAR_SYNC = Counter(
+    "bot_calendar_sync_total",
+    "Синхронизации индекса событий: full - полная, incremental - по syncToken",
+    ["kind", "outcome"],
+)
+
+CALENDAR_SYNC_PAGES = Counter(
+    "bot_calendar_sync_pages_total",
+    "Страницы events.list, прочитанные при синхронизации",
+    ["kind"],
+)
+
+CALENDAR_SYNC_CHANGES = Counter(
+    "bot_calendar_sync_changes_total",
+    "События, полученные при синхронизации",
+    ["kind"],
+)
+
+CALENDAR_CONFLICTS = Counter(
+    "bot_calendar_conflicts_total",
+    "Новые события, пересекающиеся с уже запланированными",
+)
+
+EXTRACT_JSON_FAILURES = Counter(
+    "bot_extract_json_failures_total",
+    "Ответы модели, из которых не удалось извлечь JSON",
+    ["source"],
+)
+
+
+class StageTimer:
+    """Результат замера; outcome можно переопределить внутри блока"""
+
+    def __init__(self):
+        self.outcome = "ok"
+        self.elapsed = 0.0
+        self.started = time.perf_counter()
+
+    def running(self) -> float:
+        """Сколько секунд прошло с начала замера (внутри блока)"""
+        return time.perf_counter() - self.started
+
+
+@contextmanager
+def stage_timer(stage: str, timings: Optional[dict] = None, histogram: Histogram = STAGE_DURATION):
+    """
+    Замерить стадию: исключение - outcome=error.
+
+    Args:
+        stage: имя стадии (метка stage/pipeline)
+        timings: если передан, туда пишется timings[stage] = ms (для логов)
+        histogram: гистограмма для записи
+    """
+    timer = StageTimer()
+    started = timer.started
+    try:
+        yield timer
+    except BaseException:
+        timer.outcome = "error"
+        raise
+    finally:
+        timer.elapsed = time.perf_counter() - started
+        histogram.labels(stage, timer.outcome).observe(timer.elapsed)
+        if timings is not None:
+            timings[stage] = round(timer.elapsed * 1000, 1)
+
+
+def pipeline_timer(pipeline: str):
+    """Замер обработки сообщения целиком (voice/text)"""
+    return stage_timer(pipeline, histogram=PIPELINE_DURATION)
+
+
+def format_timings(timings: dict) -> str:
+    """Однострочное представление замеров для логов"""
+    return " ".join(f"{stage}={ms}ms" for stage, ms in timings.items())
+
+
+def render() -> tuple[bytes, str]:
+    """Тело и Content-Type ответа /metrics"""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,230 @@
+import logging
+import random
+import threading
+import time
+from typing import Callable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class UpstreamUnavailableError(RuntimeError):
+    """Внешний сервис перегружен или недоступен - отвечаем пользователю без деталей"""
+
+
+class CircuitOpenError(UpstreamUnavailableError):
+    """Circuit breaker разомкнут: запросы не отправляются до истечения паузы"""
+
+
+class TokenBucket:
+    """Потокобезопасный token bucket: rate запросов в секунду, всплеск до capacity"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.total_wait = 0.0
+        self.waits = 0
+        self.max_wait = 0.0
+
+    def _reserve(self) -> float:
+        """Занять токен; вернуть, сколько нужно подождать до его появления"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self, max_wait: float) -> float:
+        """
+        Дождаться токена.
+
+        Raises:
+            UpstreamUnavailableError: ждать пришлось бы дольше max_wait
+        """
+        wait = self._reserve()
+        if wait > max_wait:
+            # Возвращаем токен - запрос не будет отправлен
+            with self._lock:
+                self._tokens += 1
+            raise UpstreamUnavailableError(f"лимит запросов: ожидание {wait:.1f}s > {max_wait}s")
+        if wait > 0:
+            time.sleep(wait)
+        with self._lock:
+            self.total_wait += wait
+            self.waits += 1 if wait > 0 else 0
+            self.max_wait = max(self.max_wait, wait)
+        return wait
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker: после failure_threshold ошибок подряд размыкается на
+    reset_timeout секунд, затем пропускает один пробный запрос (half-open).
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def before_call(self):
+        """Проверить, можно ли отправлять запрос"""
+        with self._lock:
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"{self.name}: circuit open")
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self._state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"{self.name}: circuit half-open, probe in flight")
+                self._probe_in_flight = True
+
+    def on_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"✅ {self.name}: circuit closed")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """Пробный запрос не был отправлен - разрешить следующую попытку"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def on_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(f"⚠️ {self.name}: circuit open на {self.reset_timeout}s")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+
+class ResilientCaller:
+    """
+    Обёртка над вызовами внешнего API: ограничение параллелизма, token bucket,
+    повторы транзиентных ошибок с экспоненциальной задержкой и jitter,
+    circuit breaker.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        is_transient: Callable[[Exception], bool],
+        rate: float,
+        burst: int,
+        max_concurrency: int,
+        max_wait: float,
+        retries: int,
+        base_delay: float,
+        max_delay: float,
+        failure_threshold: int,
+        reset_timeout: float,
+    ):
+        self.name = name
+        self.is_transient = is_transient
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.max_concurrency = max_concurrency
+        self.max_wait = max_wait
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self.retried = 0
+
+    def _backoff(self, attempt: int) -> float:
+        """Full jitter: случайная задержка до base * 2^attempt"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """
+        Выполнить вызов с защитами.
+
+        Raises:
+            UpstreamUnavailableError: circuit разомкнут, лимит или повторы исчерпаны
+            Exception: нетранзиентные ошибки пробрасываются как есть
+        """
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            if not self._semaphore.acquire(timeout=self.max_wait):
+                self.breaker.release_probe()
+                raise UpstreamUnavailableError(f"{self.name}: все {self.max_concurrency} слотов заняты")
+            try:
+                self.bucket.acquire(self.max_wait)
+                with self._lock:
+                    self._in_flight += 1
+                try:
+                    result = func(*args, **kwargs)
+                finally:
+                    with self._lock:
+                        self._in_flight -= 1
+            except UpstreamUnavailableError:
+                # Отказ лимитера - не ошибка апстрима, но пробный слот half-open освобождаем
+                self.breaker.release_probe()
+                raise
+            except Exception as e:
+                if not self.is_transient(e):
+                    # Апстрим ответил (ошибка в самом запросе) - значит он жив
+                    self.breaker.on_success()
+                    raise
+                self.breaker.on_failure()
+                if attempt >= self.retries:
+                    raise UpstreamUnavailableError(f"{self.name}: {e}") from e
+                error = e
+            else:
+                self.breaker.on_success()
+                return result
+            finally:
+                self._semaphore.release()
+
+            # Ждём вне семафора, чтобы не занимать слот на время паузы
+            delay = self._backoff(attempt)
+            attempt += 1
+            with self._lock:
+                self.retried += 1
+            logger.warning(f"🔁 {self.name}: {error!r}, повтор {attempt}/{self.retries} через {delay:.2f}s")
+            time.sleep(delay)
+
+    def stats(self) -> dict:
+        return {
+            "circuit_state": self.breaker.state,
+            "circuit_rejected": self.breaker.rejected,
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "retried": self.retried,
+            "limiter_waits": self.bucket.waits,
+            "limiter_total_wait_s": round(self.bucket.total_wait, 3),
+            "limiter_max_wait_s": round(self.bucket.max_wait, 3),
+        }
@@ -0,0 +1,344 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from config import (
+    EXECUTOR_LLM_WORKERS,
+    GIGACHAT_MAX_CONCURRENCY,
+    SCHEDULER_WORKERS,
+    SCHEDULER_VOICE_WORKERS,
+    SCHEDULER_TEXT_WEIGHT,
+    SCHEDULER_USER_QUEUE,
+    SCHEDULER_SUPERSEDE_WINDOW,
+)
+from services.metrics import (
+    SCHEDULER_ACTIVE,
+    SCHEDULER_DROPPED,
+    SCHEDULER_QUEUE_DEPTH,
+    SCHEDULER_QUEUE_WAIT,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Полосы: text - дешёвый разбор текста (parse_event), voice - скачивание,
+# конвертация и расшифровка голосового
+LANE_TEXT = "text"
+LANE_VOICE = "voice"
+LANES = (LANE_TEXT, LANE_VOICE)
+
+
+class SchedulerBusyError(RuntimeError):
+    """Очередь сообщений пользователя заполнена - новое сообщение не принимаем"""
+
+
+class SupersededError(RuntimeError):
+    """Сообщение отменено более новым сообщением того же пользователя"""
+
+
+class _Job:
+    """Сообщение пользователя в очереди планировщика"""
+
+    __slots__ = ("user_id", "lane", "factory", "future", "enqueued", "supersedable", "task", "committed", "superseded")
+
+    def __init__(self, user_id: int, lane: str, factory: Callable[[], Awaitable], supersedable: bool):
+        self.user_id = user_id
+        self.lane = lane
+        self.factory = factory
+        self.future = asyncio.get_running_loop().create_future()
+        self.enqueued = time.monotonic()
+        self.supersedable = supersedable
+        self.task: Optional[asyncio.Task] = None
+        # После начала записи в календарь сообщение уже не отменяется
+        self.committed = False
+        self.superseded = False
+
+
+# Сообщение, которое обрабатывается в текущей задаче (для commit())
+_current_job: contextvars.ContextVar[Optional[_Job]] = contextvars.ContextVar("scheduler_job", default=None)
+
+
+class UserScheduler:
+    """
+    Планировщик обработки сообщений между диспетчером и конвейером.
+
+    - у каждого пользователя своя очередь: его сообщения обрабатываются по одному,
+      в порядке получения, поэтому исправления не обгоняют друг друга;
+    - пользователи с ожидающими сообщениями обслуживаются по кругу: после
+      каждого сообщения пользователь встаёт в конец своей полосы;
+    - текстовые сообщения (полоса text) берутся раньше голосовых: до text_weight
+      текстовых на одно голосовое; голосовых одновременно не больше voice_workers,
+      поэтому длинные голосовые не занимают все слоты;
+    - voice_workers меньше llm_capacity (одновременных вызовов GigaChat): каждое
+      голосовое занимает не больше одного вызова, поэтому разбор текста не ждёт
+      в очереди llm_executor за расшифровками;
+    - новое сообщение в течение supersede_window секунд отменяет предыдущие
+      сообщения пользователя, ещё не дошедшие до записи в календарь (commit()).
+
+    Отмена останавливает конвейер на ближайшем await; запрос к GigaChat,
+    уже выполняющийся в потоке llm_executor, доработает, но его результат
+    не будет использован.
+    """
+
+    def __init__(
+        self,
+        workers: int = SCHEDULER_WORKERS,
+        voice_workers: int = SCHEDULER_VOICE_WORKERS,
+        text_weight: int = SCHEDULER_TEXT_WEIGHT,
+        max_user_queue: int = SCHEDULER_USER_QUEUE,
+        supersede_window: float = SCHEDULER_SUPERSEDE_WINDOW,
+        llm_capacity: int = min(EXECUTOR_LLM_WORKERS, GIGACHAT_MAX_CONCURRENCY),
+    ):
+        self.workers = workers
+        self.voice_workers = max(1, min(voice_workers, workers, llm_capacity - 1))
+        if self.voice_workers < min(voice_workers, workers):
+            logger.warning(
+                f"⚠️ Голосовых одновременно не больше {self.voice_workers}: "
+                f"GigaChat принимает {llm_capacity} вызовов, часть оставляем тексту"
+            )
+        self.text_weight = text_weight
+        self.max_user_queue = max_user_queue
+        self.supersede_window = supersede_window
+        # Ожидающие сообщения по пользователям
+        self._pending: dict[int, deque[_Job]] = {}
+        # Сообщение в обработке по пользователям (не больше одного)
+        self._running: dict[int, _Job] = {}
+        # Пользователи, готовые к обработке, по полосе их первого сообщения. Записи
+        # не удаляются при изменении очереди - устаревшие пропускаются в _pop_ready
+        self._ready: dict[str, deque[int]] = {lane: deque() for lane in LANES}
+        self._ready_lane: dict[int, str] = {}
+        self._queued = {lane: 0 for lane in LANES}
+        self._active = {lane: 0 for lane in LANES}
+        # Сколько текстовых сообщений подряд взято, пока ждали голосовые
+        self._text_streak = 0
+        self.completed = 0
+        self.superseded = 0
+        self.rejected = 0
+        self.total_wait = {lane: 0.0 for lane in LANES}
+        self.max_wait = {lane: 0.0 for lane in LANES}
+        self.started = {lane: 0 for lane in LANES}
+
+    async def run(
+        self,
+        user_id: int,
+        lane: str,
+        factory: Callable[[], Awaitable[T]],
+        supersedable: bool = True,
+    ) -> T:
+        """
+        Поставить обработку сообщения в очередь пользователя и дождаться результата.
+
+        Args:
+            user_id: ID пользователя Telegram
+            lane: LANE_TEXT или LANE_VOICE
+            factory: создаёт корутину обработки (вызывается, когда подошла очередь)
+            supersedable: может ли сообщение отменить предыдущие и быть отменённым
+                следующим (пересланные сообщения - независимые, их не отменяем)
+
+        Raises:
+            SchedulerBusyError: очередь пользователя заполнена
+            SupersededError: сообщение отменено более новым
+        """
+        job = _Job(user_id, lane, factory, supersedable)
+        pending = self._pending.get(user_id, ())
+        if len(pending) >= self.max_user_queue:
+            # Отклонённое сообщение не отменяет предыдущие
+            self.rejected += 1
+            SCHEDULER_DROPPED.labels(lane, "rejected").inc()
+            raise SchedulerBusyError(f"очередь пользователя {user_id} заполнена ({self.max_user_queue})")
+        if supersedable:
+            self._supersede(user_id, job.enqueued)
+
+        self._pending.setdefault(user_id, deque()).append(job)
+        self._queued[lane] += 1
+        SCHEDULER_QUEUE_DEPTH.labels(lane).inc()
+        self._mark_ready(user_id)
+        self._dispatch()
+
+        try:
+            return await job.future
+        except asyncio.CancelledError:
+            # Обработчик отменён (остановка бота) - снимаем и сообщение
+            job.future.cancel()
+            self._drop(job)
+            if job.task is not None:
+                job.task.cancel()
+            raise
+
+    def commit(self):
+        """
+        Обработка текущего сообщения дошла до внешних изменений (запись в
+        календарь): дальше оно не отменяется новыми сообщениями.
+        """
+        job = _current_job.get()
+        if job is not None:
+            job.committed = True
+
+    # Очереди
+
+    def _mark_ready(self, user_id: int):
+        """Поставить пользователя в конец полосы его первого сообщения"""
+        if user_id in self._running:
+            return
+        pending = self._pending.get(user_id)
+        if not pending:
+            self._pending.pop(user_id, None)
+            self._ready_lane.pop(user_id, None)
+            return
+        lane = pending[0].lane
+        if self._ready_lane.get(user_id) != lane:
+            self._ready_lane[user_id] = lane
+            self._ready[lane].append(user_id)
+
+    def _pop_ready(self, lane: str) -> Optional[_Job]:
+        """Первое сообщение первого готового пользователя полосы"""
+        ready = self._ready[lane]
+        while ready:
+            user_id = ready.popleft()
+            if self._ready_lane.get(user_id) != lane:
+                continue  # устаревшая запись: очередь пользователя изменилась
+            del self._ready_lane[user_id]
+            job = self._pending[user_id].popleft()
+            if not self._pending[user_id]:
+                del self._pending[user_id]
+            self._queued[lane] -= 1
+            SCHEDULER_QUEUE_DEPTH.labels(lane).dec()
+            return job
+        return None
+
+    def _next_job(self) -> Optional[_Job]:
+        """Выбрать сообщение: текст приоритетнее, но голосовые не голодают"""
+        voice_allowed = self._active[LANE_VOICE] < self.voice_workers
+        voice_waiting = voice_allowed and self._queued[LANE_VOICE] > 0
+        if not voice_waiting or self._text_streak < self.text_weight:
+            job = self._pop_ready(LANE_TEXT)
+            if job is not None:
+                self._text_streak = self._text_streak + 1 if voice_waiting else 0
+                return job
+        if voice_allowed:
+            job = self._pop_ready(LANE_VOICE)
+            if job is not None:
+                self._text_streak = 0
+                return job
+        return self._pop_ready(LANE_TEXT)
+
+    def _dispatch(self):
+        """Запустить сообщения, пока есть свободные слоты"""
+        while sum(self._active.values()) < self.workers:
+            job = self._next_job()
+            if job is None:
+                return
+            self._start(job)
+
+    def _start(self, job: _Job):
+        wait = time.monotonic() - job.enqueued
+        SCHEDULER_QUEUE_WAIT.labels(job.lane).observe(wait)
+        self.started[job.lane] += 1
+        self.total_wait[job.lane] += wait
+        self.max_wait[job.lane] = max(self.max_wait[job.lane], wait)
+
+        self._running[job.user_id] = job
+        self._active[job.lane] += 1
+        SCHEDULER_ACTIVE.labels(job.lane).inc()
+        job.task = asyncio.create_task(self._execute(job), name=f"scheduler-{job.user_id}")
+        # Через callback, а не finally: задачу могут отменить до её первого шага
+        job.task.add_done_callback(functools.partial(self._finish, job))
+
+    async def _execute(self, job: _Job):
+        _current_job.set(job)
+        return await job.factory()
+
+    def _finish(self, job: _Job, task: asyncio.Task):
+        if not job.future.done():
+            if task.cancelled():
+                job.future.set_exception(SupersededError("отменено новым сообщением"))
+            elif task.exception() is not None:
+                job.future.set_exception(task.exception())
+            else:
+                job.future.set_result(task.result())
+        del self._running[job.user_id]
+        self._active[job.lane] -= 1
+        SCHEDULER_ACTIVE.labels(job.lane).dec()
+        self.completed += 1
+        self._mark_ready(job.user_id)
+        self._dispatch()
+
+    def _drop(self, job: _Job):
+        """Убрать ожидающее сообщение из очереди пользователя"""
+        pending = self._pending.get(job.user_id)
+        if not pending or job not in pending:
+            return
+        pending.remove(job)
+        self._queued[job.lane] -= 1
+        SCHEDULER_QUEUE_DEPTH.labels(job.lane).dec()
+        # Первое сообщение могло смениться - переставляем пользователя в нужную полосу
+        lane = self._ready_lane.get(job.user_id)
+        if lane is not None and (not pending or pending[0].lane != lane):
+            del self._ready_lane[job.user_id]
+            self._mark_ready(job.user_id)
+
+    def _supersede(self, user_id: int, now: float):
+        """Отменить недавние сообщения пользователя, ещё не записанные в календарь"""
+        if self.supersede_window <= 0:
+            return
+
+        def recent(job: _Job) -> bool:
+            return (
+                job.supersedable
+                and not job.committed
+                and not job.superseded
+                and now - job.enqueued <= self.supersede_window
+            )
+
+        for job in [job for job in self._pending.get(user_id, ()) if recent(job)]:
+            self._drop(job)
+            job.future.set_exception(SupersededError("отменено новым сообщением"))
+            self._count_superseded(job)
+
+        job = self._running.get(user_id)
+        if job is not None and recent(job) and job.task is not None:
+            job.task.cancel()
+            self._count_superseded(job)
+
+    def _count_superseded(self, job: _Job):
+        job.superseded = True
+        self.superseded += 1
+        SCHEDULER_DROPPED.labels(job.lane, "superseded").inc()
+        logger.info(f"⏭️ Сообщение пользователя {job.user_id} ({job.lane}) отменено новым")
+
+    async def close(self):
+        """Отменить ожидающие и выполняющиеся сообщения (при остановке бота)"""
+        for pending in list(self._pending.values()):
+            for job in list(pending):
+                self._drop(job)
+                job.future.cancel()
+        tasks = [job.task for job in self._running.values() if job.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "voice_workers": self.voice_workers,
+            "active": dict(self._active),
+            "queued": dict(self._queued),
+            "waiting_users": len(self._pending),
+            "completed": self.completed,
+            "superseded": self.superseded,
+            "rejected": self.rejected,
+            "avg_wait_ms": {
+                lane: round(self.total_wait[lane] / self.started[lane] * 1000, 2) if self.started[lane] else 0.0
+                for lane in LANES
+            },
+            "max_wait_ms": {lane: round(self.max_wait[lane] * 1000, 2) for lane in LANES},
+        }
+
+
+# Синглтон
+scheduler = UserScheduler()
@@ -1,20 +1,132 @@
+import asyncio
 import json
 import logging
-from typing import Optional
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional, TypeVar
 
-import redis
+import redis.asyncio as redis
 
-from config import REDIS_URL
+from config import (
+    REDIS_URL,
+    REDIS_MAX_CONNECTIONS,
+    REDIS_POOL_TIMEOUT,
+    REDIS_SOCKET_TIMEOUT,
+    REDIS_HEALTH_CHECK_INTERVAL,
+    TOKEN_CACHE_TTL,
+    TOKEN_CACHE_SIZE,
+)
+from services.cache import LRUCache
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+# Sorted set: user_id -> unix time истечения access token
+TOKEN_EXPIRY_KEY = "tokens:expiry"
+# Sorted set: user_id -> unix time последней активности
+ACTIVE_USERS_KEY = "users:active"
+# Sorted set: file_id загруженного в GigaChat файла -> когда его можно удалять
+PENDING_FILES_KEY = "gigachat:files:pending"
+# Hash: file_id -> число неудачных попыток удаления
+FILE_ATTEMPTS_KEY = "gigachat:files:attempts"
+# Sorted set: file_id загруженного ботом файла -> время загрузки (пока файл не удалён)
+UPLOADED_FILES_KEY = "gigachat:files:uploaded"
+# Кэш расшифровок: sorted set ключ -> время последнего обращения,
+# hash ключ -> размер в байтах и общий размер кэша
+TRANSCRIPT_INDEX_KEY = "transcripts:index"
+TRANSCRIPT_SIZES_KEY = "transcripts:sizes"
+TRANSCRIPT_BYTES_KEY = "transcripts:bytes"
+# Pub/sub канал: "<id процесса>:<user_id>" после сохранения или удаления токена
+TOKEN_INVALIDATION_CHANNEL = "tokens:invalidate"
+
+# Отметка "токена нет" в локальном кэше (None у LRUCache - промах)
+_NO_TOKEN = object()
+
+
+def _expiry_timestamp(token_data: dict) -> Optional[float]:
+    """Время истечения из Credentials.to_json() ("2026-01-01T10:00:00.000Z", UTC)"""
+    expiry = token_data.get("expiry")
+    if not expiry:
+        return None
+    try:
+        parsed = datetime.fromisoformat(expiry.rstrip("Z"))
+        return parsed.replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        return None
+
 
 class Storage:
-    """Redis хранилище для токенов пользователей"""
+    """
+    Асинхронное Redis хранилище (redis.asyncio) с общим пулом соединений.
+    
+    Токены читаются через локальный кэш с коротким TTL, в том числе
+    отрицательный ("не подключен"), поэтому проверка авторизации на каждом
+    сообщении не ходит в Redis. save_token/delete_token на любой реплике
+    публикуют user_id в TOKEN_INVALIDATION_CHANNEL, а listen_invalidations()
+    сбрасывает запись во всех процессах.
+    """
     
     def __init__(self, redis_url: str = REDIS_URL):
-        self.redis = redis.from_url(redis_url, decode_responses=True)
-        logger.info("✅ Redis подключен")
+        self.redis_url = redis_url
+        self._redis: Optional[redis.Redis] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tokens = LRUCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+        # Растёт при каждой инвалидации: чтение, начатое до неё, не кладёт в кэш старое значение
+        self._tokens_generation = 0
+        # Вызываются с user_id, когда токен изменился на другой реплике
+        self._token_listeners: list[Callable[[int], None]] = []
+        # Свои сообщения об инвалидации пропускаем - локальный кэш уже обновлён
+        self._instance_id = uuid.uuid4().hex
+        self.token_cache_hits = 0
+        self.token_cache_misses = 0
+        self.invalidations = 0
+    
+    @property
+    def redis(self) -> "redis.Redis":
+        """Клиент создаётся при первом обращении внутри event loop, а не при импорте"""
+        if self._redis is None:
+            pool = redis.BlockingConnectionPool.from_url(
+                self.redis_url,
+                max_connections=REDIS_MAX_CONNECTIONS,
+                timeout=REDIS_POOL_TIMEOUT,
+                socket_timeout=REDIS_SOCKET_TIMEOUT,
+                socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+                socket_keepalive=True,
+                health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+                decode_responses=True,
+            )
+            self.redis = redis.Redis(connection_pool=pool)
+            logger.info(f"✅ Redis клиент создан (пул до {REDIS_MAX_CONNECTIONS} соединений)")
+        return self._redis
+    
+    @redis.setter
+    def redis(self, client: "redis.Redis"):
+        self._redis = client
+        # Соединения клиента привязаны к event loop, в котором он создан
+        self._loop = asyncio.get_running_loop()
+    
+    async def close(self):
+        """Закрыть соединения (при остановке бота)"""
+        if self._redis is not None:
+            await self._redis.connection_pool.disconnect()
+            self._redis = None
+    
+    def run_threadsafe(self, coro: Awaitable[T], wait: bool = True) -> Optional[T]:
+        """
+        Выполнить операцию хранилища из потока executor'а (вызовы GigaChat).
+        
+        Клиент асинхронный, поэтому корутина выполняется на event loop бота.
+        
+        Args:
+            wait: дождаться результата; иначе - запустить и не ждать
+        """
+        if self._loop is None:
+            coro.close()
+            raise RuntimeError("Redis клиент ещё не создан в event loop")
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        return future.result() if wait else None
     
     def _key(self, user_id: int) -> str:
         """Формируем ключ для токена пользователя"""
@@ -22,44 +134,376 @@ class Storage:
     
     # ============= Методы для токенов =============
     
-    def save_token(self, user_id: int, token_data: dict) -> bool:
-        """Сохранить OAuth токен пользователя"""
+    async def save_token(self, user_id: int, token_data: dict) -> bool:
+        """Сохранить OAuth токен пользователя (и время его истечения в индекс)"""
         try:
-            self.redis.set(self._key(user_id), json.dumps(token_data))
+            async with self.redis.pipeline() as pipe:
+                pipe.set(self._key(user_id), json.dumps(token_data))
+                expiry = _expiry_timestamp(token_data)
+                if expiry is not None:
+                    pipe.zadd(TOKEN_EXPIRY_KEY, {str(user_id): expiry})
+                pipe.publish(TOKEN_INVALIDATION_CHANNEL, f"{self._instance_id}:{user_id}")
+                await pipe.execute()
+            self._tokens_generation += 1
+            self._tokens.set(user_id, token_data)
             logger.info(f"🔐 Токен пользователя {user_id} сохранён")
             return True
         except Exception as e:
             logger.error(f"❌ Ошибка сохранения токена: {e}")
             return False
     
-    def get_token(self, user_id: int) -> Optional[dict]:
-        """Получить OAuth токен пользователя"""
+    async def get_token(self, user_id: int) -> Optional[dict]:
+        """Получить OAuth токен пользователя (через локальный кэш)"""
+        cached = self._tokens.get(user_id)
+        if cached is not None:
+            self.token_cache_hits += 1
+            return None if cached is _NO_TOKEN else cached
+        
+        self.token_cache_misses += 1
+        generation = self._tokens_generation
         try:
-            data = self.redis.get(self._key(user_id))
-            if data:
-                return json.loads(data)
-            return None
+            data = await self.redis.get(self._key(user_id))
         except Exception as e:
             logger.error(f"❌ Ошибка получения токена: {e}")
             return None
+        
+        token_data = json.loads(data) if data else None
+        if generation == self._tokens_generation:
+            self._tokens.set(user_id, _NO_TOKEN if token_data is None else token_data)
+        return token_data
     
-    def delete_token(self, user_id: int) -> bool:
+    async def delete_token(self, user_id: int) -> bool:
         """Удалить токен пользователя"""
         try:
-            self.redis.delete(self._key(user_id))
+            async with self.redis.pipeline() as pipe:
+                pipe.delete(self._key(user_id))
+                pipe.zrem(TOKEN_EXPIRY_KEY, str(user_id))
+                pipe.zrem(ACTIVE_USERS_KEY, str(user_id))
+                pipe.publish(TOKEN_INVALIDATION_CHANNEL, f"{self._instance_id}:{user_id}")
+                await pipe.execute()
+            self._tokens_generation += 1
+            self._tokens.set(user_id, _NO_TOKEN)
             logger.info(f"🗑️ Токен пользователя {user_id} удалён")
             return True
         except Exception as e:
             logger.error(f"❌ Ошибка удаления токена: {e}")
             return False
     
-    def has_token(self, user_id: int) -> bool:
+    def add_token_listener(self, callback: Callable[[int], None]):
+        """Подписаться на изменения токенов на других репликах (сброс своих кэшей)"""
+        self._token_listeners.append(callback)
+    
+    def _invalidate_token(self, user_id: Optional[int] = None):
+        """Сбросить локальный кэш токена пользователя (None - всех)"""
+        self._tokens_generation += 1
+        if user_id is None:
+            self._tokens.clear()
+            return
+        self._tokens.pop(user_id)
+        for callback in self._token_listeners:
+            callback(user_id)
+    
+    async def listen_invalidations(self):
+        """
+        Фоновая задача: сбрасывать кэш токенов по сообщениям других реплик.
+        
+        Бесконечный цикл с переподключением; останавливается отменой задачи.
+        """
+        logger.info(f"📡 Подписка на инвалидацию токенов: {TOKEN_INVALIDATION_CHANNEL}")
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(TOKEN_INVALIDATION_CHANNEL)
+                # Сообщения, отправленные до подписки, потеряны - начинаем с чистого кэша
+                self._invalidate_token()
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is None:
+                        continue
+                    instance_id, _, user_id = str(message["data"]).partition(":")
+                    if instance_id != self._instance_id and user_id.isdigit():
+                        self.invalidations += 1
+                        self._invalidate_token(int(user_id))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Подписка на инвалидацию токенов прервана: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.reset()
+    
+    def token_cache_stats(self) -> dict:
+        """Статистика локального кэша токенов"""
+        total = self.token_cache_hits + self.token_cache_misses
+        return {
+            "hits": self.token_cache_hits,
+            "misses": self.token_cache_misses,
+            "hit_ratio": round(self.token_cache_hits / total, 4) if total else 0.0,
+            "size": len(self._tokens),
+            "invalidations": self.invalidations,
+        }
+    
+    async def touch_user(self, user_id: int):
+        """Отметить активность пользователя (для фонового обновления токенов)"""
+        try:
+            await self.redis.zadd(ACTIVE_USERS_KEY, {str(user_id): time.time()})
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка записи активности: {e}")
+    
+    async def trim_activity(self, before: float):
+        """Забыть активность старше before, чтобы индекс не рос бесконечно"""
+        try:
+            await self.redis.zremrangebyscore(ACTIVE_USERS_KEY, "-inf", before)
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка очистки активности: {e}")
+    
+    async def get_expiring_tokens(self, expires_after: float, expires_before: float, limit: int) -> list[int]:
+        """
+        Активные пользователи, чьи токены истекают между expires_after и expires_before.
+        
+        Пересечение с индексом активности считается в Redis (ZINTERSTORE во
+        временный ключ реплики), поэтому неактивные пользователи не занимают
+        места в пачке. Токены, истёкшие раньше expires_after (обновление
+        постоянно не удаётся), тоже пропускаются - их обновит запрос пользователя.
+        Активность старше окна должна быть удалена заранее (trim_activity).
+        """
+        scratch = f"{TOKEN_EXPIRY_KEY}:active:{self._instance_id}"
+        try:
+            async with self.redis.pipeline() as pipe:
+                # Вес 0 у активности: score результата - время истечения
+                pipe.zinterstore(scratch, {TOKEN_EXPIRY_KEY: 1, ACTIVE_USERS_KEY: 0})
+                pipe.zrangebyscore(scratch, expires_after, expires_before, start=0, num=limit)
+                pipe.delete(scratch)
+                _, user_ids, _ = await pipe.execute()
+            return [int(user_id) for user_id in user_ids]
+        except Exception as e:
+            logger.error(f"❌ Ошибка чтения индекса токенов: {e}")
+            return []
+    
+    async def acquire_lock(self, name: str, ttl: int) -> bool:
+        """Простая распределённая блокировка: SET NX с TTL (снимается по истечении)"""
+        try:
+            return bool(await self.redis.set(f"lock:{name}", "1", nx=True, ex=ttl))
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка получения блокировки {name}: {e}")
+            return False
+    
+    async def ping(self) -> bool:
+        """Проверить доступность Redis"""
+        try:
+            return bool(await self.redis.ping())
+        except Exception as e:
+            logger.warning(f"⚠️ Redis недоступен: {e}")
+            return False
+    
+    async def has_token(self, user_id: int) -> bool:
         """Проверить есть ли токен у пользователя"""
-        return self.redis.exists(self._key(user_id)) > 0
+        return await self.get_token(user_id) is not None
+    
+    # ============= Методы для кэшей =============
+    
+    async def get_json(self, key: str) -> Optional[dict | list]:
+        """Получить JSON значение по ключу (ошибки Redis не ломают обработку)"""
+        try:
+            data = await self.redis.get(key)
+            if data:
+                return json.loads(data)
+            return None
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка чтения кэша {key}: {e}")
+            return None
+    
+    async def set_json(self, key: str, value, ttl: int) -> bool:
+        """Сохранить JSON значение с TTL"""
+        try:
+            await self.redis.set(key, json.dumps(value, ensure_ascii=False), ex=ttl)
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка записи кэша {key}: {e}")
+            return False
+    
+    async def delete_json(self, key: str):
+        """Удалить значение по ключу"""
+        try:
+            await self.redis.delete(key)
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка удаления кэша {key}: {e}")
+    
+    async def get_transcript(self, key: str, ttl: int) -> Optional[str]:
+        """Расшифровка из кэша; попадание продлевает TTL и отмечает обращение"""
+        try:
+            async with self.redis.pipeline() as pipe:
+                pipe.get(key)
+                pipe.expire(key, ttl)
+                pipe.zadd(TRANSCRIPT_INDEX_KEY, {key: time.time()}, xx=True)
+                value, _, _ = await pipe.execute()
+            return value
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка чтения кэша расшифровок: {e}")
+            return None
+    
+    async def save_transcript(self, key: str, text: str, ttl: int) -> int:
+        """Сохранить расшифровку; вернуть общий размер кэша в байтах (-1 при ошибке)"""
+        size = len(text.encode())
+        try:
+            previous = int(await self.redis.hget(TRANSCRIPT_SIZES_KEY, key) or 0)
+            async with self.redis.pipeline() as pipe:
+                pipe.set(key, text, ex=ttl)
+                pipe.zadd(TRANSCRIPT_INDEX_KEY, {key: time.time()})
+                pipe.hset(TRANSCRIPT_SIZES_KEY, key, size)
+                pipe.incrby(TRANSCRIPT_BYTES_KEY, size - previous)
+                return int((await pipe.execute())[-1])
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка записи кэша расшифровок: {e}")
+            return -1
+    
+    async def evict_transcripts(self, max_bytes: int, idle_before: float, batch: int = 100) -> int:
+        """
+        Вытеснение из кэша расшифровок: сначала записи без обращений с idle_before
+        (их ключи уже истекли по TTL), затем самые давние, пока размер больше max_bytes.
+        Вызывать под блокировкой - счётчик размера не атомарен с вытеснением.
+        
+        Returns:
+            число вытесненных записей
+        """
+        evicted = 0
+        try:
+            victims = await self.redis.zrangebyscore(TRANSCRIPT_INDEX_KEY, "-inf", idle_before, start=0, num=batch)
+            total = int(await self.redis.get(TRANSCRIPT_BYTES_KEY) or 0)
+            while True:
+                if not victims:
+                    if total <= max_bytes:
+                        break
+                    victims = await self.redis.zrange(TRANSCRIPT_INDEX_KEY, 0, batch - 1)
+                    if not victims:
+                        break
+                sizes = await self.redis.hmget(TRANSCRIPT_SIZES_KEY, victims)
+                freed = sum(int(size or 0) for size in sizes)
+                async with self.redis.pipeline() as pipe:
+                    pipe.delete(*victims)
+                    pipe.zrem(TRANSCRIPT_INDEX_KEY, *victims)
+                    pipe.hdel(TRANSCRIPT_SIZES_KEY, *victims)
+                    pipe.decrby(TRANSCRIPT_BYTES_KEY, freed)
+                    await pipe.execute()
+                total -= freed
+                evicted += len(victims)
+                victims = []
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка вытеснения из кэша расшифровок: {e}")
+        return evicted
     
     # ============= Методы для OAuth flows =============
-    # Примечание: OAuth flows хранятся в памяти CalendarService, так как содержат
-    # lambda функции, которые нельзя сериализовать через pickle
+    # Сам Flow содержит lambda функции и не сериализуется, поэтому храним только
+    # state и PKCE code_verifier - по ним Flow восстанавливается на любой реплике
+    
+    def _flow_key(self, user_id: int) -> str:
+        """Формируем ключ для pending OAuth flow пользователя"""
+        return f"user:{user_id}:oauth_flow"
+    
+    async def save_oauth_flow(self, user_id: int, flow_data: dict, ttl: int) -> bool:
+        """Сохранить состояние OAuth flow с TTL"""
+        try:
+            await self.redis.set(self._flow_key(user_id), json.dumps(flow_data), ex=ttl)
+            return True
+        except Exception as e:
+            logger.error(f"❌ Ошибка сохранения OAuth flow: {e}")
+            return False
+    
+    async def pop_oauth_flow(self, user_id: int) -> Optional[dict]:
+        """Атомарно получить и удалить состояние OAuth flow (код одноразовый)"""
+        try:
+            data = await self.redis.getdel(self._flow_key(user_id))
+            if data:
+                return json.loads(data)
+            return None
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения OAuth flow: {e}")
+            return None
+    
+    # ============= Методы для удаления файлов GigaChat =============
+    # Загруженные файлы записываются сразу после загрузки, поэтому после падения
+    # пода их удалит фоновая задача на любой реплике (см. services.file_reaper)
+    
+    async def track_file_upload(self, file_id: str, delete_at: float) -> bool:
+        """Запомнить загруженный файл и поставить его в очередь на удаление"""
+        try:
+            async with self.redis.pipeline() as pipe:
+                pipe.zadd(UPLOADED_FILES_KEY, {file_id: time.time()})
+                pipe.zadd(PENDING_FILES_KEY, {file_id: delete_at})
+                await pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"❌ Ошибка записи загруженного файла: {e}")
+            return False
+    
+    async def schedule_file_delete(self, file_id: str, at: float) -> bool:
+        """Поставить файл в очередь на удаление не раньше at (unix time)"""
+        try:
+            await self.redis.zadd(PENDING_FILES_KEY, {file_id: at})
+            return True
+        except Exception as e:
+            logger.error(f"❌ Ошибка записи файла {file_id} в очередь удаления: {e}")
+            return False
+    
+    async def get_due_files(self, now: float, limit: int) -> list[str]:
+        """Файлы, которые пора удалить"""
+        try:
+            return await self.redis.zrangebyscore(PENDING_FILES_KEY, "-inf", now, start=0, num=limit)
+        except Exception as e:
+            logger.error(f"❌ Ошибка чтения очереди удаления файлов: {e}")
+            return []
+    
+    async def complete_file_delete(self, file_ids: list[str], deleted: bool = True):
+        """
+        Убрать файлы из очереди удаления.
+        
+        Args:
+            deleted: файлы удалены из GigaChat; False - удалить не удалось,
+                файл остаётся в списке загруженных для сборщика сирот
+        """
+        if not file_ids:
+            return
+        try:
+            async with self.redis.pipeline() as pipe:
+                pipe.zrem(PENDING_FILES_KEY, *file_ids)
+                pipe.hdel(FILE_ATTEMPTS_KEY, *file_ids)
+                if deleted:
+                    pipe.zrem(UPLOADED_FILES_KEY, *file_ids)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка очистки очереди удаления файлов: {e}")
+    
+    async def get_uploaded_files(self, before: float) -> list[str]:
+        """Загруженные ботом файлы, которые ещё не удалены, старше before (unix time)"""
+        try:
+            return await self.redis.zrangebyscore(UPLOADED_FILES_KEY, "-inf", before)
+        except Exception as e:
+            logger.error(f"❌ Ошибка чтения списка загруженных файлов: {e}")
+            return []
+    
+    async def forget_uploaded_files(self, file_ids: list[str]):
+        """Забыть файлы, которых уже нет в GigaChat"""
+        if not file_ids:
+            return
+        try:
+            await self.redis.zrem(UPLOADED_FILES_KEY, *file_ids)
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка очистки списка загруженных файлов: {e}")
+    
+    async def count_file_delete_failure(self, file_id: str) -> int:
+        """Учесть неудачную попытку удаления; вернуть число неудачных попыток"""
+        try:
+            return int(await self.redis.hincrby(FILE_ATTEMPTS_KEY, file_id, 1))
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка учёта попытки удаления файла {file_id}: {e}")
+            return 0
+    
+    async def pending_files_count(self) -> int:
+        """Сколько файлов ждут удаления"""
+        try:
+            return await self.redis.zcard(PENDING_FILES_KEY)
+        except Exception:
+            return -1
 
 
 # Синглтон
@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import time
+
+from config import (
+    TOKEN_REFRESH_INTERVAL,
+    TOKEN_REFRESH_LEAD,
+    TOKEN_REFRESH_ACTIVE_WINDOW,
+    TOKEN_REFRESH_BATCH,
+)
+from services.calendar_service import calendar_service
+from services.storage import storage
+
+logger = logging.getLogger(__name__)
+
+
+class TokenRefresher:
+    """
+    Фоновое обновление OAuth токенов до их истечения.
+    
+    Раз в interval секунд берёт из Redis (sorted set по времени истечения)
+    токены, истекающие в ближайшие lead секунд (или истёкшие не больше lead
+    секунд назад), у пользователей, активных за последние active_window секунд. Перед обновлением каждого токена берётся
+    блокировка в Redis, поэтому на нескольких репликах токен обновляется один раз.
+    """
+    
+    def __init__(
+        self,
+        interval: int = TOKEN_REFRESH_INTERVAL,
+        lead: int = TOKEN_REFRESH_LEAD,
+        active_window: int = TOKEN_REFRESH_ACTIVE_WINDOW,
+        batch: int = TOKEN_REFRESH_BATCH,
+    ):
+        self.interval = interval
+        self.lead = lead
+        self.active_window = active_window
+        self.batch = batch
+        self.refreshed = 0
+        self.failed = 0
+    
+    async def run(self):
+        """Бесконечный цикл; останавливается отменой задачи"""
+        logger.info(f"🔁 Фоновое обновление токенов: каждые {self.interval}s, за {self.lead}s до истечения")
+        while True:
+            try:
+                await self.refresh_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Ошибка фонового обновления токенов: {e}")
+            await asyncio.sleep(self.interval)
+    
+    async def refresh_due(self):
+        """Обновить все токены, которые скоро истекут"""
+        now = time.time()
+        await storage.trim_activity(now - self.active_window)
+        user_ids = await storage.get_expiring_tokens(
+            now - self.lead,
+            now + self.lead,
+            self.batch,
+        )
+        for user_id in user_ids:
+            # Блокировка живёт дольше цикла: другая реплика не возьмёт этот токен,
+            # даже если прочитала индекс до того, как мы записали новое время истечения
+            locked = await storage.acquire_lock(f"token_refresh:{user_id}", self.interval * 2)
+            if not locked:
+                continue
+            if await calendar_service.refresh_token(user_id):
+                self.refreshed += 1
+            else:
+                self.failed += 1
+    
+    def stats(self) -> dict:
+        return {"refreshed": self.refreshed, "failed": self.failed}
+
+
+# Синглтон
+token_refresher = TokenRefresher()
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import math
+import os
+from typing import Awaitable, Callable, Optional
+
+from config import AUDIO_PREPROCESS_ENABLED, TRANSCODE_WORKERS, TRANSCODE_QUEUE_SIZE
+from services.audio import AudioConversionError, ffmpeg_mp3_args, report_conversion
+from services.metrics import stage_timer
+
+logger = logging.getLogger(__name__)
+
+
+class TranscoderBusyError(RuntimeError):
+    """Очередь конвертации заполнена - новое голосовое не принимаем"""
+
+
+def _cpu_limit() -> int:
+    """Лимит CPU контейнера (cgroup v2/v1), иначе число ядер"""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return max(1, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0:
+            return max(1, math.ceil(quota / period))
+    except (OSError, ValueError):
+        pass
+    return os.cpu_count() or 1
+
+
+class Transcoder:
+    """
+    Выделенная стадия конвертации OGG -> MP3.
+    
+    Каждая задача - отдельный процесс ffmpeg, поэтому CPU-нагрузка не занимает
+    потоки executor'а, нужные для HTTP вызовов. Число одновременных процессов
+    ограничено workers, ожидающих задач - max_queue. preprocess - обрезка
+    тишины и речевые параметры MP3 (см. services.audio.ffmpeg_mp3_args).
+    """
+    
+    def __init__(
+        self,
+        workers: int = TRANSCODE_WORKERS,
+        max_queue: int = TRANSCODE_QUEUE_SIZE,
+        preprocess: bool = AUDIO_PREPROCESS_ENABLED,
+    ):
+        self.workers = workers or _cpu_limit()
+        self.max_queue = max_queue
+        self.preprocess = preprocess
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: list[asyncio.Task] = []
+        self._active = 0
+    
+    def _ensure_started(self):
+        """Запустить воркеры (лениво, внутри работающего event loop)"""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"transcoder-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"🎛️ Транскодер запущен: {self.workers} воркеров, очередь {self.max_queue}")
+    
+    async def close(self):
+        """Остановить воркеры"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+    
+    @property
+    def queue_depth(self) -> int:
+        """Сколько задач ждёт свободного воркера"""
+        return self._queue.qsize() if self._queue is not None else 0
+    
+    async def convert(
+        self,
+        ogg_data: bytes,
+        on_queued: Optional[Callable[[int], Awaitable[None]]] = None,
+        duration: Optional[float] = None,
+    ) -> bytes:
+        """
+        Поставить OGG в очередь на конвертацию и дождаться MP3.
+        
+        Args:
+            ogg_data: исходное голосовое
+            on_queued: вызывается с позицией в очереди, если все воркеры заняты
+            duration: длительность из Telegram, секунд - для метрик предобработки
+        
+        Raises:
+            TranscoderBusyError: очередь заполнена
+        """
+        self._ensure_started()
+        
+        all_busy = self._active + self._queue.qsize() >= self.workers
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((ogg_data, duration, future))
+        except asyncio.QueueFull:
+            raise TranscoderBusyError(f"очередь конвертации заполнена ({self.max_queue})")
+        
+        if all_busy and on_queued is not None:
+            await on_queued(self._queue.qsize())
+        
+        return await future
+    
+    async def _worker(self):
+        while True:
+            ogg_data, duration, future = await self._queue.get()
+            if future.cancelled():
+                self._queue.task_done()
+                continue
+            
+            self._active += 1
+            try:
+                mp3_data = await self._run_ffmpeg(ogg_data, duration)
+                if not future.done():
+                    future.set_result(mp3_data)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._active -= 1
+                self._queue.task_done()
+    
+    async def _run_ffmpeg(self, ogg_data: bytes, duration: Optional[float] = None) -> bytes:
+        """Конвертация (с предобработкой) в отдельном процессе ffmpeg через pipe"""
+        with stage_timer("transcode"):
+            mp3_data = await self._communicate(ogg_data)
+        report_conversion(len(ogg_data), len(mp3_data), duration)
+        return mp3_data
+    
+    async def _communicate(self, ogg_data: bytes) -> bytes:
+        process = await asyncio.create_subprocess_exec(
+            *ffmpeg_mp3_args(self.preprocess),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            stdout, stderr = await process.communicate(ogg_data)
+        except asyncio.CancelledError:
+            process.kill()
+            raise
+        
+        if process.returncode != 0:
+            raise AudioConversionError(
+                f"ffmpeg завершился с кодом {process.returncode}: "
+                f"{stderr.decode(errors='replace').strip()}"
+            )
+        return stdout
+
+
+# Синглтон
+transcoder = Transcoder()
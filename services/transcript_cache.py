@@ -0,0 +1,69 @@
+import logging
+import time
+from typing import Optional
+
+from config import GIGACHAT_MODEL, TRANSCRIPT_CACHE_TTL, TRANSCRIPT_CACHE_MAX_BYTES
+from services.storage import storage
+
+logger = logging.getLogger(__name__)
+
+
+class TranscriptCache:
+    """
+    Кэш расшифровок голосовых в Redis.
+    
+    Ключ - file_unique_id из Telegram (одинаковый у пересланных и повторно
+    отправленных голосовых) + модель. Попадание пропускает скачивание,
+    конвертацию, загрузку и расшифровку. Запись живёт ttl секунд с последнего
+    обращения; при превышении max_bytes вытесняются самые давние записи.
+    """
+    
+    def __init__(self, ttl: int = TRANSCRIPT_CACHE_TTL, max_bytes: int = TRANSCRIPT_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+    
+    def _key(self, file_unique_id: str) -> str:
+        return f"transcript:{GIGACHAT_MODEL}:{file_unique_id}"
+    
+    async def get(self, file_unique_id: str) -> Optional[str]:
+        """Найти расшифровку голосового"""
+        transcript = await storage.get_transcript(self._key(file_unique_id), self.ttl)
+        if transcript is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return transcript
+    
+    async def set(self, file_unique_id: str, transcript: str):
+        """Сохранить расшифровку и при переполнении вытеснить давние записи"""
+        if not transcript or not transcript.strip():
+            return
+        total = await storage.save_transcript(self._key(file_unique_id), transcript, self.ttl)
+        if total <= self.max_bytes:
+            return
+        # Вытесняет одна реплика: счётчик размера обновляется не атомарно с удалением
+        if not await storage.acquire_lock("transcript_cache_evict", 30):
+            return
+        evicted = await storage.evict_transcripts(self.max_bytes, time.time() - self.ttl)
+        self.evicted += evicted
+        logger.info(f"🧹 Кэш расшифровок: вытеснено {evicted} записей")
+    
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "evicted": self.evicted,
+        }
+
+
+# Синглтон
+transcript_cache = TranscriptCache()
@@ -0,0 +1,112 @@
+"""
+Конкурентная запись событий через общую aiohttp сессию CalendarService.
+
+Google подменяется сессией-заглушкой: она отвечает с задержкой и считает,
+сколько запросов выполняется одновременно.
+
+Запуск из корня репозитория:
+    python -m pytest tests
+"""
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("redis")
+
+from services.calendar_service import CalendarService
+
+
+class FakeResponse:
+    def __init__(self, status: int, body: bytes):
+        self.status = status
+        self.body = body
+
+    async def json(self, content_type=None):
+        return json.loads(self.body) if self.body else None
+
+
+class FakeRequest:
+    def __init__(self, session: "FakeSession", json_body: dict, headers: dict):
+        self.session = session
+        self.json_body = json_body
+        self.headers = headers
+
+    async def __aenter__(self) -> FakeResponse:
+        self.session.in_flight += 1
+        self.session.max_in_flight = max(self.session.max_in_flight, self.session.in_flight)
+        try:
+            await asyncio.sleep(self.session.delay)
+        finally:
+            self.session.in_flight -= 1
+        if self.session.body is not None:
+            return FakeResponse(self.session.status, self.session.body)
+        # events.insert возвращает событие; владельца кладём в id, чтобы проверить ответ
+        event = dict(self.json_body, id=self.headers["Authorization"].split()[-1], htmlLink="https://calendar/x")
+        return FakeResponse(200, json.dumps(event).encode())
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    """Заглушка aiohttp.ClientSession: только post() с async context manager"""
+
+    closed = False
+
+    def __init__(self, delay: float = 0.05, status: int = 200, body: bytes = None):
+        self.delay = delay
+        self.status = status
+        self.body = body
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def post(self, url, json=None, headers=None, **kwargs):
+        return FakeRequest(self, json, headers)
+
+
+def _service(monkeypatch, session: FakeSession) -> CalendarService:
+    service = CalendarService()
+    service._session = session
+
+    async def access_token(user_id):
+        return f"token-{user_id}"
+
+    async def index_created(user_id, results):
+        return None
+
+    monkeypatch.setattr(service, "get_access_token", access_token)
+    monkeypatch.setattr(service, "_index_created", index_created)
+    return service
+
+
+def _event(user_id: int) -> dict:
+    return {"title": f"Встреча {user_id}", "date": "2026-10-20", "time_start": "10:00", "time_end": "11:00"}
+
+
+def test_concurrent_create_events(monkeypatch):
+    session = FakeSession()
+    service = _service(monkeypatch, session)
+    users = range(1, 21)
+
+    async def run():
+        return await asyncio.gather(*(service.create_events(user_id, [_event(user_id)]) for user_id in users))
+
+    results = asyncio.run(run())
+
+    # Запросы разных пользователей идут параллельно, а не друг за другом
+    assert session.max_in_flight == len(users)
+    for user_id, (result,) in zip(users, results):
+        assert result is not None
+        assert result["id"] == f"token-{user_id}"
+        assert result["summary"] == f"Встреча {user_id}"
+
+
+@pytest.mark.parametrize("status, body", [(502, b"<html>Bad Gateway</html>"), (200, b"")])
+def test_create_event_unexpected_body(monkeypatch, status, body):
+    service = _service(monkeypatch, FakeSession(delay=0, status=status, body=body))
+
+    results = asyncio.run(service.create_events(1, [_event(1)]))
+
+    assert results == [None]
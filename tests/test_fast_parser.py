@@ -0,0 +1,103 @@
+"""
+Корпус типовых фраз для services.fast_parser: разбор без LLM совпадает с
+эталоном, а фразы вне грамматики уходят в GigaChat (None).
+
+Эталон записан по правилам EVENT_EXTRACTION_PROMPT для "сегодня" = TODAY.
+Поля сравниваются без учёта регистра названия; description не сравнивается.
+Сравнение с ответами GigaChat: python -m bench.fast_parser_agreement
+"""
+from datetime import date
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("redis")
+
+from services.fast_parser import parse_event_fast
+
+# Пятница
+TODAY = date(2026, 10, 16)
+
+# (фраза, эталон или None, если фраза должна уйти в LLM)
+CORPUS = [
+    ("завтра в 10 созвон",
+     {"title": "Созвон", "date": "2026-10-17", "time_start": "10:00", "time_end": "11:00"}),
+    ("встреча с командой в 15:00",
+     {"title": "Встреча с командой", "date": "2026-10-16", "time_start": "15:00", "time_end": "16:00"}),
+    ("Завтра в 15:00 встреча с командой",
+     {"title": "Встреча с командой", "date": "2026-10-17", "time_start": "15:00", "time_end": "16:00"}),
+    ("Созвон в 10 утра с красным цветом",
+     {"title": "Созвон", "date": "2026-10-16", "time_start": "10:00", "time_end": "11:00", "color": "красный"}),
+    ("послезавтра в 3 дня обед с Машей на полчаса",
+     {"title": "Обед с Машей", "date": "2026-10-18", "time_start": "15:00", "time_end": "15:30"}),
+    ("в понедельник в 9:30 планёрка",
+     {"title": "Планёрка", "date": "2026-10-19", "time_start": "09:30", "time_end": "10:30"}),
+    ("во вторник с 10 до 12 воркшоп",
+     {"title": "Воркшоп", "date": "2026-10-20", "time_start": "10:00", "time_end": "12:00"}),
+    ("с 2 до 4 дня ревью",
+     {"title": "Ревью", "date": "2026-10-16", "time_start": "14:00", "time_end": "16:00"}),
+    ("сегодня в полдень обед на 2 часа",
+     {"title": "Обед", "date": "2026-10-16", "time_start": "12:00", "time_end": "14:00"}),
+    ("созвон в 18:30 на 45 минут",
+     {"title": "Созвон", "date": "2026-10-16", "time_start": "18:30", "time_end": "19:15"}),
+    ("в 7 вечера ужин, синее событие",
+     {"title": "Ужин", "date": "2026-10-16", "time_start": "19:00", "time_end": "20:00", "color": "синий"}),
+    ("в среду тренировка",
+     {"title": "Тренировка", "date": "2026-10-21", "time_start": "10:00", "time_end": "11:00"}),
+    ("завтра в 11 стендап зеленым цветом",
+     {"title": "Стендап", "date": "2026-10-17", "time_start": "11:00", "time_end": "12:00", "color": "зеленый"}),
+    ("в четверг в 16:00 звонок клиенту на полтора часа",
+     {"title": "Звонок клиенту", "date": "2026-10-22", "time_start": "16:00", "time_end": "17:30"}),
+    ("завтра в 10:00 серая встреча",
+     {"title": "Встреча", "date": "2026-10-17", "time_start": "10:00", "time_end": "11:00", "color": "серый"}),
+    ("встреча серым цветом завтра в 11",
+     {"title": "Встреча", "date": "2026-10-17", "time_start": "11:00", "time_end": "12:00", "color": "серый"}),
+    ("завтра в 14 ч встреча",
+     {"title": "Встреча", "date": "2026-10-17", "time_start": "14:00", "time_end": "15:00"}),
+    ("сегодня в 12 ночи дедлайн",
+     {"title": "Дедлайн", "date": "2026-10-17", "time_start": "00:00", "time_end": "01:00"}),
+    ("в 16:00 серый созвон",
+     {"title": "Созвон", "date": "2026-10-16", "time_start": "16:00", "time_end": "17:00", "color": "серый"}),
+    ("завтра в 9 утра серо-зеленая планёрка",
+     {"title": "Планёрка", "date": "2026-10-17", "time_start": "09:00", "time_end": "10:00", "color": "серо-зеленый"}),
+    # Вне грамматики - должны уходить в GigaChat
+    ("в пятницу созвон", None),
+    ("в понедельник и в среду в 10 планёрка", None),
+    ("завтра утром пробежка", None),
+    ("купить молоко", None),
+    ("в 5 тренировка", None),
+    ("поставь встречу завтра в 10", None),
+    ("пометь красным встречу завтра в 11", None),
+    ("в следующий понедельник в 10 встреча", None),
+    ("20 октября в 12 обед", None),
+    ("через два часа созвон", None),
+    # DD.MM - дата, а не время
+    ("день рождения мамы 10.11", None),
+    ("встреча 15.06", None),
+    ("созвон в 18.30", None),
+    # Интервал через полночь
+    ("с 11 вечера до 12 ночи дежурство", None),
+]
+
+FIELDS = ("title", "date", "time_start", "time_end", "color")
+
+
+def same_event(a: dict, b: dict) -> bool:
+    """Совпадение событий по FIELDS (название - без учёта регистра)"""
+    for field in FIELDS:
+        left, right = a.get(field), b.get(field)
+        if field == "title":
+            left, right = (left or "").lower(), (right or "").lower()
+        if left != right:
+            return False
+    return True
+
+
+@pytest.mark.parametrize("phrase, expected", CORPUS, ids=[phrase for phrase, _ in CORPUS])
+def test_corpus(phrase, expected):
+    result = parse_event_fast(phrase, TODAY)
+
+    if expected is None:
+        assert result is None
+    else:
+        assert result is not None and same_event(result, expected), result